@@ -4,38 +4,118 @@ coder_agent.py
 Generates all code files from a plan.
 
 Simple flow:
-1. Load plan from data/plans/{project_id}.json
-2. Generate each file using LLM (OpenAI GPT-4o)
-3. Write to data/workspace/{project_id}/
-4. Return manifest of created files
+1. Load plan from data/plans/{project_id}.json (or take the fields of a plan
+   still streaming from the planner - a pipelined build, see routes/chat)
+2. Infer a dependency DAG over the file tree (types/models first)
+3. Generate files concurrently (bounded), each once its dependencies landed;
+   files sharing a plan slice run back-to-back so the slice (sent as a
+   cacheable prompt prefix) is served from the provider's prompt cache
+4. Stream each file to data/workspace/{project_id}/<path>.part, then write the final file
+   (known config files - package.json, tsconfig.json, … - are rendered
+   locally from the plan by core/scaffold, and models/types from the
+   frozen spec's entities by core/model_codegen, instead)
+5. Syntax-check every file (core/validator, in a process pool); a failing
+   file is regenerated with the error as feedback, within a retry budget
+   (each LLM file goes to a model tier picked by core/model_routing from its
+   kind and complexity; a retry moves one tier up). With speculation on,
+   critical files race several candidates and keep the first valid one
+6. Return manifest of created files
+
+refine_files() edits an existing workspace instead: the model returns
+unified diffs (core/patcher applies them fuzzily), so output tokens scale
+with the size of the change; a file whose diff doesn't apply is rewritten.
+
+Rebuilds are incremental: data/builds/{project_id}/manifest.json records the
+input hash (plan slice + dependency exports + CODER_PROMPT_VERSION) of every
+file, and files whose inputs did not change are reused from the workspace.
+After a delta re-plan, only the files the spec change concerns (`rework`,
+see core/spec_diff) and their dependents are regenerated; the rest are
+carried over even though their plan slice changed.
+Each finished file is checkpointed to data/builds/{project_id}/journal.jsonl
+right away, so a build that dies halfway resumes where it stopped.
+
+data/builds/{project_id}/symbols.json (core/symbol_index) indexes what each
+written file exports; a file's prompt lists the exports of its dependencies
+instead of leaving the model to guess names from the plan.
 """
 
 from __future__ import annotations
 import os
+import re
 import json
-from typing import Any, Dict, List
+import time
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-from core.llm_claude import claude_call as llm_call
+from core import llm_router, scaffold, model_codegen, multifile, validator, patcher, artifact_writer, model_routing
+from core.build_manifest import BuildManifest
+from core.file_graph import build_file_graph, topological_layers, classify_layer, LAYER_DOCS
+from core.plan_context import PlanContext
+from core.symbol_index import SymbolIndex
+from core.spec_manager import load_frozen_spec
 from core.logger import log
 
 
+# ---------- config ----------
+MAX_PARALLEL_FILES = int(os.getenv("CODER_MAX_PARALLEL", "4"))  # concurrent LLM calls per build
+BATCH_SMALL_FILES = os.getenv("CODER_BATCH_SMALL", "1") == "1"   # one request for several tiny files
+MAX_FILE_RETRIES = int(os.getenv("CODER_VALIDATION_RETRIES", "2"))  # regenerations per invalid file
+RETRY_BUDGET = int(os.getenv("CODER_RETRY_BUDGET", "10"))           # regenerations per build
+SPECULATIVE = os.getenv("CODER_SPECULATIVE", "0") == "1"           # race candidates for critical files
+SPECULATIVE_FANOUT = {  # candidates per model_routing.file_class, e.g. "entry=3,api=2"
+    k.strip(): int(v)
+    for k, v in (pair.split("=", 1) for pair in os.getenv("CODER_SPECULATIVE_FANOUT", "entry=3,api=2").split(",") if "=" in pair)
+}
+SPECULATIVE_TEMPERATURE_STEP = 0.15  # candidate i samples at temperature + i * step
+CODER_PROMPT_VERSION = "1"  # bump when _generate_file's prompts change → forces regeneration
+REFINE_MAX_TOKENS = int(os.getenv("CODER_REFINE_MAX_TOKENS", "4096"))     # diff reply of one refinement
+REWRITE_MAX_TOKENS = int(os.getenv("CODER_REWRITE_MAX_TOKENS", "16000"))  # cap for full-file fallbacks
+
+
 # ---------- main entrypoint ----------
-async def generate_code(project_id: str) -> Dict[str, Any]:
+async def generate_code(
+    project_id: str,
+    max_parallel: Optional[int] = None,
+    force: bool = False,
+    batch_small: Optional[bool] = None,
+    speculative: Optional[bool] = None,
+    plan: Optional[Dict[str, Any]] = None,
+    partial: bool = False,
+    rework: Optional[List[str]] = None,
+) -> Dict[str, Any]:
     """
     Generate all code files from a plan.
     
+    Files are generated concurrently (at most `max_parallel` LLM calls in
+    flight), but a file only starts once the files it depends on
+    (e.g. the types a component imports) have been generated.
+    Files whose inputs are unchanged since the last build are reused.
+    
     Args:
         project_id: ID of project (loads plan from data/plans/{id}.json)
+        max_parallel: concurrency limit (defaults to CODER_MAX_PARALLEL)
+        force: regenerate every file, ignoring the build manifest
+        batch_small: batch small files per request (defaults to CODER_BATCH_SMALL)
+        speculative: race several candidates for critical files (defaults to CODER_SPECULATIVE)
+        plan: use this plan instead of loading data/plans/{id}.json
+        partial: `plan` is still streaming (no "tasks" yet): files that read the
+                 whole plan (docs) are left to the run on the final plan
+        rework: files a spec change concerns (planner_agent.rework_scope); other
+                files whose plan inputs changed are kept unless they depend on one
         
     Returns:
         dict with:
             - file_count: number of files created
             - files: list of file paths
             - workspace_path: absolute path to workspace
+            - reused / regenerated: files taken from the last build / generated now
+            - resumed: reused files checkpointed by an interrupted build
+            - validation: files checked, files still failing, regenerations used
+            - routing: calls, seconds, output tokens and cost per model tier
     """
     
     # 1. Load plan
-    plan = _load_plan(project_id)
+    plan = plan if plan is not None else _load_plan(project_id)
     file_tree = plan.get('file_tree', [])
     file_count = len(file_tree) if isinstance(file_tree, list) else sum(len(v) for v in file_tree.values())
     log.info(f"[Coder] Loaded plan with {file_count} files to generate")
@@ -49,33 +129,666 @@ async def generate_code(project_id: str) -> Dict[str, Any]:
     all_files = _flatten_file_tree(plan.get("file_tree", {}))
     log.info(f"[Coder] Generating {len(all_files)} files...")
     
-    created_files = []
+    # 3b. Render models/types from spec entities (ground truth for the LLM files)
+    codegen = _render_spec_models(project_id, plan)
+    all_files = all_files + [f for f in codegen if f not in all_files]  # support files, e.g. models/base.py
     
-    # 4. Generate each file
-    for i, file_path in enumerate(all_files, 1):
-        log.info(f"[Coder] [{i}/{len(all_files)}] Generating {file_path}...")
-        
-        try:
-            code = await _generate_file(file_path, plan)
-            _write_file(workspace, file_path, code)
-            created_files.append(file_path)
-            log.success(f"[Coder] ✓ {file_path}")
-            
-        except Exception as e:
-            log.error(f"[Coder] ✗ Failed to generate {file_path}: {e}")
-            # Continue with other files instead of failing completely
+    # 4. Order files by dependencies
+    graph = build_file_graph(all_files, plan)
+    waves = topological_layers(graph)
+    log.info(f"[Coder] Dependency graph: {len(waves)} waves " + " → ".join(str(len(w)) for w in waves))
+    
+    # 5. Generate files (independent files in parallel)
+    limit = max(1, max_parallel or MAX_PARALLEL_FILES)
+    context = PlanContext(plan)
+    context.codegen = codegen
+    context.ground_truth = model_codegen.ground_truth(codegen)
+    # Within a wave, group files by prompt prefix to maximize prompt-cache hits
+    ordered = [f for wave in waves for f in sorted(wave, key=context.prefix_key)]
+    if partial:
+        ordered = [f for f in ordered if classify_layer(f) != LAYER_DOCS]
+    call_stats: Dict[str, Dict[str, Any]] = {}
+    generation = {path: {"files": 0, "llm_calls": 0, "seconds": 0.0} for path in ("scaffold", "codegen", "llm")}
+    generation["llm"]["retries"] = 0
+    generation["llm"]["speculative"] = {"files": 0, "candidates": 0, "cancelled": 0, "extra_wins": 0}
+    manifest = await asyncio.to_thread(BuildManifest, project_id)
+    if force:
+        manifest.files.clear()
+    symbols = await asyncio.to_thread(SymbolIndex, project_id)
+    batch = BATCH_SMALL_FILES if batch_small is None else batch_small
+    speculate = SPECULATIVE if speculative is None else speculative
+    scope = _with_dependents(rework, graph) if rework is not None else None
+    if scope is not None:
+        log.info(f"[Coder] Spec delta: reworking at most {len(scope)}/{len(all_files)} files")
+    results = await _generate_all(
+        ordered, graph, context, workspace, limit, call_stats, generation, manifest, batch, symbols, speculate,
+        scope,
+    )
+    manifest.retain(all_files)
+    symbols.retain(all_files)
+    await asyncio.to_thread(manifest.save)
+    await asyncio.to_thread(symbols.save)
+    validation = _summarize_validation(manifest, all_files, generation)
+    created_files = [f for f in all_files if results.get(f)]
+    reused = [f for f in created_files if results[f] == "reused"]
+    regenerated = [f for f in created_files if results[f] == "generated"]
+    resumed = [f for f in reused if f in manifest.resumed]
+    timings, prompt_cache = _summarize_calls(call_stats)
+    routing = model_routing.summarize(call_stats)
     
-    # 5. Return manifest
+    # 6. Return manifest
     log.success(f"[Coder] Code generation complete! {len(created_files)}/{len(all_files)} files created")
+    log.info(f"[Coder] Incremental build: {len(reused)} reused, {len(regenerated)} regenerated")
+    if resumed:
+        log.info(f"[Coder] Resumed an interrupted build: {len(resumed)} checkpointed files skipped")
+    log.info(f"[Coder] Symbol index: {len(symbols.files)} files, {symbols.parsed} (re-)parsed")
+    log.info(
+        f"[Coder] Scaffolded {generation['scaffold']['files']} files in {generation['scaffold']['seconds']:.3f}s, "
+        f"rendered {generation['codegen']['files']} models/types in {generation['codegen']['seconds']:.3f}s, "
+        f"{generation['llm']['llm_calls']} LLM calls took {generation['llm']['seconds']:.1f}s"
+    )
+    for tier, usage in routing.items():
+        log.info(
+            f"[Coder] Tier {tier}: {usage['calls']} calls, {usage['seconds']:.1f}s, "
+            f"{usage['output_tokens']} output tokens, ${usage['cost_usd']:.4f}"
+        )
+    speculation = generation["llm"]["speculative"]
+    if speculation["files"]:
+        log.info(
+            f"[Coder] Speculation: {speculation['files']} files raced {speculation['candidates']} candidates, "
+            f"{speculation['cancelled']} cancelled, {speculation['extra_wins']} won by an extra candidate"
+        )
+    if validation["failed"]:
+        log.warning(f"[Coder] {len(validation['failed'])} files still fail validation: {validation['failed']}")
+    savings = context.savings_summary()
+    log.info(f"[Coder] Plan context: {savings['slice_chars']}/{savings['full_chars']} chars sent ({savings['saved_pct']}% saved)")
+    if timings:
+        avg_ttft = sum(t["ttft"] for t in timings.values()) / len(timings)
+        log.info(f"[Coder] Average time-to-first-token: {avg_ttft:.2f}s over {len(timings)} files")
+    log.info(
+        f"[Coder] Prompt cache: {prompt_cache['cached_input_tokens']} cached / "
+        f"{prompt_cache['uncached_input_tokens']} uncached input tokens ({prompt_cache['hit_calls']} calls hit)"
+    )
     
     return {
         "file_count": len(created_files),
         "files": created_files,
         "workspace_path": workspace,
-        "failed_count": len(all_files) - len(created_files)
+        "failed_count": len(all_files) - len(created_files),
+        "reused": reused,
+        "regenerated": regenerated,
+        "resumed": resumed,
+        "build_manifest": manifest.path,
+        "symbol_index": symbols.path,
+        "generation": generation,
+        "validation": validation,
+        "routing": routing,
+        "context_savings": context.savings,
+        "timings": timings,
+        "prompt_cache": prompt_cache,
+    }
+
+
+# ---------- refinement ----------
+async def refine_files(
+    project_id: str,
+    feedback: str,
+    files: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Apply feedback (test failures, review notes, …) to the generated workspace.
+    
+    One LLM call returns a unified diff for every file that needs to change;
+    each diff is applied with fuzzy hunk matching (core/patcher) and
+    syntax-checked. Files whose diff doesn't apply or doesn't validate are
+    rewritten in full, with the feedback and the current content.
+    Refined files keep their manifest input hash, so the next generate_code()
+    reuses them as long as the plan doesn't change.
+    
+    Args:
+        project_id: ID of project (workspace data/workspace/{id})
+        feedback: what to change
+        files: files the change is about (default: files named in the
+               feedback, else every file of the plan)
+        
+    Returns:
+        dict with:
+            - files: files changed
+            - patched / rewritten / created: how each file was changed
+            - failed: file → reason, for files left untouched
+            - output_tokens: tokens generated for diffs + rewrites
+    """
+    plan = _load_plan(project_id)
+    workspace = f"data/workspace/{project_id}"
+    existing = [f for f in _flatten_file_tree(plan.get("file_tree", {})) if os.path.exists(os.path.join(workspace, f))]
+    if not existing:
+        raise FileNotFoundError(f"[Coder] No generated files in {workspace}, run generate_code first")
+    targets = _refine_targets(existing, feedback, files)
+    log.info(f"[Coder] Refining {len(targets)} files: {feedback[:80]}")
+    
+    current = await asyncio.to_thread(_read_files, workspace, targets)
+    context = PlanContext(plan)
+    stats: Dict[str, Any] = {}
+    diff = await _request_diffs(current, feedback, context, stats)
+    output_tokens = stats.get("output_tokens", 0)
+    
+    updated: Dict[str, str] = {}
+    outcome: Dict[str, str] = {}
+    rewrite: Dict[str, str] = {}  # file → why its diff was rejected
+    for raw_path, patch in patcher.parse_diff(diff).items():
+        file_path = patcher.resolve_path(raw_path, list(current)) or raw_path
+        if patch["deleted"]:
+            log.warning(f"[Coder] Ignoring deletion of {file_path} in refinement diff")
+            continue
+        if file_path not in current and not patch["new"]:
+            log.warning(f"[Coder] Ignoring diff for unknown file {raw_path}")
+            continue
+        if file_path not in current:
+            file_path = patcher.safe_path(file_path, workspace)
+            if file_path is None:
+                log.warning(f"[Coder] Ignoring new file outside the workspace: {raw_path}")
+                continue
+        try:
+            content = patcher.apply_patch("" if patch["new"] else current[file_path], patch["hunks"])
+        except patcher.PatchError as e:
+            rewrite[file_path] = str(e)
+            continue
+        error = validator.validate(file_path, content)
+        if error:
+            rewrite[file_path] = f"patched file fails the syntax check: {error}"
+            continue
+        updated[file_path] = content
+        outcome[file_path] = "created" if patch["new"] else "patched"
+    
+    failed: Dict[str, str] = {}
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_FILES)
+    
+    async def run_rewrite(file_path: str, reason: str) -> None:
+        nonlocal output_tokens
+        log.warning(f"[Coder] Diff for {file_path} rejected ({reason}), rewriting the file")
+        async with semaphore:
+            rewrite_stats: Dict[str, Any] = {}
+            try:
+                code = await _rewrite_file(file_path, current.get(file_path, ""), feedback, reason, context, rewrite_stats)
+            except Exception as e:
+                failed[file_path] = f"rewrite failed: {e}"
+                return
+            finally:
+                output_tokens += rewrite_stats.get("output_tokens", 0)
+        error = validator.validate(file_path, code)
+        if error:
+            failed[file_path] = f"rewrite fails the syntax check: {error}"
+            return
+        updated[file_path] = code
+        outcome[file_path] = "rewritten"
+    
+    await asyncio.gather(*(run_rewrite(f, reason) for f, reason in rewrite.items()))
+    
+    await asyncio.gather(*(_write_file(workspace, f, content) for f, content in updated.items()))
+    manifest = await asyncio.to_thread(BuildManifest, project_id)
+    symbols = await asyncio.to_thread(SymbolIndex, project_id)
+    for file_path, content in updated.items():
+        entry = manifest.files.get(file_path)
+        if entry:
+            manifest.record(file_path, entry["input_hash"], content, {"ok": True, "error": None, "attempts": 1})
+        symbols.update(file_path, content)
+    await asyncio.to_thread(manifest.save)
+    await asyncio.to_thread(symbols.save)
+    
+    changed = list(updated)
+    log.success(
+        f"[Coder] Refinement changed {len(changed)} files "
+        f"({sum(1 for o in outcome.values() if o == 'rewritten')} rewritten), {output_tokens} output tokens"
+    )
+    for file_path, reason in failed.items():
+        log.error(f"[Coder] ✗ Could not refine {file_path}: {reason}")
+    return {
+        "files": changed,
+        "patched": [f for f in changed if outcome[f] == "patched"],
+        "rewritten": [f for f in changed if outcome[f] == "rewritten"],
+        "created": [f for f in changed if outcome[f] == "created"],
+        "failed": failed,
+        "output_tokens": output_tokens,
+    }
+
+
+# ---------- scheduling ----------
+async def _generate_all(
+    files: List[str],
+    graph: Dict[str, List[str]],
+    context: PlanContext,
+    workspace: str,
+    limit: int,
+    call_stats: Dict[str, Dict[str, Any]],
+    generation: Dict[str, Dict[str, Any]],
+    manifest: Optional[BuildManifest] = None,
+    batch_small: bool = True,
+    symbols: Optional[SymbolIndex] = None,
+    speculative: bool = False,
+    rework: Optional[Set[str]] = None,
+) -> Dict[str, Optional[str]]:
+    """
+    Generate files concurrently while respecting the dependency graph.
+    
+    Every file gets an asyncio.Event that is set once it is finished
+    (successfully or not). A file waits for the events of its dependencies,
+    then for a semaphore slot, so at most `limit` LLM calls run at once.
+    A failed dependency does not block its dependents - they are still
+    generated from the plan, like before.
+    
+    A file that is fresh in the build manifest is reused right away
+    (no LLM call, no waiting on its dependencies); a file rendered by
+    core/model_codegen or core/scaffold is written immediately, also
+    without the LLM.
+    
+    The first file of each prompt-prefix group "primes" the provider's
+    prompt cache; the other files of that group wait for its first token
+    (the point where the cache entry exists) before they are sent.
+    
+    With `batch_small`, small files of the same wave, prompt prefix and
+    directory are generated together in one request (core/multifile) and
+    scheduled as one unit; files missing from the reply fall back to
+    single-file generation.
+    
+    Every LLM-generated file is syntax-checked (core/validator). An invalid
+    file is regenerated with the checker's error as feedback, at most
+    MAX_FILE_RETRIES times and RETRY_BUDGET times per build; after that the
+    last attempt is kept and marked as failed in the manifest.
+    
+    Every written file is added to `symbols`; an LLM file's prompt and input
+    hash include the exports of its dependencies. A file whose dependencies
+    are regenerated is therefore only checked for freshness once they have
+    landed - it is still reused if their exports did not change.
+    
+    With `speculative`, a file whose class has a SPECULATIVE_FANOUT > 1
+    (entrypoints, routers, …) is generated by several concurrent candidates,
+    as many as the provider's rate budget allows right now; the first one
+    that passes validation wins and the others are cancelled.
+    
+    Args:
+        files: file paths in topological order
+        graph: dependency mapping from build_file_graph()
+        context: per-build plan context (slices + savings)
+        workspace: base workspace directory
+        limit: max concurrent generations
+        call_stats: filled with the LLM call stats of each file
+        generation: per-path ("scaffold" / "codegen" / "llm") file counts, LLM calls and seconds
+        manifest: build manifest to reuse from and record into
+        batch_small: batch small files into multi-file requests
+        symbols: symbol index to update and to build export digests from
+        speculative: race candidates for files with a SPECULATIVE_FANOUT > 1
+        rework: if set, LLM files outside it are carried over (manifest
+                input hash updated) instead of regenerated
+        
+    Returns:
+        dict mapping file path → "generated", "reused" or None (failed)
+    """
+    done = {f: asyncio.Event() for f in files}
+    semaphore = asyncio.Semaphore(limit)
+    primers: Dict[str, asyncio.Event] = {}
+    results: Dict[str, Optional[str]] = {}
+    input_hashes: Dict[str, str] = {}
+    writes: Dict[str, asyncio.Future] = {}  # pending write-behind commits
+    plan_inputs: Dict[str, str] = {}  # plan slice + models of every LLM file
+    finished = 0
+    budget = RETRY_BUDGET
+    
+    def finish(file_path: str, outcome: Optional[str], note: str = "") -> None:
+        nonlocal finished
+        results[file_path] = outcome
+        finished += 1
+        if outcome == "reused":
+            log.info(f"[Coder] = [{finished}/{len(files)}] {file_path} {note or 'unchanged'}, reused")
+        elif outcome == "generated":
+            log.success(f"[Coder] ✓ [{finished}/{len(files)}] {file_path}{note}")
+        else:
+            if manifest:
+                manifest.forget(file_path)
+            log.error(f"[Coder] ✗ Failed to generate {file_path}: {note}")
+        done[file_path].set()
+    
+    def store(file_path: str, code: str, error: Optional[str], attempts: int) -> None:
+        writes[file_path] = _write_file(workspace, file_path, code)
+        if manifest:
+            validation = {"ok": error is None, "error": error, "attempts": attempts}
+            manifest.record(file_path, input_hashes[file_path], code, validation)
+        if symbols:
+            symbols.update(file_path, code)
+    
+    def exports_for(unit: List[str]) -> str:
+        """Export digest of the dependencies of `unit` (which must have landed)."""
+        if not symbols:
+            return ""
+        deps = dict.fromkeys(d for f in unit for d in graph.get(f, []) if d not in unit)
+        return symbols.digest(deps)
+    
+    async def reuse_if_fresh(file_path: str) -> bool:
+        """Compute the input hash of an LLM file; reuse it if the manifest says it is fresh."""
+        inputs = plan_inputs[file_path] + exports_for([file_path])
+        input_hashes[file_path] = BuildManifest.input_hash(file_path, inputs, CODER_PROMPT_VERSION)
+        if not manifest:
+            return False
+        note = ""
+        # freshness reads + hashes the workspace copy: off the event loop
+        if not await asyncio.to_thread(manifest.is_fresh, file_path, input_hashes[file_path], workspace):
+            if rework is None or file_path in rework:
+                return False
+            if not await asyncio.to_thread(manifest.carry_over, file_path, input_hashes[file_path], workspace):
+                return False
+            note = "outside the spec change"
+        if symbols:
+            await asyncio.to_thread(symbols.ensure, file_path, workspace, manifest.content_hash(file_path))
+        finish(file_path, "reused", note)
+        return True
+    
+    def may_retry(file_path: str, error: Optional[str], attempts: int) -> bool:
+        """Take one regeneration from the budget if `error` warrants it."""
+        nonlocal budget
+        if error is None:
+            return False
+        if attempts > MAX_FILE_RETRIES or budget <= 0:
+            log.warning(f"[Coder] {file_path} still invalid after {attempts} attempts ({error}), keeping it")
+            return False
+        budget -= 1
+        generation["llm"]["retries"] += 1
+        log.warning(f"[Coder] {file_path} failed validation ({error}), regenerating with feedback")
+        return True
+    
+    # 1. Reused + locally rendered files: no LLM, no waiting
+    pending: List[str] = []
+    for file_path in files:
+        started = time.monotonic()
+        try:
+            local = _render_locally(file_path, context)
+            if local is None:
+                plan_inputs[file_path] = context.slice_text(file_path) + context.models_for(file_path)
+                # files are in topological order: every dependency was handled above
+                if any(d in pending for d in graph.get(file_path, [])):
+                    pending.append(file_path)  # freshness is checked once the deps landed
+                elif not await reuse_if_fresh(file_path):
+                    pending.append(file_path)
+                continue
+            input_hashes[file_path] = BuildManifest.input_hash(file_path, local[1], local[2])
+            if manifest and await asyncio.to_thread(manifest.is_fresh, file_path, input_hashes[file_path], workspace):
+                if symbols:
+                    await asyncio.to_thread(symbols.ensure, file_path, workspace, manifest.content_hash(file_path))
+                finish(file_path, "reused")
+            else:
+                path_kind, content, _ = local
+                store(file_path, content, validator.validate(file_path, content), attempts=1)
+                _count(generation[path_kind], started)
+                finish(file_path, "generated", f" ({path_kind})")
+        except Exception as e:
+            finish(file_path, None, str(e))
+    
+    # 2. LLM files, small ones batched per wave + prompt prefix + directory
+    levels = _levels(files, graph)
+    units = (
+        multifile.plan_batches(pending, key=lambda f: f"{levels[f]}|{context.prefix_key(f)}")
+        if batch_small else [[f] for f in pending]
+    )
+    
+    async def generate_single(
+        file_path: str,
+        first_token: Optional[asyncio.Event] = None,
+        feedback: Optional[str] = None,
+        attempts: int = 0,
+    ) -> None:
+        route = model_routing.route(file_path, context.plan)
+        if feedback:
+            route = model_routing.escalate(route)  # retry of a failed batch member
+        try:
+            while True:
+                attempts += 1
+                async with semaphore:
+                    fanout = _fanout(file_path) if speculative else 1
+                    log.info(f"[Coder] Generating {file_path}" + (f" ({fanout} candidates)..." if fanout > 1 else "..."))
+                    stats: Dict[str, Any] = {}
+                    started = time.monotonic()
+                    try:
+                        if fanout > 1:
+                            code, error = await race(file_path, fanout, attempts, first_token, feedback, route)
+                        else:
+                            code = await _generate_file(
+                                file_path, context, workspace, stats, first_token, feedback,
+                                exports_for([file_path]), route,
+                            )
+                            call_stats[file_path if attempts == 1 else f"{file_path} [retry {attempts - 1}]"] = stats
+                    finally:
+                        _count(generation["llm"], started, files=0, llm_calls=fanout)
+                first_token = None
+                if fanout == 1:
+                    error = await validator.validate_async(file_path, code)
+                if not may_retry(file_path, error, attempts):
+                    break
+                feedback = error
+                route = model_routing.escalate(route)
+            store(file_path, code, error, attempts)
+            generation["llm"]["files"] += 1
+            finish(file_path, "generated", "" if error is None else " (invalid)")
+        except Exception as e:
+            finish(file_path, None, str(e))
+            # Continue with other files instead of failing completely
+    
+    async def race(
+        file_path: str,
+        fanout: int,
+        attempts: int,
+        first_token: Optional[asyncio.Event],
+        feedback: Optional[str],
+        route: Dict[str, Any],
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Generate `fanout` candidates of one file concurrently.
+        
+        Returns:
+            (code, validation error) of the first candidate that validates,
+            else of the first one that finished
+        """
+        key = file_path if attempts == 1 else f"{file_path} [retry {attempts - 1}]"
+        exports = exports_for([file_path])
+        speculation = generation["llm"]["speculative"]
+        speculation["files"] += 1
+        speculation["candidates"] += fanout
+        
+        async def candidate(i: int) -> Tuple[int, str, Optional[str]]:
+            stats: Dict[str, Any] = {}
+            spread = {**route, "temperature": round(min(1.0, route["temperature"] + i * SPECULATIVE_TEMPERATURE_STEP), 2)}
+            # only the first candidate streams into the .part file
+            code = await _generate_file(
+                file_path, context, workspace if i == 0 else None, stats, first_token, feedback, exports, spread
+            )
+            call_stats[key if i == 0 else f"{key} [candidate {i + 1}]"] = stats
+            return i, code, await validator.validate_async(file_path, code)
+        
+        tasks = [asyncio.create_task(candidate(i)) for i in range(fanout)]
+        fallback: Optional[Tuple[str, Optional[str]]] = None
+        failure: Optional[BaseException] = None
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    i, code, error = await next_done
+                except Exception as e:
+                    failure = e
+                    continue
+                if error is None:
+                    if i > 0:
+                        speculation["extra_wins"] += 1
+                    log.info(f"[Coder] {file_path}: candidate {i + 1}/{fanout} won")
+                    return code, None
+                fallback = fallback or (code, error)
+        finally:
+            losers = [t for t in tasks if not t.done()]
+            for task in losers:
+                task.cancel()
+            await asyncio.gather(*losers, return_exceptions=True)
+            speculation["cancelled"] += len(losers)
+        if fallback:
+            return fallback
+        raise failure or RuntimeError("no candidate finished")
+    
+    async def generate_batch(unit: List[str], first_token: Optional[asyncio.Event]) -> Dict[str, Optional[str]]:
+        """
+        One LLM call for several small files.
+        
+        Returns:
+            files to regenerate on their own → validation error (None if missing from the reply)
+        """
+        async with semaphore:
+            log.info(f"[Coder] Generating batch of {len(unit)}: {', '.join(unit)}...")
+            stats: Dict[str, Any] = {}
+            started = time.monotonic()
+            try:
+                parsed = await _generate_batch(unit, context, stats, first_token, exports_for(unit))
+            finally:
+                _count(generation["llm"], started, files=0, llm_calls=1)
+            call_stats["[batch] " + ", ".join(unit)] = stats
+        retry: Dict[str, Optional[str]] = {f: None for f in unit if f not in parsed}
+        for file_path, code in parsed.items():
+            error = await validator.validate_async(file_path, code)
+            if may_retry(file_path, error, attempts=1):
+                retry[file_path] = error
+                continue
+            store(file_path, code, error, attempts=1)
+            generation["llm"]["files"] += 1
+            finish(file_path, "generated", " (batched)" if error is None else " (batched, invalid)")
+        return retry
+    
+    async def run_unit(unit: List[str]) -> None:
+        first_token = None
+        try:
+            for file_path in unit:
+                for dep in graph.get(file_path, []):
+                    if dep in done and dep not in unit:
+                        await done[dep].wait()
+            unit = [f for f in unit if f in input_hashes or not await reuse_if_fresh(f)]
+            if not unit:
+                return
+            prefix = context.prefix_key(unit[0])
+            if prefix in primers:
+                await primers[prefix].wait()
+            else:
+                first_token = primers[prefix] = asyncio.Event()
+            if len(unit) == 1:
+                await generate_single(unit[0], first_token)
+                return
+            try:
+                retry = await generate_batch(unit, first_token)
+            except Exception as e:
+                log.warning(f"[Coder] Batch failed ({e}), generating its files one by one")
+                retry = {f: None for f in unit if f not in results}
+        finally:
+            if first_token:
+                first_token.set()  # also releases the group if the primer failed
+        for file_path, error in retry.items():
+            if error is None:
+                log.warning(f"[Coder] {file_path} missing from batch reply, generating it on its own")
+                await generate_single(file_path)
+            else:
+                await generate_single(file_path, feedback=error, attempts=1)
+    
+    # Units are created in topological order so earlier waves get slots first
+    await asyncio.gather(*(run_unit(u) for u in units))
+    
+    # Wait for the write-behind queue; a file that couldn't be written failed
+    committed = await asyncio.gather(*writes.values(), return_exceptions=True)
+    for file_path, error in zip(writes, committed):
+        if isinstance(error, Exception):
+            results[file_path] = None
+            if manifest:
+                manifest.forget(file_path)
+            log.error(f"[Coder] ✗ Failed to write {file_path}: {error}")
+    return results
+
+
+def _fanout(file_path: str) -> int:
+    """Speculative candidates for a file: its class's fan-out, bounded by the provider's free request budget."""
+    wanted = SPECULATIVE_FANOUT.get(model_routing.file_class(file_path), 1)
+    if wanted <= 1:
+        return 1
+    return max(1, min(wanted, llm_router.headroom()))
+
+
+def _with_dependents(files: List[str], graph: Dict[str, List[str]]) -> Set[str]:
+    """`files` plus everything that (transitively) depends on one of them."""
+    dependents: Dict[str, List[str]] = {}
+    for f, deps in graph.items():
+        for d in deps:
+            dependents.setdefault(d, []).append(f)
+    scope = set(files)
+    stack = list(scope)
+    while stack:
+        for f in dependents.get(stack.pop(), []):
+            if f not in scope:
+                scope.add(f)
+                stack.append(f)
+    return scope
+
+
+def _levels(files: List[str], graph: Dict[str, List[str]]) -> Dict[str, int]:
+    """Wave index of every file (files are given in topological order)."""
+    levels: Dict[str, int] = {}
+    for f in files:
+        levels[f] = 1 + max((levels[d] for d in graph.get(f, []) if d in levels), default=-1)
+    return levels
+
+
+def _render_locally(file_path: str, context: PlanContext) -> Optional[Tuple[str, str, str]]:
+    """
+    Content for files that don't need the LLM.
+    
+    Returns:
+        (path kind, content, version for the manifest input hash) or None
+    """
+    if file_path in context.codegen:
+        return "codegen", context.codegen[file_path], f"codegen-{model_codegen.CODEGEN_VERSION}"
+    content = scaffold.render(file_path, context.plan)
+    if content is not None:
+        return "scaffold", content, f"scaffold-{scaffold.SCAFFOLD_VERSION}"
+    return None
+
+
+def _summarize_validation(
+    manifest: BuildManifest,
+    files: List[str],
+    generation: Dict[str, Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Validation totals for the build (reused files keep their earlier result)."""
+    results = {f: manifest.validation(f) for f in files if manifest.validation(f)}
+    return {
+        "checked": len(results),
+        "failed": [f for f, v in results.items() if not v.get("ok")],
+        "retries": generation["llm"].get("retries", 0),
     }
 
 
+def _count(bucket: Dict[str, Any], started: float, files: int = 1, llm_calls: int = 0) -> None:
+    """Add files, LLM calls and wall time to a generation-path bucket."""
+    bucket["files"] += files
+    bucket["llm_calls"] += llm_calls
+    bucket["seconds"] = round(bucket["seconds"] + time.monotonic() - started, 4)
+
+
+def _summarize_calls(call_stats: Dict[str, Dict[str, Any]]):
+    """
+    Split per-file LLM stats into timings and prompt-cache totals.
+    
+    Returns:
+        (timings, prompt_cache) where timings maps path → {"ttft", "seconds"}
+    """
+    timings = {
+        path: {"ttft": stats.get("ttft", 0.0), "seconds": stats.get("duration", 0.0)}
+        for path, stats in call_stats.items()
+    }
+    cached = [stats.get("cached_input_tokens") or 0 for stats in call_stats.values()]
+    prompt_cache = {
+        "cached_input_tokens": sum(cached),
+        "uncached_input_tokens": sum(stats.get("uncached_input_tokens") or 0 for stats in call_stats.values()),
+        "hit_calls": sum(1 for c in cached if c),
+    }
+    return timings, prompt_cache
+
+
 # ---------- helper functions ----------
 def _load_plan(project_id: str) -> Dict[str, Any]:
     """
@@ -98,6 +811,30 @@ def _load_plan(project_id: str) -> Dict[str, Any]:
         return json.load(f)
 
 
+def _render_spec_models(project_id: str, plan: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Render model/type files from the frozen spec's entities.
+    
+    Returns an empty dict (every file goes to the LLM) if there is no
+    frozen spec, e.g. when the coder runs on a hand-written plan. A rendered
+    file that fails the syntax check is dropped, so the LLM writes it instead.
+    """
+    try:
+        spec = load_frozen_spec(project_id)
+    except FileNotFoundError:
+        log.warning(f"[Coder] No frozen spec for {project_id}, models/types will be generated by the LLM")
+        return {}
+    rendered = model_codegen.render_models(plan, spec)
+    for file_path, code in list(rendered.items()):
+        error = validator.validate(file_path, code)
+        if error:
+            log.warning(f"[Coder] Rendered {file_path} fails the syntax check ({error}), leaving it to the LLM")
+            del rendered[file_path]
+    if rendered:
+        log.info(f"[Coder] Rendered {len(rendered)} model/type files from spec entities")
+    return rendered
+
+
 def _flatten_file_tree(file_tree) -> List[str]:
     """
     Convert file_tree to flat list.
@@ -124,19 +861,40 @@ def _flatten_file_tree(file_tree) -> List[str]:
     return []
 
 
-async def _generate_file(file_path: str, plan: Dict[str, Any]) -> str:
+async def _generate_file(
+    file_path: str,
+    context: PlanContext,
+    workspace: Optional[str] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    first_token: Optional[asyncio.Event] = None,
+    feedback: Optional[str] = None,
+    exports: str = "",
+    route: Optional[Dict[str, Any]] = None,
+) -> str:
     """
     Generate code for a single file using LLM.
     
-    The prompt includes the ENTIRE plan as context since it already contains:
-    - stack (tech choices)
-    - entities (data models)
-    - api_routes (endpoints)
-    - dependencies (packages available)
+    The prompt is split into a cacheable prefix (the plan slice, identical
+    for every file with the same PlanContext.prefix_key) and a short
+    file-specific suffix. The system prompt is the same for the whole build.
+    
+    The prefix only includes the plan fields relevant to this file
+    (see PlanContext.fields_for), e.g.:
+    - stack (tech choices) - always
+    - entities (data models) - models, types, components, routes
+    - api_routes (endpoints) - routers, api-client, pages
+    - dependencies (packages available) - config + source files
     
     Args:
         file_path: relative path of file to generate (e.g. "components/DogCard.tsx")
-        plan: complete project plan
+        context: per-build plan context
+        workspace: if given, tokens are streamed into <workspace>/<file_path>.part
+                   as they arrive (removed once the final file is written)
+        stats: optional dict filled with LLM call metrics (ttft, duration, …)
+        first_token: optional event set as soon as the first token arrives
+        feedback: validation error of the previous attempt, if regenerating
+        exports: SymbolIndex digest of the files this one depends on
+        route: model tier + budget (defaults to model_routing.route(file_path))
         
     Returns:
         Generated code as string
@@ -147,8 +905,66 @@ async def _generate_file(file_path: str, plan: Dict[str, Any]) -> str:
     
     # Build type-specific instructions
     type_hints = _get_type_specific_instructions(file_ext, file_path)
+    system_prompt = _system_prompt(context.plan)
+    cache_prefix = _cache_prefix(file_path, context)
+    type_hints += _exports_section(exports)
+    if feedback:
+        type_hints += f"""
+
+PREVIOUS ATTEMPT WAS REJECTED by a syntax check:
+{feedback}
+Return the complete, corrected file (watch for unclosed brackets and truncation)."""
+
+    user_prompt = f"""Generate code for this file: {file_path}
+
+REQUIREMENTS:
+- File path: {file_path}
+- Use the tech stack, entities, API routes, and dependencies from the plan above
+- Make sure imports reference the correct paths based on file location
+- Include proper error handling where appropriate
+- Follow framework conventions for the stack being used
+{type_hints}
+
+Return ONLY the code content for this file, nothing else."""
+
+    route = route or model_routing.route(file_path, context.plan)
+    log.debug(f"[Coder] {file_path}: tier {route['tier']} ({route['reason']}), max_tokens={route['max_tokens']}")
+    chunks: List[str] = []
+    partial = _open_partial(workspace, file_path) if workspace else None
+    try:
+        async for chunk in llm_router.stream(
+            prompt=user_prompt,
+            system=system_prompt,
+            label="file",
+            tier=route["tier"],
+            temperature=route["temperature"],
+            max_tokens=route["max_tokens"],
+            stats=stats,
+            cache_prefix=cache_prefix,
+        ):
+            if first_token and not chunks:
+                first_token.set()
+            chunks.append(chunk)
+            if partial:
+                partial.write(chunk)  # buffered, written off the event loop
+    except BaseException:
+        # Don't leave a half-written .part behind (e.g. it would get deployed)
+        if partial:
+            await partial.discard()
+        raise
+    if partial:
+        await partial.close()
+    code = "".join(chunks)
+    
+    # Strip markdown code blocks if LLM added them (Claude sometimes does this)
+    code = _strip_markdown_blocks(code)
     
-    system_prompt = f"""You are an expert software engineer.
+    return code.strip()
+
+
+def _system_prompt(plan: Dict[str, Any]) -> str:
+    """System prompt shared by every file of a build (part of the cached prefix)."""
+    return f"""You are an expert software engineer.
 Generate production-ready code following best practices.
 Tech stack: {plan['stack'].get('frontend', 'N/A')} / {plan['stack'].get('backend', 'N/A')}
 
@@ -158,34 +974,194 @@ CRITICAL RULES:
 - Start directly with the first line of code (imports, etc.)
 - Use proper imports and types
 - Include brief inline comments for complex logic only
-- Make it functional and production-ready
-{type_hints}"""
+- Make it functional and production-ready"""
+
+
+def _cache_prefix(file_path: str, context: PlanContext) -> str:
+    """
+    Plan slice (+ spec-rendered models) for a file.
+    
+    Stable across every file with the same PlanContext.prefix_key, so the
+    provider serves it from its prompt cache.
+    """
+    plan_slice = context.for_file(file_path)
+    saved = context.savings[file_path]
+    log.debug(f"[Coder] {file_path}: plan context {saved['slice_chars']}/{saved['full_chars']} chars")
+    
+    cache_prefix = f"""PROJECT PLAN:
+{plan_slice}"""
+    models = context.models_for(file_path)
+    if models:
+        cache_prefix += f"""
+
+DATA MODELS (already generated from the spec - this is the ground truth:
+import these names and fields exactly, never redefine or rename them):
+{models}"""
+    return cache_prefix
 
-    user_prompt = f"""Generate code for this file: {file_path}
 
-PROJECT PLAN:
-{json.dumps(plan, indent=2)}
+def _exports_section(exports: str) -> str:
+    """File-specific prompt section listing the exports of already generated dependencies."""
+    if not exports:
+        return ""
+    return f"""
+
+ALREADY GENERATED FILES THIS CODE CAN IMPORT FROM (use these exact names, don't redefine them):
+{exports}"""
+
+
+async def _generate_batch(
+    file_paths: List[str],
+    context: PlanContext,
+    stats: Optional[Dict[str, Any]] = None,
+    first_token: Optional[asyncio.Event] = None,
+    exports: str = "",
+) -> Dict[str, str]:
+    """
+    Generate several small files in one LLM request.
+    
+    All files share the same prompt prefix (same PlanContext.prefix_key),
+    so the request reuses the build's cached prefix like a single file would.
+    
+    Args:
+        file_paths: files to generate together
+        context: per-build plan context
+        stats: optional dict filled with LLM call metrics
+        first_token: optional event set as soon as the first token arrives
+        exports: SymbolIndex digest of the files these depend on
+        
+    Returns:
+        dict path → code for every file that could be split out of the reply
+    """
+    cache_prefix = _cache_prefix(file_paths[0], context)
+    for file_path in file_paths[1:]:
+        context.for_file(file_path)  # record savings for the other members
+    
+    hints = []
+    for file_path in file_paths:
+        ext = file_path.split('.')[-1] if '.' in file_path else ''
+        type_hints = _get_type_specific_instructions(ext, file_path)
+        hints.append(f"- {file_path}" + ("\n  " + type_hints.replace("\n", "\n  ") if type_hints else ""))
+    file_list = "\n".join(hints)
+    
+    user_prompt = f"""Generate code for these {len(file_paths)} small files:
+{file_list}
 
 REQUIREMENTS:
-- File path: {file_path}
 - Use the tech stack, entities, API routes, and dependencies from the plan above
 - Make sure imports reference the correct paths based on file location
-- Include proper error handling where appropriate
 - Follow framework conventions for the stack being used
+- Keep each file minimal - these are small support files{_exports_section(exports)}
 
-Return ONLY the code content for this file, nothing else."""
+OUTPUT FORMAT (overrides the single-file rule for this request):
+{multifile.format_instructions(file_paths)}"""
 
-    code = await llm_call(
+    route = model_routing.route_many(file_paths, context.plan)
+    chunks: List[str] = []
+    async for chunk in llm_router.stream(
         prompt=user_prompt,
-        system=system_prompt,
-        temperature=0.3,  # Slightly creative but mostly deterministic
-        max_tokens=4096   # Enough for most files
-    )
+        system=_system_prompt(context.plan),
+        label="batch",
+        tier=route["tier"],
+        temperature=route["temperature"],
+        max_tokens=route["max_tokens"] * len(file_paths),
+        stats=stats,
+        cache_prefix=cache_prefix,
+    ):
+        if first_token and not chunks:
+            first_token.set()
+        chunks.append(chunk)
     
-    # Strip markdown code blocks if LLM added them (Claude sometimes does this)
-    code = _strip_markdown_blocks(code)
-    
-    return code.strip()
+    parts = multifile.split_files("".join(chunks), file_paths)
+    return {path: _strip_markdown_blocks(code).strip() for path, code in parts.items()}
+
+
+def _refine_targets(existing: List[str], feedback: str, files: Optional[List[str]]) -> List[str]:
+    """Files to send with a refinement request (see refine_files)."""
+    if files:
+        targets = [patcher.resolve_path(f, existing) for f in files]
+        missing = [f for f, t in zip(files, targets) if t is None]
+        if missing:
+            log.warning(f"[Coder] Not in the workspace, skipping: {missing}")
+        return list(dict.fromkeys(t for t in targets if t))
+    mentioned = [
+        f for f in existing
+        if f in feedback or re.search(rf"(?<![\w/.-]){re.escape(f.rsplit('/', 1)[-1])}(?![\w-])", feedback)
+    ]
+    return mentioned or existing
+
+
+async def _request_diffs(
+    current: Dict[str, str],
+    feedback: str,
+    context: PlanContext,
+    stats: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Ask for a unified diff implementing `feedback` against the `current` files."""
+    listing = "\n\n".join(
+        f"{multifile.START_MARKER.format(path=path)}\n{content}\n{multifile.END_MARKER}"
+        for path, content in current.items()
+    )
+    system_prompt = f"""You are an expert software engineer making small, scoped edits to an existing codebase.
+Tech stack: {context.plan['stack'].get('frontend', 'N/A')} / {context.plan['stack'].get('backend', 'N/A')}
+
+CRITICAL RULES:
+- Return ONLY a unified diff - no explanations, no markdown code blocks
+- Change only what the request requires; keep everything else byte-for-byte"""
+    user_prompt = f"""CHANGE REQUEST:
+{feedback}
+
+Return a unified diff (like `git diff`) of the files above:
+- a "--- a/<path>" and "+++ b/<path>" header per changed file, with the paths exactly as above
+- "@@ -start,count +start,count @@" hunks with 2-3 unchanged context lines copied exactly
+- "--- /dev/null" for a new file
+- leave out files that need no change"""
+    chunks: List[str] = []
+    async for chunk in llm_router.stream(
+        prompt=user_prompt,
+        system=system_prompt,
+        label="refine",
+        temperature=0.2,
+        max_tokens=REFINE_MAX_TOKENS,
+        stats=stats,
+        cache_prefix=f"CURRENT FILES:\n\n{listing}",
+    ):
+        chunks.append(chunk)
+    return "".join(chunks)
+
+
+async def _rewrite_file(
+    file_path: str,
+    content: str,
+    feedback: str,
+    reason: str,
+    context: PlanContext,
+    stats: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Full-file fallback of refine_files(), sized to the current file."""
+    user_prompt = f"""Rewrite this file: {file_path}
+
+CHANGE REQUEST:
+{feedback}
+
+A diff for this change could not be applied ({reason}).
+
+CURRENT CONTENT:
+{content or "(new file)"}
+
+Return the complete updated file - ONLY the code, nothing else."""
+    chunks: List[str] = []
+    async for chunk in llm_router.stream(
+        prompt=user_prompt,
+        system=_system_prompt(context.plan),
+        label="rewrite",
+        temperature=0.2,
+        max_tokens=min(REWRITE_MAX_TOKENS, max(4096, len(content) // 3 + 1024)),  # ~3 chars per token
+        stats=stats,
+        cache_prefix=_cache_prefix(file_path, context),
+    ):
+        chunks.append(chunk)
+    return _strip_markdown_blocks("".join(chunks)).strip()
 
 
 def _get_type_specific_instructions(file_ext: str, file_path: str) -> str:
@@ -247,25 +1223,49 @@ def _strip_markdown_blocks(code: str) -> str:
     return code
 
 
-def _write_file(workspace: str, file_path: str, content: str):
+def _open_partial(workspace: str, file_path: str) -> artifact_writer.StreamFile:
     """
-    Write generated code to workspace.
+    Stream into <workspace>/<file_path>.part while the file is generated.
     
-    Creates parent directories if they don't exist.
+    Lets the UI / logs follow a file as it is generated; the chunks are
+    appended from a worker thread (see artifact_writer.StreamFile), and the
+    final, cleaned-up content is written by _write_file().
+    """
+    return artifact_writer.StreamFile(os.path.join(workspace, file_path) + ".part")
+
+
+def _read_files(workspace: str, file_paths: List[str]) -> Dict[str, str]:
+    """Current content of workspace files (blocking: run it in a thread)."""
+    current: Dict[str, str] = {}
+    for file_path in file_paths:
+        with open(os.path.join(workspace, file_path), "r", encoding="utf-8") as f:
+            current[file_path] = f.read()
+    return current
+
+
+def _write_file(workspace: str, file_path: str, content: str) -> asyncio.Future:
+    """
+    Queue generated code for writing to the workspace.
+    
+    The write goes through core/artifact_writer (off the event loop, atomic
+    temp file + rename, parent directories created as needed); the
+    streaming .part file left by _generate_file() is removed once the
+    final file is in place.
     
     Args:
         workspace: base workspace directory
         file_path: relative file path
         content: code content to write
+        
+    Returns:
+        future that resolves once the file is committed
+    
+    Raises:
+        ValueError: if file_path would land outside the workspace
     """
+    if patcher.safe_path(file_path, workspace) is None:
+        raise ValueError(f"Refusing to write outside the workspace: {file_path}")
     full_path = os.path.join(workspace, file_path)
-    
-    # Create parent directories
-    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-    
-    # Write file
-    with open(full_path, "w", encoding="utf-8") as f:
-        f.write(content)
-    
-    log.debug(f"[Coder] Written {len(content)} bytes to {full_path}")
+    log.debug(f"[Coder] Writing {len(content)} bytes to {full_path}")
+    return artifact_writer.submit(full_path, content, replaces=full_path + ".part")
 
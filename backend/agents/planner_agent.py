@@ -8,27 +8,62 @@ consults optional context from the vector store,
 and asks Claude to produce a deterministic JSON project plan
 (stack, file tree, dependencies, tasks).
 
+Plans are cached by content hash (spec + extra_context + PROMPT_VERSION,
+see core/plan_store), so rebuilding an unchanged spec skips the LLM.
+
+The reply is parsed field by field while it streams. `tasks` is asked for
+last, so a caller can start coding (`on_code_ready`) as soon as the fields
+the coder reads (CODE_FIELDS) are complete, long before the plan is.
+
+A changed spec that is close (≤ DELTA_MAX_CHANGES changes, see core/spec_diff)
+to a recent plan of the project - an earlier build or a speculative plan of
+the live spec, see agents/speculative_planner - is delta re-planned
+(plan_delta): entity changes are patched locally, the model only sees and
+rewrites the plan keys the remaining changes affect, and the files the coder
+must rework are stored with the plan (rework_scope).
+
 The plan is later consumed by coder_agent.
 """
 
 from __future__ import annotations
+import os
 import json
-from typing import Any, Dict, Optional
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-# Switch between OpenAI and Claude
-# from core.llm_openai import openai_json_call as llm_json_call  # OpenAI (faster)
-from core.llm_claude import claude_json_call as llm_json_call  # Claude
+# Provider choice, hedging and failover live in the router (LLM_PRIMARY=claude|openai)
+from core.llm_router import json_call as llm_json_call
 
 # from core.vector_store import query_context    # semantic context
 from core.spec_manager import load_frozen_spec # spec retrieval
+from core.plan_store import (
+    plan_key, canonical_spec, load_plan_record, save_plan_record, put_plan_record, register_version,
+    recent_records, plan_versions,
+)
+from core.spec_diff import SpecDiff, diff_specs, patch_plan, affected_files
+from core import artifact_writer               # atomic, off-loop writes
 from core.logger import log                    # unified logger
 
+REQUIRED_FIELDS = ["stack", "dependencies", "file_tree", "tasks"]
+# Plan fields the coder needs (see core/plan_context); only docs read "tasks"
+CODE_FIELDS = ["stack", "dependencies", "file_tree", "api_routes", "entities"]
+
+# Bump whenever the prompt below changes: it is part of the plan cache key
+PROMPT_VERSION = "2"
+
+DELTA_MAX_CHANGES = int(os.getenv("PLANNER_DELTA_MAX_CHANGES", "6"))  # spec items added/removed
+DELTA_CANDIDATES = 5  # recent plans of the project compared against the spec
+
+_inflight: Dict[str, asyncio.Future] = {}  # plan key → planning task resolving to (plan, delta)
+
 
 # ---------- main public entrypoint ----------
 async def plan_application(
     project_id: str,
     spec_path: Optional[str] = None,
     extra_context: Optional[str] = None,
+    force_replan: bool = False,
+    on_code_ready: Optional[Callable[[Dict[str, Any]], None]] = None,
 ) -> Dict[str, Any]:
     """
     Build a deterministic project plan from a frozen spec.
@@ -37,6 +72,11 @@ async def plan_application(
         project_id: unique id for this build session
         spec_path: path to frozen spec JSON (if None → load from spec_manager)
         extra_context: optional manual context from user
+        force_replan: ignore a cached plan for the same spec and call the LLM
+        on_code_ready: called once, while the plan is still streaming, with the
+                       fields received so far as soon as all CODE_FIELDS are in
+                       (not called on a plan cache hit, a delta re-plan or if a
+                       field never comes)
 
     Returns:
         dict → structured plan.json ready for coder_agent
@@ -46,6 +86,154 @@ async def plan_application(
     spec = load_frozen_spec(project_id, spec_path)
     log.info(f"[Planner] Loaded spec for {project_id} with {len(spec)} keys")
 
+    # 1b. Reuse the plan of an identical spec ---------------------------------
+    key = plan_key(spec, extra_context, PROMPT_VERSION)
+    cached = None if force_replan else load_plan_record(key)
+    if cached is not None:
+        plan = cached["plan"]
+        log.success(f"[Planner] Plan cache hit for {project_id} ({key[:12]}), skipping LLM")
+        await asyncio.to_thread(register_version, project_id, key, PROMPT_VERSION)
+        await _store_plan(project_id, plan)
+        return plan
+
+    # 1c. A speculative plan of this exact spec may still be in flight --------
+    pending = None if force_replan else _inflight.get(key)
+    if pending is not None:
+        log.info(f"[Planner] Waiting for the speculative plan of {project_id} ({key[:12]})")
+        try:
+            plan, _ = await asyncio.shield(pending)  # stored by whoever started it
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise  # this call was cancelled, not the speculation
+        except Exception as e:
+            log.warning(f"[Planner] Speculative plan failed ({e}), planning now")
+        else:
+            await asyncio.to_thread(register_version, project_id, key, PROMPT_VERSION)
+            await _store_plan(project_id, plan)
+            return plan
+
+    # 2-4. Delta re-plan from a close earlier plan, else plan from scratch ----
+    streamed: Dict[str, Any] = {}
+
+    def on_field(field: str, value: Any) -> None:
+        if field in streamed:
+            return  # re-sent by a retried or hedged attempt: keep the first
+        streamed[field] = value
+        if field in CODE_FIELDS and all(k in streamed for k in CODE_FIELDS) and _code_ready(streamed):
+            log.info(f"[Planner] {', '.join(CODE_FIELDS)} streamed, coding can start")
+            on_code_ready(dict(streamed))
+
+    # registered as in flight, so a speculative run of the same spec joins it
+    task = asyncio.ensure_future(_make_plan(
+        project_id, spec, extra_context, on_field=on_field if on_code_ready else None, delta=not force_replan,
+    ))
+    _track_inflight(key, task)
+    plan, delta = await task
+
+    log.success(f"[Planner] Plan ready for {project_id}")
+
+    # 5. Persist plan ---------------------------------------------------------
+    # plan_store writes are synchronous: keep them off the event loop
+    await asyncio.to_thread(save_plan_record, project_id, key, plan, spec, extra_context, PROMPT_VERSION, delta)
+    await _store_plan(project_id, plan)
+
+    return plan
+
+
+# ---------- speculative planning ---------------------------------------------
+async def speculate(project_id: str, spec: Dict[str, Any], extra_context: Optional[str] = None) -> str:
+    """
+    Plan a live spec ahead of its freeze (driven by agents/speculative_planner).
+
+    The plan is stored under the spec's content hash and indexed as a
+    speculative plan of the project, but not made its current plan.
+    plan_application() takes it over if the frozen spec hashes the same
+    (waiting for it if it is still being made) and may delta-replan from
+    it otherwise.
+
+    Returns:
+        the plan key
+    """
+    key = plan_key(spec, extra_context, PROMPT_VERSION)
+    if load_plan_record(key) is not None:
+        return key
+    task = _inflight.get(key)
+    if task is not None:  # already being planned (speculatively or by a build): don't cancel it
+        await asyncio.shield(task)
+        return key
+    task = asyncio.ensure_future(_speculate(project_id, key, spec, extra_context))
+    _track_inflight(key, task)
+    await task
+    return key
+
+
+async def _speculate(
+    project_id: str,
+    key: str,
+    spec: Dict[str, Any],
+    extra_context: Optional[str],
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    plan, delta = await _make_plan(project_id, spec, extra_context)
+    await asyncio.to_thread(put_plan_record, key, plan, spec, extra_context, PROMPT_VERSION, delta)
+    await asyncio.to_thread(register_version, project_id, key, PROMPT_VERSION, speculative=True)
+    log.success(f"[Planner] Speculative plan ready for {project_id} ({key[:12]})")
+    return plan, delta
+
+
+def _track_inflight(key: str, task: asyncio.Future) -> None:
+    _inflight[key] = task
+    task.add_done_callback(lambda t: _forget_inflight(key, t))
+
+
+def _forget_inflight(key: str, task: asyncio.Future) -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled():
+        task.exception()  # retrieved here, re-raised to every waiter
+
+
+# ---------- planning ---------------------------------------------------------
+async def _make_plan(
+    project_id: str,
+    spec: Dict[str, Any],
+    extra_context: Optional[str],
+    on_field: Optional[Callable[[str, Any], None]] = None,
+    delta: bool = True,
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Plan `spec`: as a delta of the closest stored plan of the project if the
+    spec changed little since (see plan_delta), else from scratch.
+    `on_field` only fires for a full plan.
+
+    Returns:
+        (validated plan, delta info stored with it - base plan key, changes
+        and the files the coder has to rework - or None for a full plan)
+    """
+    base = _nearest_plan(project_id, spec, extra_context) if delta else None
+    if base is not None:
+        record, diff = base
+        try:
+            plan = await plan_delta(record["plan"], diff, extra_context)
+            _validate_plan(plan)
+            rework = affected_files(plan, diff)
+            return plan, {
+                "base": record["hash"],
+                "changes": diff.to_list(),
+                "rework": sorted(rework) if rework is not None else None,
+            }
+        except Exception as e:
+            log.warning(f"[Planner] Delta re-plan failed ({e}), planning from scratch")
+    plan = await _full_plan(spec, extra_context, on_field)
+    _validate_plan(plan)
+    return plan, None
+
+
+async def _full_plan(
+    spec: Dict[str, Any],
+    extra_context: Optional[str],
+    on_field: Optional[Callable[[str, Any], None]] = None,
+) -> Dict[str, Any]:
+    """Plan a spec from scratch (one streamed JSON call)."""
     # 2. Retrieve similar context from vector store --------------------------
     # TODO: Re-enable when vector store is ready
     # retrieved = query_context(json.dumps(spec)) or []
@@ -114,23 +302,110 @@ IMPORTANT RULES:
 4. Include key config files (package.json, requirements.txt, tsconfig.json)
 5. Include main components, pages, models, and API routes
 6. Don't generate exhaustive lists - focus on core functionality
+7. Keep the keys in exactly this order, with "tasks" last
 
 Return ONLY the JSON object, nothing else."""
 
-    # 4. Call LLM (OpenAI/Claude) --------------------------------------------
+    # 4. Call LLM (Claude/OpenAI via router) ---------------------------------
     log.info("[Planner] Sending prompt to LLM…")
-    plan = await llm_json_call(prompt=user_prompt, system=system_prompt)
-    # llm_json_call already returns parsed dict, no need to parse again
+    return await llm_json_call(
+        prompt=user_prompt, system=system_prompt, label="plan", required_keys=REQUIRED_FIELDS,
+        on_field=on_field,
+    )
+    # llm_json_call already returns parsed dict (continued / repaired if truncated)
 
-    # 5. Validate output -----------------------------------------------------
-    _validate_plan(plan)
-    log.success(f"[Planner] Plan ready for {project_id}")
 
-    # 6. Persist plan ---------------------------------------------------------
-    _store_plan(project_id, plan)
+async def plan_delta(
+    previous: Dict[str, Any],
+    diff: SpecDiff,
+    extra_context: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Update a plan for a changed spec.
 
-    return plan
+    Changes that map mechanically onto the plan (entities added/removed,
+    entity fields) are patched locally by core/spec_diff; only the rest go
+    to the model, together with just the plan keys they can affect, and
+    the model returns only the keys that change.
 
+    Args:
+        previous: plan of the old spec
+        diff: spec_diff.diff_specs(old spec, new spec)
+        extra_context: optional manual context from user
+
+    Returns:
+        updated plan (not validated)
+    """
+    patched, residual = patch_plan(previous, diff)
+    log.info(f"[Planner] Delta re-plan: {len(diff) - len(residual)}/{len(diff)} spec changes patched locally")
+    if not residual:
+        return patched
+
+    keys = residual.plan_keys(patched)
+    system_prompt = (
+        "You are an expert full-stack software architect. "
+        "You update existing project plans. Output ONLY a valid JSON object. "
+        "No markdown, no code blocks, no explanation - just raw JSON."
+    )
+    user_prompt = f"""The specification of an app changed. Update the affected parts of its project plan.
+
+SPECIFICATION CHANGES:
+{chr(10).join("- " + c.describe() for c in residual)}
+
+DETAILS:
+{json.dumps(residual.to_list(), indent=2)}
+
+CURRENT PLAN (affected keys only):
+{json.dumps({k: patched[k] for k in keys}, indent=2)}
+
+CONTEXT:
+{f"User Context:{chr(10)}{extra_context}" if extra_context else "No additional context"}
+
+Return ONLY a JSON object with those of the keys above that must change
+({", ".join(keys)}), each with its complete new value. Omit every key that
+stays the same. Keep existing file paths unless the change requires renaming them."""
+
+    updates = await llm_json_call(prompt=user_prompt, system=system_prompt, label="plan_delta")
+    unexpected = [k for k in updates if k not in keys]
+    if unexpected:
+        raise ValueError(f"delta changed plan keys outside its scope: {unexpected}")
+    log.info(f"[Planner] Delta re-plan changed {sorted(updates) or 'nothing'}")
+    return {**patched, **updates}
+
+
+def rework_scope(project_id: str) -> Optional[List[str]]:
+    """
+    Files the coder has to rework for the project's current plan.
+
+    Only known if that plan is a delta of the plan the project was built
+    with before (its previous version); None means "check every file".
+    """
+    versions = plan_versions(project_id)
+    if len(versions) < 2:
+        return None
+    record = load_plan_record(versions[-1]["hash"])
+    delta = (record or {}).get("delta")
+    if not delta or delta.get("base") != versions[-2]["hash"]:
+        return None
+    return delta.get("rework")
+
+
+def _nearest_plan(
+    project_id: str,
+    spec: Dict[str, Any],
+    extra_context: Optional[str],
+) -> Optional[Tuple[Dict[str, Any], SpecDiff]]:
+    """Closest recent plan record of the project within DELTA_MAX_CHANGES spec changes."""
+    target = canonical_spec(spec)
+    best = None
+    for record in recent_records(project_id, extra_context, PROMPT_VERSION, DELTA_CANDIDATES):
+        diff = diff_specs(record.get("spec", {}), target)
+        if 0 < len(diff) <= DELTA_MAX_CHANGES and (best is None or len(diff) < len(best[1])):
+            best = (record, diff)
+    if best is None:
+        return None
+    log.info(f"[Planner] Spec is {len(best[1])} changes away from plan {best[0]['hash'][:12]}, delta re-planning")
+    return best
 
 # ---------- helper functions ------------------------------------------------
 def _safe_parse_json(text: str) -> Dict[str, Any]:
@@ -146,8 +421,7 @@ def _safe_parse_json(text: str) -> Dict[str, Any]:
 
 def _validate_plan(plan: Dict[str, Any]) -> None:
     """Basic sanity checks on plan fields."""
-    required = ["stack", "dependencies", "file_tree", "tasks"]
-    missing = [k for k in required if k not in plan]
+    missing = [k for k in REQUIRED_FIELDS if k not in plan]
     if missing:
         raise ValueError(f"Planner output missing fields: {missing}")
     
@@ -157,11 +431,13 @@ def _validate_plan(plan: Dict[str, Any]) -> None:
         raise ValueError(f"file_tree must be list or dict, got {type(file_tree)}")
 
 
-def _store_plan(project_id: str, plan: Dict[str, Any]) -> None:
-    """Save plan.json under /data/plans/"""
-    import os
+def _code_ready(fields: Dict[str, Any]) -> bool:
+    """Streamed fields are usable by the coder (same checks as _validate_plan)."""
+    return isinstance(fields.get("file_tree"), (list, dict))
+
+
+async def _store_plan(project_id: str, plan: Dict[str, Any]) -> None:
+    """Save plan.json under /data/plans/ (atomically, without blocking the event loop)"""
     path = f"data/plans/{project_id}.json"
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(plan, f, indent=2)
+    await artifact_writer.write(path, json.dumps(plan, indent=2))
     log.info(f"[Planner] Plan stored → {path}")
@@ -0,0 +1,136 @@
+"""
+speculative_planner.py
+──────────────────────
+Plans the *live* spec in the background while the meeting is still running,
+so clicking Build rarely waits for a planner call.
+
+spec_manager notifies every live spec save. Once a project's spec has not
+changed for PLANNER_SPECULATIVE_DEBOUNCE seconds, planner_agent.speculate()
+plans it and stores the plan under the spec's content hash (core/plan_store).
+When the spec is frozen and built:
+  • same spec  → plan_application finds the plan by hash (no LLM call), or
+                 waits for the speculative call still making it
+  • close spec → plan_application delta re-plans from the nearest speculative
+                 plan instead of planning from scratch
+
+One speculative plan runs per project at a time; a spec that changed while
+it ran is planned next. Specs with no entities and no pages are skipped.
+
+Every speculative plan is a full planner call that may never be built, so
+this is opt-in: set PLANNER_SPECULATIVE=1 to enable it.
+"""
+
+import os
+import copy
+import asyncio
+from typing import Any, Dict, Optional
+
+from agents import planner_agent
+from core import spec_manager
+from core.logger import log
+
+ENABLED = os.getenv("PLANNER_SPECULATIVE", "0") == "1"  # opt-in: costs planner calls
+DEBOUNCE = float(os.getenv("PLANNER_SPECULATIVE_DEBOUNCE", "8"))  # seconds of a stable spec
+
+_planner: Optional["SpeculativePlanner"] = None
+
+
+# ----------------------------------------------------------------------------
+# Planner
+# ----------------------------------------------------------------------------
+class SpeculativePlanner:
+    """Debounces live spec changes per project and plans each settled spec."""
+
+    def __init__(self, debounce: float = DEBOUNCE):
+        self.loop = asyncio.get_running_loop()
+        self.debounce = debounce
+        self.stats = {"changes": 0, "runs": 0, "failed": 0}
+        self.keys: Dict[str, str] = {}  # project → plan key of its last planned spec
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+
+    def on_change(self, project_id: str, spec: Dict[str, Any]) -> None:
+        """spec_manager listener (may be called from any thread)."""
+        if spec.get("metadata", {}).get("status", "live") != "live":
+            return
+        snapshot = copy.deepcopy(spec)
+        try:
+            self.loop.call_soon_threadsafe(self._schedule, project_id, snapshot)
+        except RuntimeError:  # loop closed (shutting down)
+            pass
+
+    async def stop(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._running.clear()
+
+    def _schedule(self, project_id: str, spec: Dict[str, Any]) -> None:
+        self.stats["changes"] += 1
+        self._latest[project_id] = spec
+        timer = self._timers.pop(project_id, None)
+        if timer:
+            timer.cancel()
+        self._timers[project_id] = self.loop.call_later(self.debounce, self._fire, project_id)
+
+    def _fire(self, project_id: str) -> None:
+        self._timers.pop(project_id, None)
+        running = self._running.get(project_id)
+        if running and not running.done():
+            return  # _run picks up the newer spec when it finishes
+        self._running[project_id] = self.loop.create_task(self._run(project_id))
+
+    async def _run(self, project_id: str) -> None:
+        while True:
+            spec = self._latest[project_id]
+            if any(spec.get(k) for k in ("entities", "pages")):
+                self.stats["runs"] += 1
+                try:
+                    self.keys[project_id] = await planner_agent.speculate(project_id, spec)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    log.warning(f"[Speculative] Planning the live spec of {project_id} failed: {e}")
+            if self._latest.get(project_id) is spec or project_id in self._timers:
+                return  # up to date, or a newer spec is still settling
+
+
+# ----------------------------------------------------------------------------
+# Module API
+# ----------------------------------------------------------------------------
+def start() -> None:
+    """Subscribe to live spec changes (called on app startup; no-op if disabled)."""
+    global _planner
+    if not ENABLED or _planner is not None:
+        return
+    _planner = SpeculativePlanner()
+    spec_manager.add_change_listener(_planner.on_change)
+    log.info(f"[Speculative] Planning live specs after {DEBOUNCE:.0f}s without changes")
+
+
+async def stop() -> None:
+    """Unsubscribe and cancel pending speculative plans (called on app shutdown)."""
+    global _planner
+    if _planner is None:
+        return
+    spec_manager.remove_change_listener(_planner.on_change)
+    await _planner.stop()
+    _planner = None
+
+
+def metrics() -> Dict[str, Any]:
+    if _planner is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "debounce_s": _planner.debounce,
+        **_planner.stats,
+        "pending": sorted(_planner._timers),
+        "running": sorted(p for p, t in _planner._running.items() if not t.done()),
+    }
@@ -0,0 +1,352 @@
+"""
+artifact_writer.py
+──────────────────
+Non-blocking, atomic writer for workspace files and plans.
+
+Callers `submit()` a path + content and get a future; a background worker
+drains the write-behind queue in batches and commits them off the event
+loop (in a thread):
+  • every file is written to a unique temp file next to its target and
+    renamed over it (os.replace), so readers never see a half-written file
+  • parent directories are created once per batch (and remembered)
+  • with ARTIFACT_FSYNC_BATCH=N (> 0), files are committed in groups of N:
+    their data is fsynced before the renames and each touched directory
+    once after them; 0 (default) skips fsync - workspaces are regenerable
+  • two queued writes to the same path are coalesced (the last one wins)
+
+Safe for concurrent builds: one worker per event loop serializes the
+commits, and temp names are unique per process and write.
+Enqueue → commit latency and batch counters are exposed via `metrics()`.
+
+Also shared by the rest of the backend:
+  • write_atomic()  → the same temp file + rename, synchronously (for stores
+                      written from a thread or outside the event loop)
+  • StreamFile      → a file appended to while an LLM reply streams in
+                      (<file>.part), written from a thread, chunks coalesced
+"""
+
+import os
+import time
+import asyncio
+import itertools
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from core.logger import log
+
+WRITE_BATCH = int(os.getenv("ARTIFACT_WRITE_BATCH", "32"))   # files per commit round
+FSYNC_BATCH = int(os.getenv("ARTIFACT_FSYNC_BATCH", "0"))    # files per fsync group (0 = no fsync)
+LATENCY_WINDOW = 1000                                        # samples kept for quantiles
+
+_tmp_ids = itertools.count()
+_writer: Optional["ArtifactWriter"] = None
+_stats = {"writes": 0, "bytes": 0, "batches": 0, "coalesced": 0, "errors": 0, "fsyncs": 0}
+_latency: Deque[float] = deque(maxlen=LATENCY_WINDOW)  # seconds from submit() to commit
+
+Item = Tuple[str, str, Optional[str], "asyncio.Future", float]  # path, content, replaces, future, submitted
+
+
+# ----------------------------------------------------------------------------
+# Writer
+# ----------------------------------------------------------------------------
+class ArtifactWriter:
+    """Write-behind queue + commit worker bound to one event loop."""
+
+    def __init__(self, batch_size: int = WRITE_BATCH, fsync_batch: int = FSYNC_BATCH):
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Item]" = asyncio.Queue()
+        self.batch_size = max(1, batch_size)
+        self.fsync_batch = fsync_batch
+        self._dirs: Set[str] = set()  # directories known to exist
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, path: str, content: str, replaces: Optional[str] = None) -> "asyncio.Future":
+        """
+        Queue a write and return right away.
+
+        Args:
+            path: target file path
+            content: full file content
+            replaces: optional file superseded by this one (e.g. a streaming
+                      .part file), removed once the write is committed
+
+        Returns:
+            future resolved (None) once the file is in place, or failed with the OSError
+        """
+        future = self.loop.create_future()
+        self.queue.put_nowait((path, content, replaces, future, time.monotonic()))
+        if self._task is None or self._task.done():
+            self._task = self.loop.create_task(self._run())
+        return future
+
+    async def flush(self) -> None:
+        """Wait until everything queued so far is committed."""
+        await self.queue.join()
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self._commit(batch)
+            except Exception as e:  # never let the worker die with futures pending
+                for *_, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _commit(self, batch: List[Item]) -> None:
+        latest: Dict[str, Item] = {}
+        superseded: Dict[str, List[Item]] = {}
+        for item in batch:
+            if item[0] in latest:
+                superseded.setdefault(item[0], []).append(latest[item[0]])
+                _stats["coalesced"] += 1
+            latest[item[0]] = item
+
+        errors = await asyncio.to_thread(self._commit_files, list(latest.values()))
+
+        now = time.monotonic()
+        _stats["batches"] += 1
+        for path, item in latest.items():
+            error = errors.get(path)
+            for _, _, _, future, submitted in [*superseded.get(path, []), item]:
+                if future.done():  # caller gave up waiting
+                    continue
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(None)
+                    _latency.append(now - submitted)
+            if error:
+                _stats["errors"] += 1
+                log.error(f"[Writer] Failed to write {path}: {error}")
+            else:
+                _stats["writes"] += 1
+                _stats["bytes"] += len(item[1])
+
+    # ---------- runs in a worker thread ----------
+    def _commit_files(self, items: List[Item]) -> Dict[str, Exception]:
+        """Commit a batch; returns path → error for the files that failed."""
+        errors: Dict[str, Exception] = {}
+        for directory in {os.path.dirname(item[0]) or "." for item in items} - self._dirs:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                self._dirs.add(directory)
+            except OSError as e:
+                errors.update({item[0]: e for item in items if (os.path.dirname(item[0]) or ".") == directory})
+        items = [item for item in items if item[0] not in errors]
+
+        group = self.fsync_batch if self.fsync_batch > 0 else max(1, len(items))
+        for start in range(0, len(items), group):
+            staged: List[Tuple[Item, str]] = []
+            for item in items[start:start + group]:
+                try:
+                    staged.append((item, self._write_temp(item[0], item[1])))
+                except OSError as e:
+                    errors[item[0]] = e
+            touched: Set[str] = set()
+            for item, tmp in staged:
+                path, _, replaces, _, _ = item
+                try:
+                    os.replace(tmp, path)
+                    touched.add(os.path.dirname(path) or ".")
+                    if replaces and os.path.exists(replaces):
+                        os.remove(replaces)
+                except OSError as e:
+                    errors[path] = e
+                    _discard(tmp)
+            if self.fsync_batch > 0:
+                for directory in touched:
+                    _fsync_dir(directory)
+        return errors
+
+    def _write_temp(self, path: str, content: str) -> str:
+        directory = os.path.dirname(path) or "."
+        tmp = _temp_path(path)
+        try:
+            f = open(tmp, "w", encoding="utf-8")
+        except FileNotFoundError:  # directory removed since it was cached (e.g. workspace reset)
+            self._dirs.discard(directory)
+            os.makedirs(directory, exist_ok=True)
+            self._dirs.add(directory)
+            f = open(tmp, "w", encoding="utf-8")
+        try:
+            with f:
+                f.write(content)
+                if self.fsync_batch > 0:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    _stats["fsyncs"] += 1
+        except OSError:
+            _discard(tmp)
+            raise
+        return tmp
+
+
+# ----------------------------------------------------------------------------
+# Streaming files
+# ----------------------------------------------------------------------------
+class StreamFile:
+    """
+    File written incrementally from the event loop without blocking it.
+
+    write() only buffers; one background task at a time appends everything
+    buffered so far in a worker thread, so a burst of small chunks becomes
+    one write. Best effort: an I/O error stops the stream (logged), it never
+    fails the caller.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._pending: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+        self._file: Optional[Any] = None
+        self._broken = False
+
+    def write(self, chunk: str) -> None:
+        if self._broken:
+            return
+        self._pending.append(chunk)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def close(self) -> None:
+        """Wait for buffered chunks, then close the file."""
+        if self._task:
+            await self._task
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+
+    async def discard(self) -> None:
+        """Close and remove the file (e.g. the stream was abandoned)."""
+        self._pending.clear()
+        self._broken = True
+        await self.close()
+        await asyncio.to_thread(_discard, self.path)
+
+    async def _drain(self) -> None:
+        while self._pending and not self._broken:
+            data, self._pending = "".join(self._pending), []
+            try:
+                await asyncio.to_thread(self._append, data)
+            except OSError as e:
+                self._broken = True
+                log.warning(f"[Writer] Stopped streaming to {self.path}: {e}")
+
+    # ---------- runs in a worker thread ----------
+    def _append(self, data: str) -> None:
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(data)
+        self._file.flush()
+
+
+# ----------------------------------------------------------------------------
+# Module API
+# ----------------------------------------------------------------------------
+def get_writer() -> ArtifactWriter:
+    """The writer of the running event loop (created on first use)."""
+    global _writer
+    loop = asyncio.get_running_loop()
+    if _writer is None or _writer.loop is not loop:
+        _writer = ArtifactWriter()
+    return _writer
+
+
+def submit(path: str, content: str, replaces: Optional[str] = None) -> "asyncio.Future":
+    """Queue a write on the current loop's writer (see ArtifactWriter.submit)."""
+    return get_writer().submit(path, content, replaces)
+
+
+async def write(path: str, content: str, replaces: Optional[str] = None) -> None:
+    """Write a file atomically and wait until it is committed."""
+    await submit(path, content, replaces)
+
+
+async def shutdown() -> None:
+    """Commit everything still queued (called on app shutdown)."""
+    global _writer
+    if _writer is not None and _writer.loop is asyncio.get_running_loop():
+        await _writer.close()
+    _writer = None
+
+
+def metrics() -> Dict[str, Any]:
+    """Write counters, queue depth and enqueue → commit latency (ms)."""
+    ordered = sorted(_latency)
+
+    def quantile(q: float) -> Optional[float]:
+        if not ordered:
+            return None
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {
+        **_stats,
+        "queue_depth": _writer.queue.qsize() if _writer else 0,
+        "fsync_batch": FSYNC_BATCH,
+        "latency_ms": {"count": len(ordered), "p50": quantile(0.5), "p95": quantile(0.95), "max": quantile(1.0)},
+    }
+
+
+def write_atomic(path: str, content: str, fsync: bool = False) -> None:
+    """
+    Write a file synchronously via a unique temp file + rename, so readers
+    never see a partial file (parent directories are created as needed).
+
+    Blocks: call it from a thread (asyncio.to_thread) when on the event loop.
+    """
+    tmp = _temp_path(path)
+    try:
+        f = open(tmp, "w", encoding="utf-8")
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        f = open(tmp, "w", encoding="utf-8")
+    try:
+        with f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        _discard(tmp)
+        raise
+
+
+def _temp_path(path: str) -> str:
+    """Temp file next to `path`, unique per process and write."""
+    directory = os.path.dirname(path) or "."
+    return os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{next(_tmp_ids)}.tmp")
+
+
+def _fsync_dir(directory: str) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # not supported on this platform
+    try:
+        os.fsync(fd)
+        _stats["fsyncs"] += 1
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,209 @@
+"""
+build_manifest.py
+─────────────────
+Per-workspace record of what produced each generated file.
+
+  data/builds/{project_id}/manifest.json
+  {
+    "project_id": "...",
+    "updated_at": 1700000000.0,
+    "files": {
+      "frontend/types/dog.ts": {
+        "input_hash":   sha256(path + plan slice + coder prompt version),
+        "content_hash": sha256(file content as written),
+        "generated_at": 1700000000.0,
+        "validation":   {"ok": true, "error": null, "attempts": 1}
+      }, …
+    }
+  }
+
+On rebuild, a file whose input hash is unchanged and whose workspace copy
+still matches its content hash is reused instead of regenerated.
+
+Every record()/forget() is also appended to a checkpoint journal,
+
+  data/builds/{project_id}/journal.jsonl   (one entry per completed file)
+
+and replayed over manifest.json on load. If a build dies halfway (crash,
+LLM outage), the next one resumes: files finished before the failure are
+fresh again and are skipped after the usual workspace content check.
+save() folds the journal into manifest.json and removes it.
+
+Checkpoints are appended by one background thread per manifest, in order,
+so record()/forget() never wait for the disk; loading, save() and the
+freshness checks (which read the workspace file) belong in asyncio.to_thread
+when called from the event loop.
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional, Set
+
+from core.hashing import stable_hash, text_hash
+from core.artifact_writer import write_atomic
+from core.logger import log
+
+BUILD_DIR = "data/builds"
+
+
+class BuildManifest:
+    """Input/content hashes of the files of one project workspace."""
+
+    def __init__(self, project_id: str):
+        self.project_id = project_id
+        self.path = f"{BUILD_DIR}/{project_id}/manifest.json"
+        self.journal_path = f"{BUILD_DIR}/{project_id}/journal.jsonl"
+        self.files: Dict[str, Dict[str, Any]] = self._load()
+        self.resumed = self._replay_journal()  # files checkpointed by an interrupted build
+        self._journal = None
+        self._appender: Optional[ThreadPoolExecutor] = None  # writes the journal, in order
+
+    # ---------- hashing ----------
+    @staticmethod
+    def input_hash(file_path: str, plan_slice: str, prompt_version: str) -> str:
+        """Hash of everything the generated content of a file depends on."""
+        return stable_hash({"path": file_path, "plan": plan_slice, "prompt_version": prompt_version})
+
+    # ---------- queries ----------
+    def is_fresh(self, file_path: str, input_hash: str, workspace: str) -> bool:
+        """
+        True if `file_path` can be reused as-is.
+
+        Requires the same input hash as last time, a passed validation and
+        an untouched workspace copy (a hand-edited or deleted file is regenerated).
+        """
+        entry = self.files.get(file_path)
+        if not entry or entry.get("input_hash") != input_hash:
+            return False
+        if (entry.get("validation") or {}).get("ok") is False:
+            return False  # never keep a file that failed validation
+        content = _read(os.path.join(workspace, file_path))
+        return content is not None and text_hash(content) == entry.get("content_hash")
+
+    def content_hash(self, file_path: str) -> Optional[str]:
+        entry = self.files.get(file_path)
+        return entry.get("content_hash") if entry else None
+
+    def validation(self, file_path: str) -> Optional[Dict[str, Any]]:
+        entry = self.files.get(file_path)
+        return entry.get("validation") if entry else None
+
+    # ---------- updates ----------
+    def record(
+        self,
+        file_path: str,
+        input_hash: str,
+        content: str,
+        validation: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Remember the inputs, output and validation result of a freshly generated file."""
+        self.files[file_path] = {
+            "input_hash": input_hash,
+            "content_hash": text_hash(content),
+            "generated_at": time.time(),
+            "validation": validation,
+        }
+        self._checkpoint({"path": file_path, **self.files[file_path]})
+
+    def carry_over(self, file_path: str, input_hash: str, workspace: str) -> bool:
+        """
+        Keep a file whose inputs changed but which the change does not
+        concern (see core/spec_diff.affected_files): it must pass the same
+        checks as is_fresh() apart from the input hash, which is updated.
+        """
+        entry = self.files.get(file_path)
+        if not entry or not self.is_fresh(file_path, entry.get("input_hash"), workspace):
+            return False
+        self.files[file_path] = {**entry, "input_hash": input_hash}
+        self._checkpoint({"path": file_path, **self.files[file_path]})
+        return True
+
+    def forget(self, file_path: str) -> None:
+        if self.files.pop(file_path, None) is not None:
+            self._checkpoint({"path": file_path, "forget": True})
+
+    def retain(self, file_paths: Iterable[str]) -> None:
+        """Drop entries for files that are no longer part of the plan."""
+        keep = set(file_paths)
+        for path in [p for p in self.files if p not in keep]:
+            del self.files[path]
+
+    def save(self) -> None:
+        """Write the manifest atomically (temp file + rename)."""
+        data = {"project_id": self.project_id, "updated_at": time.time(), "files": self.files}
+        write_atomic(self.path, json.dumps(data, indent=2))
+        self.close()
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)  # everything in it is in manifest.json now
+        log.debug(f"[Manifest] Saved {len(self.files)} entries → {self.path}")
+
+    def close(self) -> None:
+        """Wait for pending checkpoints and close the journal (kept on disk until the next save())."""
+        if self._appender:
+            self._appender.shutdown(wait=True)
+            self._appender = None
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+    # ---------- helpers ----------
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("files", {})
+        except (OSError, json.JSONDecodeError) as e:
+            log.warning(f"[Manifest] Ignoring unreadable manifest {self.path}: {e}")
+            return {}
+
+    def _checkpoint(self, entry: Dict[str, Any]) -> None:
+        """Queue one entry for the journal (serialized now, appended by the background thread)."""
+        if self._appender is None:
+            self._appender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="manifest-journal")
+        self._appender.submit(self._append, json.dumps(entry) + "\n")
+
+    def _append(self, line: str) -> None:
+        """Background thread: append + flush, so the entry survives the process dying."""
+        try:
+            if self._journal is None:
+                os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write(line)
+            self._journal.flush()
+        except OSError as e:
+            log.warning(f"[Manifest] Could not checkpoint to {self.journal_path}: {e}")
+
+    def _replay_journal(self) -> Set[str]:
+        """Apply the journal of an interrupted build on top of manifest.json."""
+        if not os.path.exists(self.journal_path):
+            return set()
+        resumed: Set[str] = set()
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line of a killed process
+                path = entry.pop("path", None)
+                if not path:
+                    continue
+                if entry.get("forget"):
+                    self.files.pop(path, None)
+                    resumed.discard(path)
+                else:
+                    self.files[path] = entry
+                    resumed.add(path)
+        if resumed:
+            log.info(f"[Manifest] Journal of an interrupted build found, {len(resumed)} files checkpointed")
+        return resumed
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
@@ -0,0 +1,181 @@
+"""
+file_graph.py
+─────────────
+Infers a dependency DAG over the files of a plan's `file_tree`.
+
+The coder uses it to decide generation order:
+  • config + styles      → no dependencies
+  • types / models       → generated first
+  • lib / services       → depend on the types they wrap
+  • components / routes  → depend on the types + lib they import
+  • pages / entrypoints  → depend on the components / routers they mount
+  • docs (README)        → generated last
+
+Edges only ever point from a higher layer to a strictly lower one,
+so the graph is acyclic by construction.
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Set
+
+# ----------------------------------------------------------------------------
+# Layers
+# ----------------------------------------------------------------------------
+LAYER_CONFIG = 0
+LAYER_TYPES = 1
+LAYER_LIB = 2
+LAYER_FEATURE = 3
+LAYER_ENTRY = 4
+LAYER_DOCS = 5
+
+CONFIG_FILES = {
+    "package.json", "tsconfig.json", "requirements.txt", "pyproject.toml",
+    ".env", ".env.example", ".gitignore", "dockerfile", "next-env.d.ts",
+}
+STYLE_EXTS = {"css", "scss", "sass", "less"}
+TYPE_DIRS = {"types", "models", "schemas", "interfaces"}
+LIB_DIRS = {"lib", "utils", "hooks", "services", "core", "db", "store", "context"}
+FEATURE_DIRS = {"components", "api", "routes", "routers", "endpoints", "features"}
+ENTRY_DIRS = {"app", "pages"}
+ENTRY_FILES = {"main.py", "app.py", "app.tsx", "app.jsx", "main.tsx", "main.jsx", "index.tsx", "index.jsx"}
+
+
+# ----------------------------------------------------------------------------
+# Public API
+# ----------------------------------------------------------------------------
+def classify_layer(file_path: str) -> int:
+    """
+    Return the generation layer of a file based on its path.
+
+    Args:
+        file_path: relative path from the plan (e.g. "frontend/types/dog.ts")
+
+    Returns:
+        One of the LAYER_* constants
+    """
+    parts = file_path.lower().split("/")
+    name = parts[-1]
+    dirs = set(parts[:-1])
+    ext = name.rsplit(".", 1)[-1] if "." in name else ""
+
+    if name.startswith("readme") or ext == "md":
+        return LAYER_DOCS
+    if name in CONFIG_FILES or ".config." in name or ext in STYLE_EXTS:
+        return LAYER_CONFIG
+    if dirs & TYPE_DIRS or name.endswith(".d.ts"):
+        return LAYER_TYPES
+    if dirs & LIB_DIRS or name in {"database.py", "db.py", "config.py", "settings.py"}:
+        return LAYER_LIB
+    if dirs & FEATURE_DIRS:
+        return LAYER_FEATURE
+    if dirs & ENTRY_DIRS or name in ENTRY_FILES:
+        return LAYER_ENTRY
+    # Unknown source files sit with the features so they can see types + lib
+    return LAYER_FEATURE
+
+
+def build_file_graph(files: List[str], plan: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Infer which files each file should wait for before it is generated.
+
+    A file only depends on files of the same side (frontend/, backend/, root):
+      • lib files depend on the types/models they wrap
+      • features depend on matching types (by entity name) + all lib files
+      • entrypoints depend on every feature and lib file
+      • docs depend on everything else
+
+    Args:
+        files: flat list of file paths from the plan
+        plan: complete project plan (used for entity names)
+
+    Returns:
+        dict mapping each file path → list of file paths it depends on
+    """
+    entities = _entity_tokens(plan)
+    layers = {f: classify_layer(f) for f in files}
+    graph: Dict[str, List[str]] = {}
+
+    for f in files:
+        layer = layers[f]
+        side = _side(f)
+        same_side = [g for g in files if g != f and _side(g) == side]
+        deps: List[str] = []
+
+        if layer == LAYER_DOCS:
+            deps = [g for g in files if g != f and layers[g] != LAYER_DOCS]
+        elif layer in (LAYER_LIB, LAYER_FEATURE):
+            types = [g for g in same_side if layers[g] == LAYER_TYPES]
+            wanted = _file_tokens(f) & entities
+            matched = [g for g in types if _file_tokens(g) & wanted]
+            # lib files (api-client, db) and unmatched features see every type
+            deps = matched if (matched and layer == LAYER_FEATURE) else types
+            if layer == LAYER_FEATURE:
+                deps += [g for g in same_side if layers[g] == LAYER_LIB]
+        elif layer == LAYER_ENTRY:
+            deps = [g for g in same_side if layers[g] in (LAYER_TYPES, LAYER_LIB, LAYER_FEATURE)]
+
+        graph[f] = deps
+
+    return graph
+
+
+def topological_layers(graph: Dict[str, List[str]]) -> List[List[str]]:
+    """
+    Group files into waves: every file in a wave only depends on earlier waves.
+
+    Args:
+        graph: mapping produced by build_file_graph()
+
+    Returns:
+        list of waves, each a list of file paths (original order preserved)
+
+    Raises:
+        ValueError: if the graph contains a cycle
+    """
+    remaining = {f: set(d for d in deps if d in graph) for f, deps in graph.items()}
+    done: Set[str] = set()
+    waves: List[List[str]] = []
+
+    while remaining:
+        wave = [f for f, deps in remaining.items() if deps <= done]
+        if not wave:
+            raise ValueError(f"Dependency cycle between files: {sorted(remaining)}")
+        waves.append(wave)
+        done.update(wave)
+        for f in wave:
+            del remaining[f]
+
+    return waves
+
+
+# ----------------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------------
+def _side(file_path: str) -> str:
+    """Top-level folder (frontend / backend) or "" for root files."""
+    return file_path.split("/", 1)[0] if "/" in file_path else ""
+
+
+def _tokenize(text: str) -> Set[str]:
+    """Split CamelCase / snake_case / kebab-case into singular lowercase tokens."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    tokens = set()
+    for tok in re.split(r"[^A-Za-z0-9]+", text.lower()):
+        if len(tok) < 3:
+            continue
+        tokens.add(tok[:-1] if tok.endswith("s") and not tok.endswith("ss") else tok)
+    return tokens
+
+
+def _file_tokens(file_path: str) -> Set[str]:
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return _tokenize(stem)
+
+
+def _entity_tokens(plan: Dict[str, Any]) -> Set[str]:
+    tokens: Set[str] = set()
+    for entity in plan.get("entities", []) or []:
+        name = entity.get("name", "") if isinstance(entity, dict) else str(entity)
+        tokens |= _tokenize(name)
+    return tokens
@@ -0,0 +1,27 @@
+"""
+hashing.py
+──────────
+Canonical content hashing shared by the caches and build manifests.
+
+`stable_hash()` serializes any JSON-compatible value with sorted keys and
+no whitespace, so two structurally equal inputs always map to the same key.
+"""
+
+import hashlib
+import json
+from typing import Any
+
+
+def canonical_json(obj: Any) -> str:
+    """Deterministic JSON serialization (sorted keys, compact separators)."""
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def stable_hash(obj: Any) -> str:
+    """SHA-256 hex digest of the canonical JSON form of `obj`."""
+    return hashlib.sha256(canonical_json(obj).encode("utf-8")).hexdigest()
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 hex digest of a string (e.g. generated file contents)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -0,0 +1,352 @@
+"""
+json_stream.py
+──────────────
+Incremental JSON extraction for streamed LLM replies.
+
+`JsonStreamParser` is fed text chunks as they arrive and tracks the
+structure of the first JSON object in the reply:
+  • prose / markdown fences before the object are skipped
+  • a structural error (e.g. `]` closing a `{`) is detected immediately,
+    so the caller can abandon the stream instead of waiting for the end
+  • trailing commas are dropped on the fly
+  • if the reply stops early (max_tokens), `repaired()` cuts back to the
+    last complete value and closes every open string/array/object
+  • each top-level field is parsed as soon as its value is complete
+    (`fields` / `on_field`), so callers can act on a reply still streaming
+
+`stream_json()` drives a provider stream function through the parser and,
+on truncation, asks the model to *continue* its reply (assistant prefill)
+instead of re-running the whole generation. Used by claude_json_call and
+openai_json_call.
+"""
+
+import re
+import json
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.logger import log
+
+MAX_RETRIES = 3        # full regenerations (structural errors, unusable output)
+MAX_CONTINUATIONS = 2  # "keep going" requests after a max_tokens stop
+
+_LITERAL = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?|true|false|null")
+
+
+# ----------------------------------------------------------------------------
+# Incremental parser
+# ----------------------------------------------------------------------------
+class JsonStreamParser:
+    """Character-level state machine over a streamed JSON object."""
+
+    def __init__(self, on_field: Optional[Callable[[str, Any], None]] = None):
+        self.raw: List[str] = []       # every chunk received (for prefill)
+        self.out: List[str] = []       # cleaned JSON text from the first "{"
+        self.started = False
+        self.complete = False
+        self.error: Optional[str] = None
+        # stack entries: [container ("{" / "["), expecting ("key"/"colon"/"value"/"comma")]
+        self._stack: List[List[str]] = []
+        self._in_string = False
+        self._escape = False
+        self._token: List[str] = []    # bare literal / number being read
+        self._safe: Tuple[int, Tuple[str, ...]] = (0, ())
+        # completed top-level fields, in arrival order
+        self.fields: Dict[str, Any] = {}
+        self.on_field = on_field
+        self._key_start = 0            # offset in `out` of the top-level key being read
+        self._key: Optional[str] = None
+        self._value_start = 0          # offset in `out` of its value
+
+    # ---------- feeding ----------
+    def feed(self, chunk: str) -> None:
+        """Consume the next chunk of model output."""
+        self.raw.append(chunk)
+        for ch in chunk:
+            if self.complete or self.error:
+                return
+            self._step(ch)
+
+    @property
+    def raw_text(self) -> str:
+        return "".join(self.raw)
+
+    @property
+    def text(self) -> str:
+        """Cleaned JSON text seen so far (complete only if `self.complete`)."""
+        return "".join(self.out)
+
+    # ---------- results ----------
+    def repaired(self) -> str:
+        """
+        Best-effort valid JSON from what was received.
+
+        Complete objects are returned as-is (minus trailing commas).
+        Truncated ones are cut back to the last complete value, then every
+        open container is closed, e.g. `{"a": [1, 2, "thr` → `{"a": [1, 2]}`.
+        Nothing is invented: a container cut off before its first complete
+        value is dropped, and so is a trailing number (`12` may have been
+        `1234`). Does not change the parser state, so feeding may go on.
+        """
+        if self.complete:
+            return self.text
+        if not self.started:
+            return ""
+
+        cut, stack = self._safe
+        if "".join(self._token) in ("true", "false", "null"):
+            cut, stack = len(self.out), tuple(c for c, _ in self._stack)
+        text = "".join(self.out)[:cut].rstrip()
+        if text.endswith(","):
+            text = text[:-1]
+        closers = "".join("}" if c == "{" else "]" for c in reversed(stack))
+        return text + closers
+
+    def parse(self) -> Dict[str, Any]:
+        """
+        Parse the (possibly repaired) object.
+
+        Raises:
+            ValueError: if nothing usable was received
+        """
+        text = self.repaired()
+        if not text:
+            raise ValueError("No JSON object found in response")
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Unrepairable JSON: {e}") from e
+
+    # ---------- state machine ----------
+    def _step(self, ch: str) -> None:
+        if not self.started:
+            if ch != "{":
+                return
+            self.started = True
+
+        if self._in_string:
+            self.out.append(ch)
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                top = self._stack[-1]
+                if top[0] == "{" and top[1] == "key":
+                    top[1] = "colon"
+                    if len(self._stack) == 1:
+                        self._key = json.loads("".join(self.out[self._key_start:]))
+                else:
+                    self._value_done()
+            return
+
+        if self._token and not (ch.isalnum() or ch in ".+-"):
+            self._end_token()
+            if self.error:
+                return
+
+        if ch.isspace():
+            self.out.append(ch)
+        elif ch == '"':
+            if not self._expect_value_or_key():
+                return
+            self._in_string = True
+            self._key_start = len(self.out)
+            self.out.append(ch)
+        elif ch in "{[":
+            if self._stack and not self._expect_value():
+                return
+            self._stack.append([ch, "key" if ch == "{" else "value"])
+            self.out.append(ch)
+            if len(self._stack) == 1:
+                self._mark_safe()  # the reply's object itself; nested ones only once complete
+        elif ch in "}]":
+            opener = "{" if ch == "}" else "["
+            if not self._stack or self._stack[-1][0] != opener:
+                self.error = f"unexpected {ch!r} at offset {len(self.out)}"
+                return
+            if self._stack[-1][1] in ("colon", "value") and self._last_significant() not in ",[{":
+                self.error = f"missing value before {ch!r} at offset {len(self.out)}"
+                return
+            self._drop_trailing_comma()
+            self._stack.pop()
+            self.out.append(ch)
+            if self._stack:
+                self._value_done()
+            else:
+                self.complete = True
+        elif ch == ",":
+            top = self._stack[-1]
+            if top[1] != "comma":
+                return  # duplicated / stray comma: drop it
+            top[1] = "key" if top[0] == "{" else "value"
+            self.out.append(ch)
+        elif ch == ":":
+            top = self._stack[-1]
+            if top[0] != "{" or top[1] != "colon":
+                self.error = f"unexpected ':' at offset {len(self.out)}"
+                return
+            top[1] = "value"
+            self.out.append(ch)
+            if len(self._stack) == 1:
+                self._value_start = len(self.out)
+        else:
+            if not self._token and not self._expect_value():
+                return
+            self._token.append(ch)
+            self.out.append(ch)
+
+    def _expect_value(self) -> bool:
+        top = self._stack[-1]
+        if top[1] != "value":
+            self.error = f"unexpected value at offset {len(self.out)}"
+            return False
+        return True
+
+    def _expect_value_or_key(self) -> bool:
+        top = self._stack[-1]
+        if top[1] == "key" or top[1] == "value":
+            return True
+        self.error = f"unexpected string at offset {len(self.out)}"
+        return False
+
+    def _end_token(self) -> None:
+        if not self._token:
+            return
+        token = "".join(self._token)
+        self._token = []
+        if _LITERAL.fullmatch(token):
+            self._value_done()
+        else:
+            self.error = f"invalid literal {token!r}"
+
+    def _value_done(self) -> None:
+        self._stack[-1][1] = "comma"
+        self._mark_safe()
+        if len(self._stack) == 1 and self._key is not None:
+            self._field_done()
+
+    def _field_done(self) -> None:
+        key, self._key = self._key, None
+        try:
+            value = json.loads("".join(self.out[self._value_start:]))
+        except json.JSONDecodeError:
+            return  # left for parse() / repaired() to deal with
+        self.fields[key] = value
+        if self.on_field:
+            self.on_field(key, value)
+
+    def _mark_safe(self) -> None:
+        self._safe = (len(self.out), tuple(c for c, _ in self._stack))
+
+    def _last_significant(self) -> str:
+        for piece in reversed(self.out):
+            stripped = piece.strip()
+            if stripped:
+                return stripped[-1]
+        return ""
+
+    def _drop_trailing_comma(self) -> None:
+        for i in range(len(self.out) - 1, -1, -1):
+            if self.out[i].isspace():
+                continue
+            if self.out[i] == ",":
+                del self.out[i]
+            return
+
+
+# ----------------------------------------------------------------------------
+# Driver
+# ----------------------------------------------------------------------------
+async def stream_json(
+    stream_fn: Callable[..., Any],
+    prompt: str,
+    system: Optional[str],
+    tag: str,
+    required_keys: Optional[List[str]] = None,
+    on_field: Optional[Callable[[str, Any], None]] = None,
+    **kwargs: Any,
+) -> Dict[str, Any]:
+    """
+    Stream a JSON reply, validating as tokens arrive.
+
+    Flow per attempt:
+      1. stream the reply through JsonStreamParser (abort early on a structural error)
+      2. if the model hit max_tokens, request up to MAX_CONTINUATIONS continuations
+         (previous output sent back as assistant prefill)
+      3. repair locally (trailing commas, unterminated strings/arrays/objects)
+      4. only if the result is unusable (or misses `required_keys`) regenerate from scratch
+
+    Args:
+        stream_fn: provider stream function (claude_stream / openai_stream)
+        prompt: user prompt
+        system: system prompt
+        tag: log prefix, e.g. "Claude"
+        required_keys: top-level keys a repaired object must still contain
+        on_field: called with (key, value) as each top-level field completes;
+                  a regenerated attempt may report a key again
+        **kwargs: extra arguments for stream_fn (model, max_tokens, …)
+
+    Returns:
+        parsed JSON object
+
+    Raises:
+        ValueError: if no valid JSON could be obtained
+    """
+    for i in range(MAX_RETRIES):
+        parser = JsonStreamParser(on_field)
+        stats: Dict[str, Any] = {}
+        # A retry must not replay the cached (invalid) response
+        await _consume(stream_fn(prompt, system, json_mode=True, use_cache=(i == 0), stats=stats, **kwargs), parser)
+
+        continuations = 0
+        while (
+            parser.started and not parser.complete and not parser.error
+            and stats.get("stop_reason") in ("max_tokens", "cache")
+            and continuations < MAX_CONTINUATIONS
+        ):
+            continuations += 1
+            log.warning(
+                f"[{tag}] JSON truncated at {len(parser.text)} chars, "
+                f"requesting continuation {continuations}/{MAX_CONTINUATIONS}"
+            )
+            stats = {}
+            prefill = parser.raw_text.rstrip()  # providers reject trailing whitespace in prefill
+            await _consume(stream_fn(prompt, system, json_mode=True, stats=stats, prefill=prefill, **kwargs), parser)
+
+        if parser.error:
+            log.warning(f"[{tag}] Invalid JSON attempt {i+1}: {parser.error}. Response length: {len(parser.raw_text)} chars")
+            log.debug(f"[{tag}] Response preview: {parser.raw_text[:500]}...")
+            await asyncio.sleep(1)
+            continue
+
+        try:
+            result = parser.parse()
+        except ValueError as e:
+            log.warning(f"[{tag}] Invalid JSON attempt {i+1}: {e}. Response length: {len(parser.raw_text)} chars")
+            log.debug(f"[{tag}] Response preview: {parser.raw_text[:500]}...")
+            await asyncio.sleep(1)
+            continue
+
+        if not parser.complete:
+            missing = [k for k in (required_keys or []) if k not in result]
+            if missing:
+                log.warning(f"[{tag}] Repaired JSON is missing {missing}, regenerating (attempt {i+1})")
+                await asyncio.sleep(1)
+                continue
+            log.warning(f"[{tag}] Used locally repaired JSON ({len(parser.text)} chars received)")
+        return result
+
+    raise ValueError(f"[{tag}] Could not obtain valid JSON output after all retries")
+
+
+async def _consume(stream, parser: JsonStreamParser) -> None:
+    """Feed a stream into the parser, stopping early on a structural error."""
+    try:
+        async for chunk in stream:
+            parser.feed(chunk)
+            if parser.error:
+                break
+    finally:
+        await stream.aclose()
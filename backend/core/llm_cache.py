@@ -0,0 +1,312 @@
+"""
+llm_cache.py
+────────────
+Content-addressed response cache for the LLM wrappers.
+
+Responses are keyed by a hash of (provider, model, system, prompt,
+temperature, max_tokens, json_mode), so a rebuild that sends the exact same
+request is served locally instead of hitting the API.
+
+Tiers:
+  • memory → LRU of the most recent entries
+  • disk   → data/llm_cache/{key[:2]}/{key}.json, size-capped (oldest evicted)
+Both tiers honour a TTL.
+
+Modes (LLM_CACHE_MODE):
+  • "readwrite" (default) → serve hits, store misses
+  • "replay"              → serve hits, raise CacheMiss on a miss (offline tests/benchmarks)
+  • "off"                 → bypass the cache entirely
+
+The cache is pluggable: `set_cache()` accepts any object exposing
+`key()`, `aget()`, `aput()` and `stats()`. The LLM wrappers use the async
+`aget()` / `aput()`, which do the disk tier's I/O in a worker thread
+(memory hits never leave the event loop); `get()` / `put()` are the
+blocking equivalents.
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from core.hashing import stable_hash
+from core.artifact_writer import write_atomic
+from core.logger import log
+
+# ----------------------------------------------------------------------------
+# Config
+# ----------------------------------------------------------------------------
+CACHE_DIR = "data/llm_cache"
+CACHE_MODE = os.getenv("LLM_CACHE_MODE", "readwrite")
+MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+DISK_MAX_BYTES = int(os.getenv("LLM_CACHE_DISK_MB", "200")) * 1024 * 1024
+TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+
+MODES = ("off", "readwrite", "replay")
+
+
+class CacheMiss(RuntimeError):
+    """Raised in replay-only mode when a request has no recorded response."""
+
+
+# ----------------------------------------------------------------------------
+# Cache
+# ----------------------------------------------------------------------------
+class ResponseCache:
+    """Two-tier (memory LRU + disk) response cache with TTL and size-based eviction."""
+
+    def __init__(
+        self,
+        directory: str = CACHE_DIR,
+        mode: str = CACHE_MODE,
+        memory_entries: int = MEMORY_ENTRIES,
+        disk_max_bytes: int = DISK_MAX_BYTES,
+        ttl: int = TTL,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"[LLMCache] Unknown mode {mode!r}, expected one of {MODES}")
+        self.directory = directory
+        self.mode = mode
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._disk_bytes: Optional[int] = None  # computed lazily on first disk write
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "writes": 0, "evictions": 0, "expired": 0,
+        }
+
+    # ---------- keys ----------
+    @staticmethod
+    def key(
+        provider: str,
+        model: str,
+        system: Optional[str],
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        **extra: Any,
+    ) -> str:
+        """Content hash of everything that determines the completion."""
+        return stable_hash({
+            "provider": provider, "model": model, "system": system or "",
+            "prompt": prompt, "temperature": temperature, "max_tokens": max_tokens,
+            **extra,
+        })
+
+    # ---------- lookups ----------
+    def get(self, key: str) -> Optional[str]:
+        """
+        Return the cached response for `key`, or None on a miss.
+
+        Raises:
+            CacheMiss: on a miss in replay-only mode
+        """
+        if self.mode == "off":
+            return None
+        now = time.time()
+        text = self._get_memory(key, now)
+        if text is None:
+            text = self._get_disk(key, now)
+        return self._hit_or_miss(key, text)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() that reads the disk tier in a worker thread."""
+        if self.mode == "off":
+            return None
+        now = time.time()
+        text = self._get_memory(key, now)
+        if text is None:
+            text = await asyncio.to_thread(self._get_disk, key, now)
+        return self._hit_or_miss(key, text)
+
+    def put(self, key: str, text: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        """Store a response in both tiers (no-op unless mode is readwrite)."""
+        if self.mode != "readwrite":
+            return
+        created_at = time.time()
+        self._remember(key, created_at, text)
+        self._write_disk(key, {"created_at": created_at, "text": text, "meta": meta or {}})
+        with self._lock:
+            self._counters["writes"] += 1
+
+    async def aput(self, key: str, text: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        """put() that writes the disk tier in a worker thread."""
+        if self.mode != "readwrite":
+            return
+        created_at = time.time()
+        self._remember(key, created_at, text)
+        await asyncio.to_thread(self._write_disk, key, {"created_at": created_at, "text": text, "meta": meta or {}})
+        with self._lock:
+            self._counters["writes"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus tier sizes."""
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_entries"] = len(self._memory)
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        counters["hit_rate"] = round((lookups - counters["misses"]) / lookups, 3) if lookups else 0.0
+        counters["disk_bytes"] = self._disk_bytes
+        counters["mode"] = self.mode
+        return counters
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        for path, _, _ in self._disk_entries():
+            _silent_remove(path)
+        self._disk_bytes = 0
+
+    def _hit_or_miss(self, key: str, text: Optional[str]) -> Optional[str]:
+        if text is not None:
+            return text
+        with self._lock:
+            self._counters["misses"] += 1
+        if self.mode == "replay":
+            raise CacheMiss(f"[LLMCache] Replay-only mode: no cached response for key {key[:12]}…")
+        return None
+
+    # ---------- memory tier ----------
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] <= self.ttl:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return entry[1]
+            if entry:
+                del self._memory[key]
+                self._counters["expired"] += 1
+        return None
+
+    def _remember(self, key: str, created_at: float, text: str) -> None:
+        with self._lock:
+            self._memory[key] = (created_at, text)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    # ---------- disk tier ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _get_disk(self, key: str, now: float) -> Optional[str]:
+        """Disk tier lookup (promoted to memory on a hit); blocking."""
+        record = self._read_disk(key)
+        if record is None:
+            return None
+        if now - record["created_at"] <= self.ttl:
+            with self._lock:
+                self._counters["disk_hits"] += 1
+            self._remember(key, record["created_at"], record["text"])
+            return record["text"]
+        self._delete_disk(key)
+        with self._lock:
+            self._counters["expired"] += 1
+        return None
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            log.warning(f"[LLMCache] Dropping unreadable entry {path}: {e}")
+            self._delete_disk(key)
+            return None
+
+    def _write_disk(self, key: str, record: Dict[str, Any]) -> None:
+        path = self._path(key)
+        data = json.dumps(record, separators=(",", ":"))
+        try:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            write_atomic(path, data)  # unique temp name: safe for concurrent writers of a key
+        except OSError as e:
+            log.warning(f"[LLMCache] Could not write {path}: {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            else:
+                self._disk_bytes += len(data.encode("utf-8")) - previous
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._evict_disk()
+
+    def _delete_disk(self, key: str) -> None:
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+
+    def _disk_entries(self):
+        """Yield (path, size, mtime) for every file on disk."""
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.listdir(self.directory):
+            shard_dir = os.path.join(self.directory, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                path = os.path.join(shard_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _evict_disk(self) -> None:
+        """Remove the oldest files until the disk tier is back under 90% of its cap."""
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.disk_max_bytes * 0.9)
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            _silent_remove(path)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._counters["evictions"] += evicted
+        log.debug(f"[LLMCache] Evicted {evicted} disk entries ({total} bytes left)")
+
+
+def _silent_remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# ----------------------------------------------------------------------------
+# Global instance
+# ----------------------------------------------------------------------------
+_cache = ResponseCache()
+
+
+def get_cache() -> ResponseCache:
+    """Return the process-wide response cache."""
+    return _cache
+
+
+def set_cache(cache: ResponseCache) -> None:
+    """Swap in another cache implementation (e.g. replay-only for tests)."""
+    global _cache
+    _cache = cache
@@ -4,17 +4,23 @@ llm_claude.py
 Centralized interface to Anthropic Claude 3 API.
 
 Provides:
-  - `claude_call()` → async call with retry, timeout, JSON output control.
+  - `claude_stream()` → async iterator over text chunks (time-to-first-token in stats)
+  - `claude_call()` → async call with retry, timeout, JSON output control (built on the stream)
+  - response caching via core/llm_cache (identical requests are served locally)
+  - admission control via core/rate_limiter (RPM/TPM buckets, in-flight cap, retry-after)
   - consistent system/user message structure
   - error and token logging for analytics
 """
 
 import os
+import time
 import asyncio
-import json
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 from anthropic import AsyncAnthropic, APIError, RateLimitError, APIConnectionError
 
+from core.llm_cache import get_cache
+from core.json_stream import stream_json
+from core.rate_limiter import get_scheduler
 from core.logger import log
 
 
@@ -37,65 +43,149 @@ TEMPERATURE = 0.2  # keep deterministic for planning tasks
 
 
 # ---------------------------------------------------------------------------
-# Main function
+# Streaming
 # ---------------------------------------------------------------------------
-async def claude_call(
+class StreamInterrupted(RuntimeError):
+    """Raised when a stream fails after tokens were already yielded."""
+
+
+async def claude_stream(
     prompt: str,
     system: Optional[str] = None,
     model: str = MODEL,
     temperature: float = TEMPERATURE,
-    max_tokens: int = 8192,  # Increased for long JSON responses
+    max_tokens: int = 8192,
     json_mode: bool = False,
-) -> str:
+    use_cache: bool = True,
+    stats: Optional[Dict[str, Any]] = None,
+    prefill: Optional[str] = None,
+    cache_prefix: Optional[str] = None,
+) -> AsyncIterator[str]:
     """
-    Sends a single message to Claude asynchronously and returns text output.
+    Streams Claude's reply as text chunks while it is being generated.
+
+    Connection errors / rate limits are retried as long as nothing has been
+    yielded yet; once tokens went out a failure raises StreamInterrupted.
+    `TIMEOUT` applies to the gap between two chunks, not the whole reply.
 
     Args:
-        prompt: user content string
-        system: system instruction (role definition)
-        model: Claude model version
-        temperature: sampling temp (low for deterministic)
-        max_tokens: max tokens to generate
-        json_mode: set True to bias model towards valid JSON
+        prompt, system, model, temperature, max_tokens, json_mode, use_cache:
+            same as claude_call()
+        stats: optional dict filled with call metrics once the stream ends
+               (ttft, duration, stop_reason, input/output tokens,
+               cached vs uncached input tokens, cached)
+        prefill: partial assistant reply to continue from (e.g. after a
+                 max_tokens stop); only the continuation is yielded
+        cache_prefix: stable leading part of the user message shared by many
+                      calls (e.g. the plan); sent first and marked for
+                      provider-side prompt caching, `prompt` follows it
 
-    Returns:
-        Claude's reply as string (assistant text content)
+    Yields:
+        text deltas (a cache hit yields the whole reply as one chunk)
     """
-
+    stats = stats if stats is not None else {}
+    content: Any = prompt
+    if cache_prefix:
+        # Everything up to and including the marked block (system + prefix) is cached
+        content = [
+            {"type": "text", "text": cache_prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt},
+        ]
     messages = [
-        {"role": "user", "content": prompt}
+        {"role": "user", "content": content}
     ]
+    if prefill:
+        messages.append({"role": "assistant", "content": prefill})
+
+    cache = get_cache()
+    cache_key = cache.key("claude", model, system, prompt, temperature, max_tokens, json_mode=json_mode, prefill=prefill, cache_prefix=cache_prefix)
+    if use_cache or cache.mode == "replay":  # replay-only never reaches the API
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            log.debug(f"[Claude] Cache hit ({cache_key[:12]})")
+            stats.update({"model": model, "cached": True, "ttft": 0.0, "duration": 0.0, "stop_reason": "cache"})
+            yield cached
+            return
 
-    log.debug(f"[Claude] Sending to model={model}, json_mode={json_mode}")
+    log.debug(f"[Claude] Streaming from model={model}, json_mode={json_mode}")
 
-    # System message is passed as separate parameter to client.messages.create()
+    # System message is passed as separate parameter to client.messages.stream()
+    kwargs: Dict[str, Any] = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "messages": messages,
+        "extra_headers": {"anthropic-beta": "messages-2023-12-15"},
+    }
+    if system:
+        kwargs["system"] = system
 
-    # Retry loop for reliability
+    # Shared provider scheduler: RPM/TPM buckets + in-flight cap
+    scheduler = get_scheduler("claude")
+    estimate = scheduler.estimate_tokens(system, cache_prefix, prompt, prefill, max_tokens=max_tokens)
+
+    # Retry loop for reliability (only before the first token)
     for attempt in range(1, MAX_RETRIES + 1):
+        started = time.monotonic()
+        received: List[str] = []
         try:
-            response = await asyncio.wait_for(
-                client.messages.create(
-                    model=model,
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                    messages=messages,
-                    system=system,
-                    extra_headers={"anthropic-beta": "messages-2023-12-15"},
-                    # optionally we could add 'response_format': {'type': 'json_object'}
-                ),
-                timeout=TIMEOUT,
+            async with scheduler.slot(estimate) as slot:
+                async with client.messages.stream(**kwargs) as stream:
+                    chunks = stream.text_stream.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout=TIMEOUT)
+                        except StopAsyncIteration:
+                            break
+                        if not received:
+                            stats["ttft"] = round(time.monotonic() - started, 3)
+                            log.debug(f"[Claude] First token after {stats['ttft']}s")
+                        received.append(chunk)
+                        yield chunk
+                    final = await stream.get_final_message()
+                slot.record(final.usage.input_tokens + final.usage.output_tokens)
+
+            output = "".join(received)
+            usage = final.usage
+            cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+            cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+            input_tokens = usage.input_tokens + cache_read + cache_write  # usage.input_tokens excludes cache traffic
+            stats.update({
+                "model": model,
+                "cached": False,
+                "duration": round(time.monotonic() - started, 3),
+                "stop_reason": final.stop_reason,
+                "input_tokens": input_tokens,
+                "cached_input_tokens": cache_read,
+                "uncached_input_tokens": input_tokens - cache_read,
+                "cache_write_tokens": cache_write,
+                "output_tokens": usage.output_tokens,
+            })
+            stats.setdefault("ttft", stats["duration"])
+            log.success(
+                f"[Claude] Response received (tokens={usage.output_tokens}, ttft={stats['ttft']}s, "
+                f"input cached={cache_read} uncached={input_tokens - cache_read})"
             )
+            await cache.aput(cache_key, output, {"stop_reason": final.stop_reason})
+            return
 
-            output = _extract_text(response)
-            log.success(f"[Claude] Response received (tokens={response.usage.output_tokens})")
-            return output
+        except RateLimitError as e:
+            if received:
+                raise StreamInterrupted(f"[Claude] Stream interrupted after {len(received)} chunks: {e}") from e
+            # Pauses every Claude caller, not just this one (next slot() waits it out)
+            wait_time = scheduler.on_rate_limit(e, attempt)
+            log.warning(f"[Claude] Rate limited, retry {attempt}/{MAX_RETRIES}. Provider paused {wait_time}s")
 
-        except (RateLimitError, APIConnectionError) as e:
+        except APIConnectionError as e:
+            if received:
+                raise StreamInterrupted(f"[Claude] Stream interrupted after {len(received)} chunks: {e}") from e
             wait_time = 2 ** attempt
             log.warning(f"[Claude] Retry {attempt}/{MAX_RETRIES} after {e}. Waiting {wait_time}s")
             await asyncio.sleep(wait_time)
 
         except asyncio.TimeoutError:
+            if received:
+                raise StreamInterrupted(f"[Claude] Stream stalled for {TIMEOUT}s after {len(received)} chunks")
             log.error(f"[Claude] Timeout after {TIMEOUT}s on attempt {attempt}")
             await asyncio.sleep(2)
 
@@ -107,49 +197,73 @@ async def claude_call(
 
 
 # ---------------------------------------------------------------------------
-# Helpers
+# Main function
 # ---------------------------------------------------------------------------
-def _extract_text(response) -> str:
-    """Extracts text content from Anthropic message response object."""
-    try:
-        parts = response.content
-        if not parts:
-            return ""
-        # Each part may be a dict with {"type": "text", "text": "..."}
-        for p in parts:
-            if isinstance(p, dict) and p.get("type") == "text":
-                return p.get("text", "")
-        # fallback
-        if hasattr(parts[0], "text"):
-            return parts[0].text
-        return str(parts)
-    except Exception as e:
-        log.error(f"[Claude] Failed to parse response content: {e}")
-        return ""
+async def claude_call(
+    prompt: str,
+    system: Optional[str] = None,
+    model: str = MODEL,
+    temperature: float = TEMPERATURE,
+    max_tokens: int = 8192,  # Increased for long JSON responses
+    json_mode: bool = False,
+    use_cache: bool = True,
+    stats: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Sends a single message to Claude asynchronously and returns text output.
+
+    Built on claude_stream(): the chunks are collected into one string.
+
+    Args:
+        prompt: user content string
+        system: system instruction (role definition)
+        model: Claude model version
+        temperature: sampling temp (low for deterministic)
+        max_tokens: max tokens to generate
+        json_mode: set True to bias model towards valid JSON
+        use_cache: set False to skip the response cache lookup (result is still stored)
+        stats: optional dict filled with call metrics (see claude_stream)
+
+    Returns:
+        Claude's reply as string (assistant text content)
+    """
+    for attempt in range(1, MAX_RETRIES + 1):
+        chunks: List[str] = []
+        try:
+            async for chunk in claude_stream(
+                prompt, system, model, temperature, max_tokens, json_mode, use_cache, stats,
+            ):
+                chunks.append(chunk)
+            return "".join(chunks)
+        except StreamInterrupted as e:
+            # Nothing was handed to the caller yet, so a full restart is safe
+            log.warning(f"[Claude] Restarting call {attempt}/{MAX_RETRIES}: {e}")
+            await asyncio.sleep(2 ** attempt)
+
+    raise RuntimeError("[Claude] Failed after multiple retries")
 
 
 # ---------------------------------------------------------------------------
 # Optional: helper for structured JSON calls (used by planner/coder agents)
 # ---------------------------------------------------------------------------
-async def claude_json_call(prompt: str, system: str) -> dict:
+async def claude_json_call(
+    prompt: str,
+    system: str,
+    required_keys: Optional[List[str]] = None,
+    **kwargs: Any,
+) -> dict:
     """
     A stricter JSON-oriented wrapper that enforces valid JSON in the reply.
-    Retries until valid JSON or max attempts reached.
+
+    The reply is validated while it streams (core/json_stream): a reply cut
+    off by max_tokens is continued instead of regenerated, small defects are
+    repaired locally, and only unusable output triggers a full retry.
+
+    Args:
+        prompt: user content string
+        system: system instruction
+        required_keys: top-level keys a locally repaired object must contain
+        **kwargs: on_field (see stream_json), the rest is forwarded to
+                  claude_stream (model, max_tokens, …)
     """
-    for i in range(MAX_RETRIES):
-        text = await claude_call(prompt, system, json_mode=True)
-        try:
-            start = text.find("{")
-            end = text.rfind("}") + 1
-            if start == -1 or end == 0:
-                log.error(f"[Claude] No JSON braces found in response. Response preview: {text[:200]}")
-                await asyncio.sleep(1)
-                continue
-            json_str = text[start:end]
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            log.warning(f"[Claude] Invalid JSON attempt {i+1}: {e}. Response length: {len(text)} chars")
-            log.debug(f"[Claude] Response preview: {text[:500]}...")
-            await asyncio.sleep(1)
-
-    raise ValueError("[Claude] Could not obtain valid JSON output after all retries")
+    return await stream_json(claude_stream, prompt, system, "Claude", required_keys, **kwargs)
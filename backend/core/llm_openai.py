@@ -3,15 +3,20 @@ llm_openai.py
 ──────────────
 OpenAI GPT-4 interface (alternative to Claude).
 
-Provides same interface as llm_claude.py for easy swapping.
+Provides same interface as llm_claude.py for easy swapping:
+  - `openai_stream()` → async iterator over text chunks
+  - `openai_call()` / `openai_json_call()` → full replies (built on the stream)
 """
 
 import os
+import time
 import asyncio
-import json
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 from openai import AsyncOpenAI, APIError, RateLimitError, APIConnectionError
 
+from core.llm_cache import get_cache
+from core.json_stream import stream_json
+from core.rate_limiter import get_scheduler
 from core.logger import log
 
 
@@ -31,70 +36,161 @@ MODEL = "gpt-4o"  # GPT-4o is fast and smart
 MAX_RETRIES = 3
 TIMEOUT = 90  # seconds
 TEMPERATURE = 0.2  # keep deterministic for planning tasks
+CONTINUE_PROMPT = (
+    "Your previous reply was cut off. Continue it exactly where it stopped - "
+    "output only the remaining characters, without repeating anything."
+)
 
 
 # ---------------------------------------------------------------------------
-# Main function
+# Streaming
 # ---------------------------------------------------------------------------
-async def openai_call(
+class StreamInterrupted(RuntimeError):
+    """Raised when a stream fails after tokens were already yielded."""
+
+
+async def openai_stream(
     prompt: str,
     system: Optional[str] = None,
     model: str = MODEL,
     temperature: float = TEMPERATURE,
     max_tokens: int = 8192,
     json_mode: bool = False,
-) -> str:
+    use_cache: bool = True,
+    stats: Optional[Dict[str, Any]] = None,
+    prefill: Optional[str] = None,
+    cache_prefix: Optional[str] = None,
+) -> AsyncIterator[str]:
     """
-    Sends a message to OpenAI GPT and returns text output.
+    Streams GPT's reply as text chunks while it is being generated.
 
-    Args:
-        prompt: user content string
-        system: system instruction (role definition)
-        model: OpenAI model version
-        temperature: sampling temp (low for deterministic)
-        max_tokens: max tokens to generate
-        json_mode: set True to force JSON output
+    Same contract as llm_claude.claude_stream(): retries only before the
+    first chunk, `TIMEOUT` is the max gap between chunks, and `stats` is
+    filled with ttft / duration / stop_reason / token usage.
+    finish_reason "length" is reported as stop_reason "max_tokens".
+    OpenAI has no assistant prefill, so `prefill` is sent back as an
+    assistant turn followed by a "continue" instruction (JSON mode off,
+    since the continuation is not a standalone object).
+    OpenAI caches prompt prefixes automatically, so `cache_prefix` is simply
+    placed at the very start of the user message.
 
-    Returns:
-        GPT's reply as string
+    Yields:
+        text deltas (a cache hit yields the whole reply as one chunk)
     """
-
+    stats = stats if stats is not None else {}
     messages = []
     if system:
         messages.append({"role": "system", "content": system})
-    messages.append({"role": "user", "content": prompt})
+    messages.append({"role": "user", "content": f"{cache_prefix}\n\n{prompt}" if cache_prefix else prompt})
+    if prefill:
+        messages.append({"role": "assistant", "content": prefill})
+        messages.append({"role": "user", "content": CONTINUE_PROMPT})
+        json_mode = False
+
+    cache = get_cache()
+    cache_key = cache.key("openai", model, system, prompt, temperature, max_tokens, json_mode=json_mode, prefill=prefill, cache_prefix=cache_prefix)
+    if use_cache or cache.mode == "replay":  # replay-only never reaches the API
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            log.debug(f"[OpenAI] Cache hit ({cache_key[:12]})")
+            stats.update({"model": model, "cached": True, "ttft": 0.0, "duration": 0.0, "stop_reason": "cache"})
+            yield cached
+            return
+
+    log.debug(f"[OpenAI] Streaming from model={model}, json_mode={json_mode}")
 
-    log.debug(f"[OpenAI] Sending to model={model}, json_mode={json_mode}")
+    kwargs = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
 
-    # Retry loop for reliability
+    # Enable JSON mode if requested
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+
+    # Shared provider scheduler: RPM/TPM buckets + in-flight cap
+    scheduler = get_scheduler("openai")
+    estimate = scheduler.estimate_tokens(system, cache_prefix, prompt, prefill, max_tokens=max_tokens)
+
+    # Retry loop for reliability (only before the first token)
     for attempt in range(1, MAX_RETRIES + 1):
+        started = time.monotonic()
+        received: List[str] = []
+        finish_reason = None
+        usage = None
         try:
-            kwargs = {
+            async with scheduler.slot(estimate) as slot:
+                response = await asyncio.wait_for(
+                    client.chat.completions.create(**kwargs),
+                    timeout=TIMEOUT,
+                )
+                try:
+                    chunks = response.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout=TIMEOUT)
+                        except StopAsyncIteration:
+                            break
+                        if chunk.usage:
+                            usage = chunk.usage
+                        if not chunk.choices:
+                            continue
+                        finish_reason = chunk.choices[0].finish_reason or finish_reason
+                        delta = chunk.choices[0].delta.content
+                        if not delta:
+                            continue
+                        if not received:
+                            stats["ttft"] = round(time.monotonic() - started, 3)
+                            log.debug(f"[OpenAI] First token after {stats['ttft']}s")
+                        received.append(delta)
+                        yield delta
+                finally:
+                    await response.close()
+                slot.record(usage.total_tokens if usage else None)
+
+            output = "".join(received)
+            details = getattr(usage, "prompt_tokens_details", None) if usage else None
+            cache_read = (getattr(details, "cached_tokens", None) or 0) if details else 0
+            stats.update({
                 "model": model,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-            }
-            
-            # Enable JSON mode if requested
-            if json_mode:
-                kwargs["response_format"] = {"type": "json_object"}
-
-            response = await asyncio.wait_for(
-                client.chat.completions.create(**kwargs),
-                timeout=TIMEOUT,
+                "cached": False,
+                "duration": round(time.monotonic() - started, 3),
+                "finish_reason": finish_reason,
+                "stop_reason": "max_tokens" if finish_reason == "length" else finish_reason,
+                "input_tokens": usage.prompt_tokens if usage else None,
+                "cached_input_tokens": cache_read,
+                "uncached_input_tokens": (usage.prompt_tokens - cache_read) if usage else None,
+                "output_tokens": usage.completion_tokens if usage else None,
+            })
+            stats.setdefault("ttft", stats["duration"])
+            log.success(
+                f"[OpenAI] Response received (tokens={stats['output_tokens']}, ttft={stats['ttft']}s, "
+                f"input cached={cache_read} uncached={stats['uncached_input_tokens']})"
             )
+            await cache.aput(cache_key, output, {"finish_reason": finish_reason})
+            return
 
-            output = response.choices[0].message.content
-            log.success(f"[OpenAI] Response received (tokens={response.usage.completion_tokens})")
-            return output
+        except RateLimitError as e:
+            if received:
+                raise StreamInterrupted(f"[OpenAI] Stream interrupted after {len(received)} chunks: {e}") from e
+            # Pauses every OpenAI caller, not just this one (next slot() waits it out)
+            wait_time = scheduler.on_rate_limit(e, attempt)
+            log.warning(f"[OpenAI] Rate limited, retry {attempt}/{MAX_RETRIES}. Provider paused {wait_time}s")
 
-        except (RateLimitError, APIConnectionError) as e:
+        except APIConnectionError as e:
+            if received:
+                raise StreamInterrupted(f"[OpenAI] Stream interrupted after {len(received)} chunks: {e}") from e
             wait_time = 2 ** attempt
             log.warning(f"[OpenAI] Retry {attempt}/{MAX_RETRIES} after {e}. Waiting {wait_time}s")
             await asyncio.sleep(wait_time)
 
         except asyncio.TimeoutError:
+            if received:
+                raise StreamInterrupted(f"[OpenAI] Stream stalled for {TIMEOUT}s after {len(received)} chunks")
             log.error(f"[OpenAI] Timeout after {TIMEOUT}s on attempt {attempt}")
             await asyncio.sleep(2)
 
@@ -106,21 +202,65 @@ async def openai_call(
 
 
 # ---------------------------------------------------------------------------
-# Optional: helper for structured JSON calls
+# Main function
 # ---------------------------------------------------------------------------
-async def openai_json_call(prompt: str, system: str) -> dict:
+async def openai_call(
+    prompt: str,
+    system: Optional[str] = None,
+    model: str = MODEL,
+    temperature: float = TEMPERATURE,
+    max_tokens: int = 8192,
+    json_mode: bool = False,
+    use_cache: bool = True,
+    stats: Optional[Dict[str, Any]] = None,
+) -> str:
     """
-    JSON-oriented wrapper that enforces valid JSON in the reply.
+    Sends a message to OpenAI GPT and returns text output.
+
+    Built on openai_stream(): the chunks are collected into one string.
+
+    Args:
+        prompt: user content string
+        system: system instruction (role definition)
+        model: OpenAI model version
+        temperature: sampling temp (low for deterministic)
+        max_tokens: max tokens to generate
+        json_mode: set True to force JSON output
+        use_cache: set False to skip the response cache lookup (result is still stored)
+        stats: optional dict filled with call metrics (see openai_stream)
+
+    Returns:
+        GPT's reply as string
     """
-    for i in range(MAX_RETRIES):
-        text = await openai_call(prompt, system, json_mode=True)
+    for attempt in range(1, MAX_RETRIES + 1):
+        chunks: List[str] = []
         try:
-            # OpenAI with json_mode should return pure JSON
-            return json.loads(text)
-        except json.JSONDecodeError as e:
-            log.warning(f"[OpenAI] Invalid JSON attempt {i+1}: {e}")
-            log.debug(f"[OpenAI] Response preview: {text[:500]}...")
-            await asyncio.sleep(1)
+            async for chunk in openai_stream(
+                prompt, system, model, temperature, max_tokens, json_mode, use_cache, stats,
+            ):
+                chunks.append(chunk)
+            return "".join(chunks)
+        except StreamInterrupted as e:
+            # Nothing was handed to the caller yet, so a full restart is safe
+            log.warning(f"[OpenAI] Restarting call {attempt}/{MAX_RETRIES}: {e}")
+            await asyncio.sleep(2 ** attempt)
+
+    raise RuntimeError("[OpenAI] Failed after multiple retries")
+
 
-    raise ValueError("[OpenAI] Could not obtain valid JSON output after all retries")
+# ---------------------------------------------------------------------------
+# Optional: helper for structured JSON calls
+# ---------------------------------------------------------------------------
+async def openai_json_call(
+    prompt: str,
+    system: str,
+    required_keys: Optional[List[str]] = None,
+    **kwargs: Any,
+) -> dict:
+    """
+    JSON-oriented wrapper that enforces valid JSON in the reply.
 
+    Shares the streaming extractor / continuation / repair logic with
+    claude_json_call (see core/json_stream.stream_json).
+    """
+    return await stream_json(openai_stream, prompt, system, "OpenAI", required_keys, **kwargs)
@@ -0,0 +1,358 @@
+"""
+llm_router.py
+─────────────
+One `call` / `json_call` / `stream` interface over Claude and OpenAI.
+
+  • Provider order: LLM_PRIMARY (default "claude") first, the other one second.
+    A provider without an API key is simply unavailable.
+  • Hedging: if the primary has not answered by its observed p95 latency
+    (per provider + call label, e.g. "plan" / "file"), a duplicate request
+    goes to the secondary; the first valid answer wins, the other is cancelled.
+  • Failover: an error/timeout on one provider moves to the other; a provider
+    with too many consecutive failures has its circuit opened for a cooldown
+    and is skipped (tried again half-open afterwards).
+
+  • Tiers: a call may name a model tier ("fast" / "balanced" / "strong",
+    see core/model_routing); each provider maps it to one of its models,
+    and latency + cost are accounted per tier.
+
+Latency histograms and circuit states are exposed via `metrics()`.
+"""
+
+import os
+import time
+import asyncio
+import importlib
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from core import model_routing
+from core.rate_limiter import get_scheduler
+from core.logger import log
+
+# ----------------------------------------------------------------------------
+# Config
+# ----------------------------------------------------------------------------
+PRIMARY = os.getenv("LLM_PRIMARY", "claude")
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "1") == "1"
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 5      # no hedging until the primary has a latency profile
+HEDGE_MIN_DELAY = 1.0      # never hedge sooner than this (seconds)
+FAILURE_THRESHOLD = 3      # consecutive failures before the circuit opens
+COOLDOWN = 30              # seconds a circuit stays open
+HISTOGRAM_WINDOW = 200     # recent samples kept per (provider, label)
+BUCKETS = [0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300]  # seconds
+
+PROVIDERS = {
+    "claude": ("core.llm_claude", "claude_call", "claude_json_call", "claude_stream"),
+    "openai": ("core.llm_openai", "openai_call", "openai_json_call", "openai_stream"),
+}
+
+
+# ----------------------------------------------------------------------------
+# Latency histogram + circuit breaker
+# ----------------------------------------------------------------------------
+class LatencyHistogram:
+    """Sliding-window latency samples with bucketed counts and quantiles."""
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def buckets(self) -> Dict[str, int]:
+        counts = {f"<={b}s": 0 for b in BUCKETS}
+        counts[f">{BUCKETS[-1]}s"] = 0
+        for s in self.samples:
+            for b in BUCKETS:
+                if s <= b:
+                    counts[f"<={b}s"] += 1
+                    break
+            else:
+                counts[f">{BUCKETS[-1]}s"] += 1
+        return counts
+
+
+class CircuitBreaker:
+    """Opens after FAILURE_THRESHOLD consecutive failures, half-opens after COOLDOWN."""
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= COOLDOWN:
+            return "half-open"
+        return "open"
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.failures >= FAILURE_THRESHOLD or self.state == "half-open":
+            self.opened_at = time.monotonic()
+
+
+_histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+_breakers: Dict[str, CircuitBreaker] = {name: CircuitBreaker() for name in PROVIDERS}
+_modules: Dict[str, Any] = {}
+
+
+# ----------------------------------------------------------------------------
+# Public API
+# ----------------------------------------------------------------------------
+async def call(
+    prompt: str,
+    system: Optional[str] = None,
+    label: str = "default",
+    primary: Optional[str] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    tier: Optional[str] = None,
+    **kwargs: Any,
+) -> str:
+    """
+    Text completion with hedging + failover.
+
+    Args:
+        prompt: user content string
+        system: system instruction
+        label: latency class for hedging decisions (e.g. "plan", "file")
+        primary: override LLM_PRIMARY for this call
+        stats: optional dict filled with the winning call's stats (+ "provider")
+        tier: model tier (core/model_routing); picks each provider's model for it
+        **kwargs: forwarded to the provider call (temperature, max_tokens, …)
+
+    Returns:
+        reply text of the first provider that answered validly
+    """
+    return await _hedged("call", label, primary, stats, prompt, system, tier=tier, **kwargs)
+
+
+async def json_call(
+    prompt: str,
+    system: str,
+    label: str = "json",
+    primary: Optional[str] = None,
+    tier: Optional[str] = None,
+    **kwargs: Any,
+) -> dict:
+    """
+    JSON completion with hedging + failover (validation happens per provider,
+    see core/json_stream).
+    """
+    return await _hedged("json_call", label, primary, None, prompt, system, tier=tier, **kwargs)
+
+
+async def stream(
+    prompt: str,
+    system: Optional[str] = None,
+    label: str = "default",
+    primary: Optional[str] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    tier: Optional[str] = None,
+    **kwargs: Any,
+) -> AsyncIterator[str]:
+    """
+    Streaming completion with failover (no hedging: chunks can't be un-sent).
+
+    If a provider fails before its first chunk the next one is tried;
+    a failure after that propagates to the caller.
+    """
+    stats = stats if stats is not None else {}
+    last_error: Optional[BaseException] = None
+
+    for name in _provider_order(primary):
+        started = time.monotonic()
+        yielded = False
+        try:
+            async for chunk in _function(name, "stream")(prompt, system, stats=stats, **_for_tier(name, tier, kwargs)):
+                yielded = True
+                yield chunk
+        except Exception as e:
+            _breakers[name].failure()
+            if yielded:
+                raise
+            last_error = e
+            log.warning(f"[Router] {name} failed before first token ({e}), failing over")
+            continue
+        _record(name, label, time.monotonic() - started, stats, tier)
+        stats["provider"] = name
+        return
+
+    raise RuntimeError(f"[Router] All providers failed: {last_error}")
+
+
+def headroom(primary: Optional[str] = None) -> int:
+    """Requests the first available provider could start right now (see ProviderScheduler.headroom)."""
+    order = _provider_order(primary)
+    return get_scheduler(order[0]).headroom() if order else 0
+
+
+def metrics() -> Dict[str, Any]:
+    """Circuit states and latency histograms per provider/label."""
+    return {
+        "primary": PRIMARY,
+        "circuits": {
+            name: {"state": b.state, "consecutive_failures": b.failures}
+            for name, b in _breakers.items() if _load(name) is not None
+        },
+        "latency": {
+            f"{name}/{label}": {
+                "count": len(h.samples),
+                "p50": h.quantile(0.5),
+                "p95": h.quantile(0.95),
+                "buckets": h.buckets(),
+            }
+            for (name, label), h in _histograms.items()
+        },
+    }
+
+
+# ----------------------------------------------------------------------------
+# Hedging
+# ----------------------------------------------------------------------------
+async def _hedged(
+    kind: str,
+    label: str,
+    primary: Optional[str],
+    stats: Optional[Dict[str, Any]],
+    prompt: str,
+    system: Optional[str],
+    **kwargs: Any,
+):
+    order = _provider_order(primary)
+    if not order:
+        raise RuntimeError("[Router] No LLM provider available (check API keys)")
+
+    run_stats: Dict[str, Dict[str, Any]] = {}
+    providers: Dict[asyncio.Task, str] = {}
+
+    def launch(name: str) -> asyncio.Task:
+        run_stats[name] = {}
+        task = asyncio.create_task(_attempt(kind, name, label, prompt, system, run_stats[name], **kwargs))
+        providers[task] = name
+        return task
+
+    pending = {launch(order[0])}
+    backups: List[str] = order[1:]
+    last_error: Optional[BaseException] = None
+
+    hedge_after = _hedge_delay(order[0], label) if HEDGE_ENABLED else None
+    try:
+        if backups and hedge_after is not None:
+            done, _ = await asyncio.wait(pending, timeout=hedge_after)
+            if not done:
+                log.info(f"[Router] {order[0]} slower than p95 ({hedge_after:.1f}s), hedging to {backups[0]}")
+                pending.add(launch(backups.pop(0)))
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = providers[task]
+                if task.exception() is None:
+                    if stats is not None:
+                        stats.update(run_stats[name], provider=name)
+                    return task.result()
+                last_error = task.exception()
+                log.warning(f"[Router] {name} failed: {last_error}")
+            if not pending and backups:
+                name = backups.pop(0)
+                log.info(f"[Router] Failing over to {name}")
+                pending.add(launch(name))
+    finally:
+        for task in pending:
+            task.cancel()  # the loser of a hedge, or every attempt if we were cancelled
+
+    raise RuntimeError(f"[Router] All providers failed: {last_error}")
+
+
+async def _attempt(
+    kind: str,
+    name: str,
+    label: str,
+    prompt: str,
+    system: Optional[str],
+    stats: Dict[str, Any],
+    tier: Optional[str] = None,
+    **kwargs: Any,
+):
+    """One provider call; records latency + circuit outcome (cancellation is neither)."""
+    started = time.monotonic()
+    kwargs = _for_tier(name, tier, kwargs)
+    try:
+        if kind == "json_call":
+            result = await _function(name, kind)(prompt, system, **kwargs)
+        else:
+            result = await _function(name, kind)(prompt, system, stats=stats, **kwargs)
+            if not result:
+                raise ValueError("empty reply")
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        _breakers[name].failure()
+        raise
+    _record(name, label, time.monotonic() - started, stats, tier)
+    return result
+
+
+def _hedge_delay(name: str, label: str) -> Optional[float]:
+    histogram = _histograms.get((name, label))
+    if histogram is None or len(histogram.samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return max(HEDGE_MIN_DELAY, histogram.quantile(HEDGE_QUANTILE))
+
+
+def _record(name: str, label: str, seconds: float, stats: Dict[str, Any], tier: Optional[str] = None) -> None:
+    _breakers[name].success()
+    if tier:
+        stats["tier"] = tier
+        model_routing.record(tier, seconds, stats)
+    if stats.get("cached"):
+        return  # response-cache hits say nothing about provider latency
+    _histograms.setdefault((name, label), LatencyHistogram()).observe(seconds)
+
+
+# ----------------------------------------------------------------------------
+# Providers
+# ----------------------------------------------------------------------------
+def _provider_order(primary: Optional[str] = None) -> List[str]:
+    """Available providers, primary first; open circuits are skipped (unless all are open)."""
+    first = primary or PRIMARY
+    names = [first] + [n for n in PROVIDERS if n != first]
+    available = [n for n in names if n in PROVIDERS and _load(n) is not None]
+    healthy = [n for n in available if _breakers[n].state != "open"]
+    return healthy or available
+
+
+def _load(name: str):
+    """Import a provider module lazily; None if it can't be used (e.g. missing API key)."""
+    if name not in _modules:
+        try:
+            _modules[name] = importlib.import_module(PROVIDERS[name][0])
+        except (EnvironmentError, ImportError) as e:
+            log.warning(f"[Router] Provider {name} unavailable: {e}")
+            _modules[name] = None
+    return _modules[name]
+
+
+def _for_tier(name: str, tier: Optional[str], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Provider kwargs with the tier's model filled in (an explicit model wins)."""
+    model = model_routing.model_for(name, tier) if tier and "model" not in kwargs else None
+    return {**kwargs, "model": model} if model else kwargs
+
+
+def _function(name: str, kind: str):
+    index = {"call": 1, "json_call": 2, "stream": 3}[kind]
+    return getattr(_load(name), PROVIDERS[name][index])
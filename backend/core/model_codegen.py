@@ -0,0 +1,347 @@
+"""
+model_codegen.py
+────────────────
+Deterministic data-model code generated straight from spec entities.
+
+Spec entities carry structured fields (`{"name": "Dog", "fields": [["name", "text"], …]}`,
+see spec_manager._merge_entity), which is all that is needed to write:
+  • backend/models/<entity>.py   → SQLAlchemy model (+ Pydantic schemas if there is no schemas/ file)
+  • backend/schemas/<entity>.py  → Pydantic Base / Create / Read schemas
+  • frontend/types/<entity>.ts   → TypeScript interface + Create type
+  • models.py / types.ts / types/index.ts / models/__init__.py → all entities or re-exports
+
+Only plan files that match an entity (by name) are rendered; anything else
+is still generated by the LLM, with the rendered code passed along as
+ground truth (see PlanContext.models_for).
+
+Field names are snake-cased and deduplicated; keywords and names the
+generated classes need (`from`, `metadata`, `date`, …) get a trailing "_",
+with the column keeping its original name.
+"""
+
+import re
+import keyword
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bump when the emitted code changes: part of the build-manifest input hash
+CODEGEN_VERSION = "2"
+
+MODEL_DIRS = {"models"}
+SCHEMA_DIRS = {"schemas"}
+TYPE_DIRS = {"types", "interfaces"}
+AGGREGATE_STEMS = {"models", "schemas", "types", "interfaces", "index", "__init__"}
+
+# spec field type → (python type, SQLAlchemy column type, TypeScript type)
+FIELD_TYPES: Dict[str, Tuple[str, str, str]] = {
+    "text": ("str", "String", "string"),
+    "string": ("str", "String", "string"),
+    "int": ("int", "Integer", "number"),
+    "integer": ("int", "Integer", "number"),
+    "float": ("float", "Float", "number"),
+    "number": ("float", "Float", "number"),
+    "decimal": ("float", "Float", "number"),
+    "bool": ("bool", "Boolean", "boolean"),
+    "boolean": ("bool", "Boolean", "boolean"),
+    "date": ("date", "Date", "string"),
+    "datetime": ("datetime", "DateTime", "string"),
+    "json": ("dict", "JSON", "Record<string, unknown>"),
+    "list": ("list", "JSON", "unknown[]"),
+}
+# words found in free-form types ("long text", "price in USD", "created timestamp", …)
+TYPE_KEYWORDS = [
+    ("timestamp", "datetime"), ("datetime", "datetime"), ("time", "datetime"), ("date", "date"),
+    ("bool", "bool"), ("boolean", "bool"), ("flag", "bool"),
+    ("int", "int"), ("integer", "int"), ("count", "int"),
+    ("float", "float"), ("double", "float"), ("decimal", "float"), ("price", "float"),
+    ("amount", "float"), ("money", "float"), ("number", "float"),
+    ("json", "json"), ("object", "json"), ("dict", "json"),
+    ("array", "list"), ("list", "list"),
+]
+# field names that would break the generated classes: Python keywords,
+# SQLAlchemy's declarative attributes, Pydantic's config, and the names the
+# field annotations use (a `date` column would shadow `date` in the class body)
+RESERVED_NAMES = set(keyword.kwlist) | {"metadata", "registry", "model_config", "mapped_column"} | {
+    py for py, _, _ in FIELD_TYPES.values()
+}
+
+
+# ----------------------------------------------------------------------------
+# Public API
+# ----------------------------------------------------------------------------
+def render_models(plan: Dict[str, Any], spec: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Render every model / type file of the plan that maps to spec entities.
+
+    Args:
+        plan: project plan (file_tree + dependencies)
+        spec: frozen spec with structured entities
+
+    Returns:
+        dict mapping file path → code; may include support files that the
+        plan did not list (e.g. backend/models/base.py for the declarative Base)
+    """
+    entities: List[Dict[str, Any]] = []
+    for raw in spec.get("entities", []):
+        if isinstance(raw, dict) and raw.get("name"):
+            entity = _entity(raw)
+            if entity["class"] and all(e["class"] != entity["class"] for e in entities):
+                entities.append(entity)
+    if not entities:
+        return {}
+
+    files = _flat_files(plan.get("file_tree", []))
+    use_sqlalchemy = _uses_sqlalchemy(plan)
+    has_schemas = any(_dir_of(f) in SCHEMA_DIRS for f in files)
+    out: Dict[str, str] = {}
+
+    # per-entity files first, so aggregate files know which modules exist
+    per_entity: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+    for f in files:
+        kind = _kind(f)
+        entity = _match(f, entities)
+        if kind is None or entity is None:
+            continue
+        per_entity.setdefault(kind, []).append((f, entity))
+        if kind == "ts":
+            out[f] = _typescript([entity])
+        elif kind == "schema":
+            out[f] = _pydantic_module([entity])
+        elif use_sqlalchemy:
+            out[f] = _sqlalchemy_module([entity], base_import="from .base import Base", schemas=not has_schemas)
+            out.setdefault(f"{f.rsplit('/', 1)[0]}/base.py", _base_module())
+        else:
+            out[f] = _pydantic_module([entity])
+
+    for f in files:
+        kind = _kind(f)
+        if kind is None or f in out or _stem(f) not in AGGREGATE_STEMS:
+            continue
+        siblings = [(p, e) for p, e in per_entity.get(kind, []) if p.rsplit("/", 1)[0] == f.rsplit("/", 1)[0]]
+        if siblings:
+            out[f] = _reexports(kind, siblings, use_sqlalchemy, schemas=not has_schemas)
+        elif kind == "ts":
+            out[f] = _typescript(entities)
+        elif kind == "model" and use_sqlalchemy:
+            out[f] = _sqlalchemy_module(entities, base_import=None, schemas=not has_schemas)
+        else:
+            out[f] = _pydantic_module(entities)
+    return out
+
+
+def ground_truth(rendered: Dict[str, str]) -> Dict[str, str]:
+    """
+    Group rendered code per side ("frontend" / "backend") for coder prompts.
+
+    Returns:
+        dict side → "// file: path\\n<code>" blocks
+    """
+    sides: Dict[str, List[str]] = {}
+    for path in sorted(rendered):
+        side = path.split("/", 1)[0] if "/" in path else ""
+        marker = "//" if path.endswith((".ts", ".tsx")) else "#"
+        sides.setdefault(side, []).append(f"{marker} file: {path}\n{rendered[path].rstrip()}")
+    return {side: "\n\n".join(blocks) for side, blocks in sides.items()}
+
+
+# ----------------------------------------------------------------------------
+# Python
+# ----------------------------------------------------------------------------
+def _base_module() -> str:
+    return '''"""Declarative base shared by all models (generated from the spec)."""
+
+from sqlalchemy.orm import DeclarativeBase
+
+
+class Base(DeclarativeBase):
+    pass
+'''
+
+
+def _sqlalchemy_module(entities: List[Dict[str, Any]], base_import: Optional[str], schemas: bool) -> str:
+    py_types = {f["py"] for e in entities for f in e["fields"]}
+    columns = sorted({"Integer"} | {f["sa"] for e in entities for f in e["fields"]})
+    lines = [_header(entities, "models"), ""]
+    lines += _datetime_imports(py_types)
+    if schemas:
+        lines.append("from pydantic import BaseModel, ConfigDict")
+    lines.append(f"from sqlalchemy import {', '.join(columns)}")
+    lines.append("from sqlalchemy.orm import Mapped, mapped_column" + ("" if base_import else ", DeclarativeBase"))
+    lines.append("")
+    if base_import:
+        lines += [base_import, ""]
+    else:
+        lines += ["", "class Base(DeclarativeBase):", "    pass", ""]
+
+    for e in entities:
+        lines += ["", f"class {e['class']}(Base):", f'    __tablename__ = "{e["table"]}"', ""]
+        lines.append("    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)")
+        for f in e["fields"]:
+            column = f'"{f["column"]}", ' if f["column"] != f["name"] else ""
+            lines.append(f"    {f['name']}: Mapped[{f['py']}] = mapped_column({column}{f['sa']})")
+        lines.append("")
+        if schemas:
+            lines += _pydantic_classes(e)
+    return "\n".join(lines).rstrip() + "\n"
+
+
+def _pydantic_module(entities: List[Dict[str, Any]]) -> str:
+    py_types = {f["py"] for e in entities for f in e["fields"]}
+    lines = [_header(entities, "schemas"), ""]
+    lines += _datetime_imports(py_types)
+    lines += ["from pydantic import BaseModel, ConfigDict", ""]
+    for e in entities:
+        lines += _pydantic_classes(e)
+    return "\n".join(lines).rstrip() + "\n"
+
+
+def _pydantic_classes(e: Dict[str, Any]) -> List[str]:
+    name = e["class"]
+    lines = ["", f"class {name}Base(BaseModel):"]
+    lines += [f"    {f['name']}: {f['py']}" for f in e["fields"]] or ["    pass"]
+    lines += ["", "", f"class {name}Create({name}Base):", "    pass", ""]
+    lines += ["", f"class {name}Read({name}Base):", "    id: int", ""]
+    lines += ["    model_config = ConfigDict(from_attributes=True)", ""]
+    return lines
+
+
+def _datetime_imports(py_types: set) -> List[str]:
+    names = sorted(py_types & {"date", "datetime"})
+    return [f"from datetime import {', '.join(names)}", ""] if names else []
+
+
+def _header(entities: List[Dict[str, Any]], what: str) -> str:
+    names = ", ".join(e["class"] for e in entities)
+    return f'"""{names} {what} (generated from the spec - edit the spec, not this file)."""'
+
+
+# ----------------------------------------------------------------------------
+# TypeScript
+# ----------------------------------------------------------------------------
+def _typescript(entities: List[Dict[str, Any]]) -> str:
+    lines = ["// Generated from the spec - edit the spec, not this file.", ""]
+    for e in entities:
+        lines.append(f"export interface {e['class']} {{")
+        lines.append("  id: number;")
+        lines += [f"  {f['ts_name']}: {f['ts']};" for f in e["fields"]]
+        lines += ["}", "", f"export type {e['class']}Create = Omit<{e['class']}, \"id\">;", ""]
+    return "\n".join(lines)
+
+
+def _reexports(kind: str, siblings: List[Tuple[str, Dict[str, Any]]], sqlalchemy: bool, schemas: bool) -> str:
+    """Package index (types/index.ts, models/__init__.py) re-exporting the entity modules."""
+    if kind == "ts":
+        return "".join(f"export * from './{_stem(p)}';\n" for p, _ in siblings)
+    orm = kind == "model" and sqlalchemy
+    lines = ["from .base import Base"] if orm else []
+    names = ["Base"] if orm else []
+    for path, e in siblings:
+        exported = [e["class"]] if orm else []
+        if not orm or schemas:
+            exported += [f"{e['class']}Base", f"{e['class']}Create", f"{e['class']}Read"]
+        lines.append(f"from .{_stem(path)} import {', '.join(exported)}")
+        names += exported
+    lines += ["", "__all__ = [" + ", ".join(f'"{n}"' for n in names) + "]"]
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------------
+def _entity(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize a spec entity into class / table / typed field names."""
+    words = re.findall(r"[A-Za-z0-9]+", re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(raw["name"])))
+    snake = "_".join(w.lower() for w in words)
+    cls = "".join(w[:1].upper() + w[1:] for w in words)
+    fields = []
+    seen = {"id"}
+    for field in raw.get("fields", []):
+        if not field:
+            continue
+        column = _snake(str(field[0]))
+        if not column or column in seen:
+            continue  # "Name" and "name" are the same column
+        seen.add(column)
+        name = column + "_" if column in RESERVED_NAMES else column
+        py, sa, ts = FIELD_TYPES[_field_type(str(field[1]) if len(field) > 1 else "text")]
+        fields.append({"name": name, "column": column, "ts_name": _camel(column), "py": py, "sa": sa, "ts": ts})
+    return {
+        "class": f"Entity{cls}" if cls[:1].isdigit() else cls,
+        "key": snake.replace("_", ""),
+        "table": _plural(snake),
+        "fields": fields,
+    }
+
+
+def _plural(snake: str) -> str:
+    if snake.endswith("s"):
+        return snake
+    if snake.endswith("y") and snake[-2:-1] not in "aeiou":
+        return snake[:-1] + "ies"
+    return snake + "s"
+
+
+def _field_type(raw: str) -> str:
+    text = raw.strip().lower()
+    if text in FIELD_TYPES:
+        return text
+    words = set(re.findall(r"[a-z]+", text))  # whole words: "country code" is no count
+    for word, kind in TYPE_KEYWORDS:
+        if word in words:
+            return kind
+    return "text"
+
+
+def _snake(name: str) -> str:
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", name.strip())
+    name = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_").lower()
+    return f"field_{name}" if name[:1].isdigit() else name
+
+
+def _camel(snake: str) -> str:
+    head, *rest = snake.split("_")
+    return head + "".join(w.capitalize() for w in rest)
+
+
+def _flat_files(file_tree: Any) -> List[str]:
+    if isinstance(file_tree, dict):
+        return [p for paths in file_tree.values() if isinstance(paths, list) for p in paths]
+    return list(file_tree or [])
+
+
+def _stem(path: str) -> str:
+    return path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+
+
+def _dir_of(path: str) -> str:
+    parts = path.lower().split("/")
+    return parts[-2] if len(parts) > 1 else ""
+
+
+def _kind(path: str) -> Optional[str]:
+    """"model" / "schema" / "ts" for files this module can render, else None."""
+    lower = path.lower()
+    folder, stem = _dir_of(lower), _stem(lower)
+    if lower.endswith(".ts") and not lower.endswith(".d.ts") and (folder in TYPE_DIRS or stem in {"types", "interfaces"}):
+        return "ts"
+    if lower.endswith(".py"):
+        if folder in SCHEMA_DIRS or stem == "schemas":
+            return "schema"
+        if folder in MODEL_DIRS or stem == "models":
+            return "model"
+    return None
+
+
+def _match(path: str, entities: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Entity whose name matches the file stem (dog.py, health_metric.ts, HealthMetrics.ts, …)."""
+    key = re.sub(r"[^a-z0-9]", "", _stem(path).lower())
+    for e in entities:
+        if key in (e["key"], e["key"] + "s", e["key"] + "es"):
+            return e
+    return None
+
+
+def _uses_sqlalchemy(plan: Dict[str, Any]) -> bool:
+    deps = plan.get("dependencies", {})
+    backend = deps.get("backend", []) if isinstance(deps, dict) else deps
+    stack = " ".join(str(v) for v in plan.get("stack", {}).values()).lower()
+    return any("sqlalchemy" in str(d).lower() for d in backend or []) or "sqlalchemy" in stack
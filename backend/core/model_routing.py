@@ -0,0 +1,266 @@
+"""
+model_routing.py
+────────────────
+Routes each coder call to a model tier by file kind and complexity.
+
+  tier       default models (claude / openai)         max_tokens  temperature
+  fast       claude-haiku-4-5 / gpt-4o-mini           2048        0.2
+  balanced   claude-sonnet-4-5 / gpt-4o               4096        0.3
+  strong     claude-sonnet-4-5 / gpt-4o               8192        0.3
+
+Policy (first match wins):
+  1. rules from MODEL_ROUTING_CONFIG (glob → tier), e.g. {"match": "*/api/*", "tier": "strong"}
+  2. config files, styles, docs and tiny files (index/__init__/layout) → fast
+  3. routers and entrypoints touching ≥ STRONG_ENTITIES entities
+     (and API clients that wrap them)                                  → strong
+  4. everything else                                                    → balanced
+
+A file that fails validation is retried one tier up (escalate()).
+MODEL_ROUTING=0 sends everything to "balanced" (one model, as before).
+
+MODEL_ROUTING_CONFIG may point to a JSON file with any of
+  {"rules": [...], "tiers": {"fast": {"max_tokens": 1024}}, "models": {"claude": {"strong": "..."}},
+   "prices": {"model": [input $/Mtok, output $/Mtok]}}
+and {PROVIDER}_MODEL_{TIER} env vars (e.g. CLAUDE_MODEL_FAST) override models.
+
+The router reports every routed call here: calls, latency and cost per
+tier are exposed via `metrics()`.
+"""
+
+import os
+import json
+import fnmatch
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from core.file_graph import (
+    classify_layer, LAYER_CONFIG, LAYER_TYPES, LAYER_LIB, LAYER_FEATURE, LAYER_ENTRY, LAYER_DOCS,
+)
+from core.plan_context import API_CLIENT_HINTS
+from core.spec_diff import mentions
+from core.logger import log
+
+# ----------------------------------------------------------------------------
+# Config
+# ----------------------------------------------------------------------------
+ENABLED = os.getenv("MODEL_ROUTING", "1") == "1"
+CONFIG_PATH = os.getenv("MODEL_ROUTING_CONFIG")
+STRONG_ENTITIES = int(os.getenv("MODEL_ROUTING_STRONG_ENTITIES", "2"))  # entities touched → strong tier
+DEFAULT_TIER = "balanced"
+TIER_ORDER = ["fast", "balanced", "strong"]
+
+TIERS: Dict[str, Dict[str, Any]] = {
+    "fast": {"max_tokens": 2048, "temperature": 0.2},
+    "balanced": {"max_tokens": 4096, "temperature": 0.3},
+    "strong": {"max_tokens": 8192, "temperature": 0.3},
+}
+MODELS: Dict[str, Dict[str, str]] = {
+    "claude": {"fast": "claude-haiku-4-5", "balanced": "claude-sonnet-4-5", "strong": "claude-sonnet-4-5"},
+    "openai": {"fast": "gpt-4o-mini", "balanced": "gpt-4o", "strong": "gpt-4o"},
+}
+PRICES: Dict[str, Tuple[float, float]] = {  # USD per million input / output tokens
+    "claude-haiku-4-5": (1.0, 5.0),
+    "claude-sonnet-4-5": (3.0, 15.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4o": (2.5, 10.0),
+}
+CACHED_INPUT_PRICE = 0.1  # cached prompt tokens cost ~10% of uncached ones
+RULES: List[Dict[str, str]] = []
+
+STYLE_EXTS = {"css", "scss", "sass", "less"}
+TRIVIAL_NAMES = {
+    "__init__.py", "index.ts", "index.js", "layout.tsx", "layout.jsx",
+    "loading.tsx", "error.tsx", "not-found.tsx", "globals.d.ts",
+}
+API_DIRS = {"api", "routes", "routers", "endpoints"}
+
+LATENCY_WINDOW = 500
+_usage: Dict[str, Dict[str, Any]] = {}
+_latency: Dict[str, Deque[float]] = {}
+
+
+# ----------------------------------------------------------------------------
+# Policy
+# ----------------------------------------------------------------------------
+def route(file_path: str, plan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Pick a tier + token budget for generating one file.
+
+    Args:
+        file_path: relative path from the plan
+        plan: the build's plan (used to count the entities a file touches)
+
+    Returns:
+        {"tier", "max_tokens", "temperature", "reason"}
+    """
+    if not ENABLED:
+        return _route(DEFAULT_TIER, "routing disabled")
+    path = file_path.lower()
+    for rule in RULES:
+        if fnmatch.fnmatch(path, rule["match"].lower()):
+            return _route(rule["tier"], f"rule {rule['match']}")
+
+    kind = file_class(file_path)
+    if kind == "trivial":
+        return _route("fast", "config/docs/small file")
+
+    entities = entities_touched(file_path, plan or {})
+    if kind in ("api", "client", "entry") and entities >= STRONG_ENTITIES:
+        label = {"api": "api router", "client": "api client", "entry": "entrypoint"}[kind]
+        return _route("strong", f"{label}, {entities} entities")
+    return _route(DEFAULT_TIER, f"{entities} entities" if entities else "source file")
+
+
+def file_class(file_path: str) -> str:
+    """
+    Coarse kind of a file: "trivial" (config, styles, docs, tiny files),
+    "entry", "api" (routers), "client" (API clients), "types", "lib",
+    "feature" or "other".
+    """
+    path = file_path.lower()
+    name = path.rsplit("/", 1)[-1]
+    ext = name.rsplit(".", 1)[-1] if "." in name else ""
+    layer = classify_layer(file_path)
+    if layer in (LAYER_CONFIG, LAYER_DOCS) or ext in STYLE_EXTS or name in TRIVIAL_NAMES:
+        return "trivial"
+    if layer == LAYER_ENTRY:
+        return "entry"
+    if layer == LAYER_FEATURE and set(path.split("/")[:-1]) & API_DIRS:
+        return "api"
+    if layer == LAYER_LIB and any(h in name for h in API_CLIENT_HINTS):
+        return "client"
+    return {LAYER_TYPES: "types", LAYER_LIB: "lib", LAYER_FEATURE: "feature"}.get(layer, "other")
+
+
+def route_many(file_paths: List[str], plan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Route for one request covering several files: the highest of their tiers."""
+    routes = [route(f, plan) for f in file_paths]
+    return max(routes, key=lambda r: TIER_ORDER.index(r["tier"]) if r["tier"] in TIER_ORDER else 0)
+
+
+def escalate(current: Dict[str, Any]) -> Dict[str, Any]:
+    """The next tier up (for a retry after a failed attempt); the top tier stays."""
+    index = TIER_ORDER.index(current["tier"]) if current["tier"] in TIER_ORDER else 0
+    if index + 1 >= len(TIER_ORDER):
+        return current
+    return _route(TIER_ORDER[index + 1], f"escalated from {current['tier']}")
+
+
+def entities_touched(file_path: str, plan: Dict[str, Any]) -> int:
+    """
+    Number of plan entities a file deals with.
+
+    A file named after entities (types/dog.ts, api/dogs.py) touches those;
+    an unnamed router, API client or entrypoint touches all of them.
+    """
+    names = [_entity_name(e) for e in plan.get("entities", []) or []]
+    names = [n for n in names if n]
+    named = [n for n in names if mentions(file_path, n)]  # cat ≠ category.ts
+    if named:
+        return len(named)
+    layer = classify_layer(file_path)
+    name = file_path.lower().rsplit("/", 1)[-1]
+    if layer == LAYER_ENTRY or (layer == LAYER_LIB and any(h in name for h in API_CLIENT_HINTS)):
+        return len(names)
+    if layer == LAYER_FEATURE and set(file_path.lower().split("/")[:-1]) & API_DIRS:
+        return len(names)
+    return 0
+
+
+def model_for(provider: str, tier: str) -> Optional[str]:
+    """Model of `tier` for a provider (None: use the provider's default model)."""
+    return os.getenv(f"{provider.upper()}_MODEL_{tier.upper()}") or MODELS.get(provider, {}).get(tier)
+
+
+# ----------------------------------------------------------------------------
+# Reporting
+# ----------------------------------------------------------------------------
+def cost(stats: Dict[str, Any]) -> float:
+    """USD cost of one call from its stats (0 for cache hits and unknown models)."""
+    if stats.get("cached"):
+        return 0.0
+    input_price, output_price = PRICES.get(stats.get("model", ""), (0.0, 0.0))
+    cached = stats.get("cached_input_tokens", 0) or 0
+    uncached = stats.get("uncached_input_tokens", stats.get("input_tokens", 0)) or 0
+    billed_input = uncached + cached * CACHED_INPUT_PRICE
+    return (billed_input * input_price + (stats.get("output_tokens", 0) or 0) * output_price) / 1_000_000
+
+
+def record(tier: str, seconds: float, stats: Dict[str, Any]) -> None:
+    """Account one finished call to its tier (also sets stats["cost_usd"])."""
+    stats["cost_usd"] = round(cost(stats), 6)
+    usage = _usage.setdefault(tier, {"calls": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0})
+    usage["calls"] += 1
+    usage["seconds"] += seconds
+    usage["input_tokens"] += stats.get("input_tokens", 0) or 0
+    usage["output_tokens"] += stats.get("output_tokens", 0) or 0
+    usage["cost_usd"] += stats["cost_usd"]
+    _latency.setdefault(tier, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def summarize(call_stats: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-tier calls / seconds / tokens / cost of one build (from the coder's call stats)."""
+    tiers: Dict[str, Dict[str, Any]] = {}
+    for stats in call_stats.values():
+        if "tier" not in stats:
+            continue
+        t = tiers.setdefault(stats["tier"], {"calls": 0, "seconds": 0.0, "output_tokens": 0, "cost_usd": 0.0})
+        t["calls"] += 1
+        t["seconds"] = round(t["seconds"] + stats.get("duration", 0.0), 3)
+        t["output_tokens"] += stats.get("output_tokens", 0) or 0
+        t["cost_usd"] = round(t["cost_usd"] + stats.get("cost_usd", 0.0), 6)
+    return tiers
+
+
+def metrics() -> Dict[str, Any]:
+    """Process-wide calls, latency quantiles and cost per tier."""
+    out: Dict[str, Any] = {"enabled": ENABLED}
+    for tier, usage in _usage.items():
+        samples = sorted(_latency.get(tier, []))
+        out[tier] = {
+            **usage,
+            "seconds": round(usage["seconds"], 3),
+            "cost_usd": round(usage["cost_usd"], 6),
+            "p50": round(samples[len(samples) // 2], 3) if samples else None,
+            "p95": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 3) if samples else None,
+        }
+    return out
+
+
+# ----------------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------------
+def _route(tier: str, reason: str) -> Dict[str, Any]:
+    if tier not in TIERS:
+        log.warning(f"[Routing] Unknown tier {tier!r}, using {DEFAULT_TIER}")
+        tier = DEFAULT_TIER
+    return {"tier": tier, **TIERS[tier], "reason": reason}
+
+
+def _entity_name(entity: Any) -> str:
+    name = entity.get("name", "") if isinstance(entity, dict) else str(entity)
+    return name.strip()
+
+
+def _load_config(path: Optional[str]) -> None:
+    """Merge MODEL_ROUTING_CONFIG into the defaults above."""
+    if not path:
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        log.warning(f"[Routing] Ignoring unreadable config {path}: {e}")
+        return
+    RULES.extend(r for r in config.get("rules", []) if r.get("match") and r.get("tier"))
+    for tier, params in config.get("tiers", {}).items():
+        TIERS.setdefault(tier, dict(TIERS[DEFAULT_TIER])).update(params)
+        if tier not in TIER_ORDER:
+            TIER_ORDER.append(tier)
+    for provider, models in config.get("models", {}).items():
+        MODELS.setdefault(provider, {}).update(models)
+    PRICES.update({model: tuple(price) for model, price in config.get("prices", {}).items()})
+    log.info(f"[Routing] Loaded {path}: {len(RULES)} rules, tiers {list(TIERS)}")
+
+
+_load_config(CONFIG_PATH)
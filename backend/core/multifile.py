@@ -0,0 +1,137 @@
+"""
+multifile.py
+────────────
+Batched generation of small files in a single LLM request.
+
+Tiny files (styles, layout wrappers, `__init__.py`, index re-exports) cost
+a full round trip each when generated one by one. The coder groups them by
+directory (styles: by side) and asks for all of them at once, in a
+delimited format:
+
+    === FILE: frontend/app/layout.tsx ===
+    <code>
+    === END FILE ===
+
+`split_files()` parses the reply leniently (missing END markers, markdown
+fences, "./"-prefixed or shortened paths); any file it can't recover is
+regenerated on its own by the caller.
+"""
+
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+MAX_BATCH_FILES = int(os.getenv("CODER_BATCH_SIZE", "4"))
+
+SMALL_EXTS = {"css", "scss", "sass", "less"}
+SMALL_NAMES = {
+    "__init__.py", "index.ts", "index.js",
+    "layout.tsx", "layout.jsx", "loading.tsx", "error.tsx", "not-found.tsx",
+}
+
+START_MARKER = "=== FILE: {path} ==="
+END_MARKER = "=== END FILE ==="
+_START = re.compile(r"^[ \t]*={3,}[ \t]*FILE:[ \t]*(?P<path>.+?)[ \t]*={3,}[ \t]*$", re.M)
+_END = re.compile(r"^[ \t]*={3,}[ \t]*END(?:[ \t]+FILE)?[ \t]*={3,}[ \t]*$", re.M)
+
+
+# ----------------------------------------------------------------------------
+# Grouping
+# ----------------------------------------------------------------------------
+def is_small(file_path: str) -> bool:
+    """True for files that are typically a few lines long."""
+    name = file_path.lower().rsplit("/", 1)[-1]
+    ext = name.rsplit(".", 1)[-1] if "." in name else ""
+    return name in SMALL_NAMES or ext in SMALL_EXTS
+
+
+def group_key(file_path: str) -> str:
+    """Styles batch per side, everything else per directory."""
+    ext = file_path.lower().rsplit(".", 1)[-1]
+    if ext in SMALL_EXTS:
+        return file_path.split("/", 1)[0] + ":styles"
+    return file_path.rsplit("/", 1)[0] if "/" in file_path else ""
+
+
+def plan_batches(
+    files: List[str],
+    key: Callable[[str], str],
+    max_files: int = MAX_BATCH_FILES,
+) -> List[List[str]]:
+    """
+    Split files into generation units.
+
+    Small files with the same `key(path)` + group_key(path) are batched
+    (at most `max_files` per unit); every other file is a unit of its own.
+    Units keep the order of their first file.
+
+    Args:
+        files: file paths in generation order
+        key: extra grouping key (e.g. wave + prompt prefix)
+        max_files: batch size cap
+
+    Returns:
+        list of units (lists of file paths)
+    """
+    units: List[List[str]] = []
+    open_batches: Dict[str, List[str]] = {}
+    for f in files:
+        if max_files < 2 or not is_small(f):
+            units.append([f])
+            continue
+        k = f"{key(f)}|{group_key(f)}"
+        batch = open_batches.get(k)
+        if batch is None or len(batch) >= max_files:
+            batch = open_batches[k] = []
+            units.append(batch)
+        batch.append(f)
+    return units
+
+
+# ----------------------------------------------------------------------------
+# Prompt + parsing
+# ----------------------------------------------------------------------------
+def format_instructions(file_paths: List[str]) -> str:
+    """Output-format section of a batched prompt."""
+    example = "\n".join(f"{START_MARKER.format(path=p)}\n<full code of {p}>\n{END_MARKER}" for p in file_paths)
+    return (
+        "Return EVERY file below, each wrapped exactly like this "
+        "(no markdown fences, nothing before the first marker or after the last one):\n\n"
+        f"{example}"
+    )
+
+
+def split_files(text: str, expected: List[str]) -> Dict[str, str]:
+    """
+    Split a multi-file reply into {path: content}.
+
+    Only paths from `expected` are returned (matched exactly, without a
+    leading "./", or by path suffix); empty or unknown sections are dropped.
+    """
+    out: Dict[str, str] = {}
+    starts = list(_START.finditer(text))
+    for i, match in enumerate(starts):
+        path = _resolve(match.group("path"), expected)
+        if path is None or path in out:
+            continue
+        body_end = starts[i + 1].start() if i + 1 < len(starts) else len(text)
+        body = text[match.end():body_end]
+        end = _END.search(body)
+        if end:
+            body = body[:end.start()]
+        elif not body.lstrip().startswith("```"):
+            body = re.sub(r"\n```[ \t]*\s*$", "", body)  # closing fence of a fenced reply
+        body = body.strip("\n")
+        if body.strip():
+            out[path] = body
+    return out
+
+
+def _resolve(raw: str, expected: List[str]) -> Optional[str]:
+    path = re.sub(r"^(\./)+", "", raw.strip().strip("`'\""))
+    if path in expected:
+        return path
+    for candidate in expected:
+        if candidate.endswith("/" + path) or path.endswith("/" + candidate):
+            return candidate
+    return None
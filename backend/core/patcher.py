@@ -0,0 +1,225 @@
+"""
+patcher.py
+──────────
+Parses unified diffs written by an LLM and applies them to workspace files.
+
+Model-written diffs are rarely exact, so application is forgiving:
+  • hunk line numbers are only a hint - the hunk's old lines are searched
+    for near that position, then anywhere after the previous hunk
+  • trailing whitespace differences are ignored, then all indentation
+  • up to MAX_FUZZ context lines may be dropped from either end of a hunk
+    (like `patch --fuzz`)
+  • line counts in "@@ -a,b +c,d @@" headers are ignored, bare "@@" works
+
+A hunk that still can't be placed raises PatchError; the caller falls back
+to rewriting the whole file.
+
+Paths in diff headers come from the model: safe_path() confines them to the
+workspace before anything is written.
+"""
+
+import os
+import re
+import posixpath
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MAX_FUZZ = 2
+
+_HUNK = re.compile(r"^@@(?:\s*-(\d+)(?:,\d+)?\s+\+\d+(?:,\d+)?)?\s*(?:@@.*)?$")
+_FENCE = re.compile(r"^```")
+
+
+class PatchError(ValueError):
+    """A diff (or one of its hunks) can't be applied to the current file."""
+
+
+# ----------------------------------------------------------------------------
+# Parsing
+# ----------------------------------------------------------------------------
+def parse_diff(text: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Split a (multi-file) unified diff into per-file patches.
+
+    Returns:
+        {path: {"new": bool, "deleted": bool, "hunks": [hunk, …]}} where a hunk
+        is {"start": 1-based old line or None, "lines": [(" "|"-"|"+", text), …]}
+    """
+    patches: Dict[str, Dict[str, Any]] = {}
+    patch: Optional[Dict[str, Any]] = None
+    hunk: Optional[Dict[str, Any]] = None
+    old_path = ""
+    text_lines = text.splitlines()
+    for i, line in enumerate(text_lines):
+        if _FENCE.match(line):
+            hunk = None
+            continue
+        following = text_lines[i + 1] if i + 1 < len(text_lines) else ""
+        if line.startswith("--- ") and following.startswith("+++ "):
+            old_path = _diff_path(line[4:])
+            hunk = None
+            continue
+        if line.startswith("+++ ") and text_lines[i - 1].startswith("--- ") and hunk is None:
+            new_path = _diff_path(line[4:])
+            path = old_path if new_path == "/dev/null" else new_path
+            patch = patches.setdefault(path, {"new": False, "deleted": False, "hunks": []})
+            patch["new"] = old_path == "/dev/null"
+            patch["deleted"] = new_path == "/dev/null"
+            hunk = None
+            continue
+        header = _HUNK.match(line)
+        if header and patch is not None:
+            hunk = {"start": int(header.group(1)) if header.group(1) else None, "lines": []}
+            patch["hunks"].append(hunk)
+            continue
+        if hunk is None or line.startswith("\\"):  # "\ No newline at end of file"
+            continue
+        if line[:1] in (" ", "-", "+"):
+            hunk["lines"].append((line[0], line[1:]))
+        elif line == "":
+            hunk["lines"].append((" ", ""))  # context line whose leading space was trimmed
+        else:
+            hunk = None  # prose after the diff
+    for patch in patches.values():
+        for h in patch["hunks"]:
+            while h["lines"] and h["lines"][-1] == (" ", ""):
+                h["lines"].pop()  # blank lines between hunks aren't context
+    return patches
+
+
+def _diff_path(raw: str) -> str:
+    path = raw.split("\t", 1)[0].strip()
+    if path == "/dev/null":
+        return path
+    return re.sub(r"^(a|b)/", "", path)
+
+
+# ----------------------------------------------------------------------------
+# Application
+# ----------------------------------------------------------------------------
+def apply_patch(original: str, hunks: List[Dict[str, Any]]) -> str:
+    """
+    Apply parsed hunks to `original`.
+
+    Raises:
+        PatchError: if a hunk can't be located (or the patch has no hunks)
+    """
+    if not hunks:
+        raise PatchError("patch has no hunks")
+    lines = original.splitlines()
+    cursor = 0  # hunks apply in order: never search before the previous one
+    offset = 0  # how far earlier hunks shifted the line numbers
+    for number, hunk in enumerate(hunks, 1):
+        body = hunk["lines"]
+        old = [text for tag, text in body if tag != "+"]
+        hint = (hunk["start"] - 1 + offset) if hunk["start"] else cursor
+        if not old:  # pure insertion
+            at = min(max(hint, cursor), len(lines))
+            new = [text for tag, text in body if tag == "+"]
+            lines[at:at] = new
+            cursor, offset = at + len(new), offset + len(new)
+            continue
+        placed = _locate(lines, body, hint, cursor)
+        if placed is None:
+            raise PatchError(f"hunk {number} does not match the file (around line {hint + 1})")
+        at, trimmed = placed
+        old = [text for tag, text in trimmed if tag != "+"]
+        new = [text for tag, text in trimmed if tag != "-"]
+        lines[at:at + len(old)] = new
+        cursor = at + len(new)
+        offset += len(new) - len(old)
+    result = "\n".join(lines)
+    return result + "\n" if original.endswith("\n") or not original else result
+
+
+def _locate(lines: List[str], body: List[tuple], hint: int, cursor: int):
+    """
+    Find where a hunk's old lines are in `lines`.
+
+    Returns:
+        (start index, hunk lines with any fuzzed-away context removed) or None
+    """
+    for fuzz in range(MAX_FUZZ + 1):
+        trimmed = _trim_context(body, fuzz)
+        if trimmed is None:
+            break
+        leading, trimmed = trimmed
+        old = [text for tag, text in trimmed if tag != "+"]
+        if not old:
+            break
+        for normalize in (str.rstrip, str.strip):
+            at = _find(lines, old, hint + leading, cursor, normalize)
+            if at is not None:
+                return at, trimmed
+    return None
+
+
+def _trim_context(body: List[tuple], fuzz: int) -> Optional[Tuple[int, List[tuple]]]:
+    """
+    Drop up to `fuzz` context lines from each end.
+
+    Returns:
+        (number of lines dropped at the start, remaining lines), or None if
+        there is nothing (more) to drop
+    """
+    if fuzz == 0:
+        return 0, body
+    start, end = 0, len(body)
+    while start < min(fuzz, end) and body[start][0] == " ":
+        start += 1
+    while end > start and len(body) - end < fuzz and body[end - 1][0] == " ":
+        end -= 1
+    if start == 0 and end == len(body):
+        return None
+    return start, body[start:end]
+
+
+def _find(
+    lines: List[str],
+    old: List[str],
+    hint: int,
+    cursor: int,
+    normalize: Callable[[str], str],
+) -> Optional[int]:
+    """First match of `old` at or after `cursor`, closest to `hint` first."""
+    want = [normalize(x) for x in old]
+    last = len(lines) - len(want)
+    if last < cursor:
+        return None
+    hint = min(max(hint, cursor), last)
+    for distance in range(0, last - cursor + 1):
+        for at in (hint - distance, hint + distance) if distance else (hint,):
+            if cursor <= at <= last and all(normalize(lines[at + k]) == w for k, w in enumerate(want)):
+                return at
+    return None
+
+
+def safe_path(raw: str, root: Optional[str] = None) -> Optional[str]:
+    """
+    Normalized relative form of a diff path, or None if it escapes the workspace.
+
+    Absolute paths (including drive letters) and paths that still contain
+    ".." once normalized are rejected; with `root`, the real path (symlinks
+    resolved) must also stay under it.
+    """
+    path = posixpath.normpath(raw.strip().replace("\\", "/"))
+    if not path or path == "." or path.startswith("/") or re.match(r"^[A-Za-z]:", path):
+        return None
+    if ".." in path.split("/"):
+        return None
+    if root is not None:
+        base = os.path.realpath(root)
+        real = os.path.realpath(os.path.join(base, path))
+        if os.path.commonpath([base, real]) != base:
+            return None
+    return path
+
+
+def resolve_path(raw: str, candidates: List[str]) -> Optional[str]:
+    """Map a path from a diff header onto a known file path (exact or by suffix)."""
+    path = re.sub(r"^(\./)+", "", raw.strip())
+    if path in candidates:
+        return path
+    for candidate in candidates:
+        if candidate.endswith("/" + path) or path.endswith("/" + candidate):
+            return candidate
+    return None
@@ -0,0 +1,153 @@
+"""
+plan_context.py
+───────────────
+Builds the per-file slice of a plan that goes into a coder prompt.
+
+Instead of inlining `json.dumps(plan, indent=2)` into every call, each file
+only gets the plan fields it actually needs:
+  • models / types        → stack + entities
+  • routers / api-client  → stack + entities + api_routes
+  • config files          → stack + dependencies
+  • styles                → stack
+  • README                → the whole plan
+
+Serializations are compact and cached for the lifetime of one build, and
+the character savings per file are recorded for reporting.
+
+Model/type code rendered from the spec (core/model_codegen) is attached as
+`codegen` and handed to every file that works with entities as ground truth.
+"""
+
+import json
+from typing import Any, Dict, List, Tuple
+
+from core.file_graph import (
+    classify_layer, LAYER_CONFIG, LAYER_TYPES, LAYER_LIB, LAYER_FEATURE, LAYER_ENTRY, LAYER_DOCS,
+)
+
+SOURCE_EXTS = {"ts", "tsx", "js", "jsx", "py"}
+API_CLIENT_HINTS = ("api-client", "api_client", "apiclient", "fetcher")
+
+
+# ----------------------------------------------------------------------------
+# Context builder
+# ----------------------------------------------------------------------------
+class PlanContext:
+    """Caches compact plan slices for a single build."""
+
+    def __init__(self, plan: Dict[str, Any]):
+        self.plan = plan
+        self.full_text = _compact(plan)  # serialized once per build
+        self.savings: Dict[str, Dict[str, int]] = {}
+        self.codegen: Dict[str, str] = {}             # path → code rendered from spec entities
+        self.ground_truth: Dict[str, str] = {}        # side → rendered code shown to the LLM
+        self._slices: Dict[Tuple[Tuple[str, ...], str], str] = {}
+
+    def fields_for(self, file_path: str) -> List[str]:
+        """
+        Decide which plan fields are relevant to a file.
+
+        Args:
+            file_path: relative path of the file being generated
+
+        Returns:
+            list of plan keys (in plan order)
+        """
+        name = file_path.lower().rsplit("/", 1)[-1]
+        ext = name.rsplit(".", 1)[-1] if "." in name else ""
+        layer = classify_layer(file_path)
+
+        if layer == LAYER_DOCS:
+            return list(self.plan.keys())
+        if layer == LAYER_CONFIG:
+            # styles only need the stack; package/tsconfig/tailwind need deps too
+            return ["stack"] if ext in {"css", "scss", "sass", "less"} else ["stack", "dependencies"]
+
+        fields = ["stack"]
+        if ext in SOURCE_EXTS:
+            fields += ["dependencies", "file_tree"]
+        if layer == LAYER_TYPES:
+            fields.append("entities")
+        elif layer in (LAYER_LIB, LAYER_FEATURE, LAYER_ENTRY):
+            fields.append("entities")
+            if layer != LAYER_LIB or any(h in name for h in API_CLIENT_HINTS) or "/api" in file_path:
+                fields.append("api_routes")
+        return [k for k in self.plan.keys() if k in fields]
+
+    def slice_for(self, file_path: str) -> Dict[str, Any]:
+        """Return the plan subset for a file (file_tree/dependencies narrowed to its side)."""
+        side = file_path.split("/", 1)[0] if "/" in file_path else ""
+        fields = self.fields_for(file_path)
+        if classify_layer(file_path) == LAYER_DOCS:
+            return {k: self.plan[k] for k in fields}
+        return {k: _narrow(k, self.plan[k], side) for k in fields}
+
+    def prefix_key(self, file_path: str) -> str:
+        """
+        Identifier of the slice a file gets; files with the same key share
+        an identical prompt prefix (and so the provider's prompt cache).
+        """
+        side = file_path.split("/", 1)[0] if "/" in file_path else ""
+        return ",".join(self.fields_for(file_path)) + "|" + side
+
+    def slice_text(self, file_path: str) -> str:
+        """Compact JSON of the plan slice for a file (cached per field set + side)."""
+        side = file_path.split("/", 1)[0] if "/" in file_path else ""
+        key = (tuple(self.fields_for(file_path)), side)
+        text = self._slices.get(key)
+        if text is None:
+            text = _compact(self.slice_for(file_path))
+            self._slices[key] = text
+        return text
+
+    def for_file(self, file_path: str) -> str:
+        """
+        Slice text for a file's prompt (see slice_text).
+
+        Also records the prompt-size savings versus the full plan.
+        """
+        text = self.slice_text(file_path)
+        self.savings[file_path] = {
+            "full_chars": len(self.full_text),
+            "slice_chars": len(text),
+            "saved_chars": len(self.full_text) - len(text),
+        }
+        return text
+
+    def models_for(self, file_path: str) -> str:
+        """Rendered model/type code of the file's side, if the file uses entities."""
+        if "entities" not in self.fields_for(file_path):
+            return ""
+        side = file_path.split("/", 1)[0] if "/" in file_path else ""
+        return self.ground_truth.get(side, "")
+
+    def savings_summary(self) -> Dict[str, Any]:
+        """Totals over every file sliced so far."""
+        full = sum(s["full_chars"] for s in self.savings.values())
+        sliced = sum(s["slice_chars"] for s in self.savings.values())
+        return {
+            "files": len(self.savings),
+            "full_chars": full,
+            "slice_chars": sliced,
+            "saved_pct": round(100 * (full - sliced) / full, 1) if full else 0.0,
+        }
+
+
+# ----------------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------------
+def _compact(obj: Any) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def _narrow(key: str, value: Any, side: str) -> Any:
+    """Keep only the frontend/ or backend/ part of side-specific plan fields."""
+    if not side:
+        return value
+    if key == "dependencies" and isinstance(value, dict) and side in value:
+        return {side: value[side]}
+    if key == "file_tree" and isinstance(value, list):
+        return [p for p in value if p.startswith(side + "/")]
+    if key == "file_tree" and isinstance(value, dict) and side in value:
+        return {side: value[side]}
+    return value
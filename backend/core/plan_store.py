@@ -0,0 +1,199 @@
+"""
+plan_store.py
+─────────────
+Content-addressed storage for planner output.
+
+A plan is keyed by a canonical hash of (spec, extra_context, prompt version),
+so re-planning an unchanged spec is a file read instead of an LLM call.
+
+Layout:
+  data/plans/by_hash/{hash}.json  → {hash, plan, spec, extra_context, prompt_version, created_at[, delta]}
+  data/plans/_index.json          → {project_id: [{hash, prompt_version, created_at}, …]}
+  data/plans/{project_id}.json    → current plan of a project (written by planner_agent)
+
+`project_id` and `metadata` (live/frozen status) are excluded from the spec
+hash, so a live spec and its frozen copy - or two projects with the same
+spec - share one key.
+
+Plans made speculatively from a live spec (agents/speculative_planner) are
+indexed too, flagged `speculative`: they are not versions of the project
+until a build uses them, but they are candidates for a delta re-plan
+(`recent_records`).
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from core.hashing import stable_hash
+from core.artifact_writer import write_atomic
+from core.logger import log
+
+# ----------------------------------------------------------------------------
+# Paths
+# ----------------------------------------------------------------------------
+PLAN_DIR = "data/plans"
+STORE_DIR = f"{PLAN_DIR}/by_hash"
+INDEX_PATH = f"{PLAN_DIR}/_index.json"
+
+SPEC_VOLATILE_KEYS = ("project_id", "metadata")
+MAX_SPECULATIVE = 20  # speculative entries kept per project
+
+_index_lock = threading.Lock()  # register_version is called from worker threads
+
+
+# ----------------------------------------------------------------------------
+# Keys
+# ----------------------------------------------------------------------------
+def canonical_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Spec without fields that don't affect the plan."""
+    return {k: v for k, v in spec.items() if k not in SPEC_VOLATILE_KEYS}
+
+
+def plan_key(spec: Dict[str, Any], extra_context: Optional[str], prompt_version: str) -> str:
+    """Content hash identifying the plan produced for this input."""
+    return stable_hash({
+        "spec": canonical_spec(spec),
+        "extra_context": extra_context or "",
+        "prompt_version": prompt_version,
+    })
+
+
+# ----------------------------------------------------------------------------
+# Store
+# ----------------------------------------------------------------------------
+def load_plan_record(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the stored record for a plan hash, or None.
+
+    Returns:
+        dict with hash, plan, spec, extra_context, prompt_version, created_at
+    """
+    path = f"{STORE_DIR}/{key}.json"
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        log.warning(f"[PlanStore] Ignoring unreadable plan {path}: {e}")
+        return None
+
+
+def save_plan_record(
+    project_id: str,
+    key: str,
+    plan: Dict[str, Any],
+    spec: Dict[str, Any],
+    extra_context: Optional[str],
+    prompt_version: str,
+    delta: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Store a plan under its hash and register it as a version of `project_id`.
+
+    Args:
+        delta: for a delta re-plan, {base plan hash, spec changes, files to rework}
+
+    Returns:
+        the stored record
+    """
+    record = put_plan_record(key, plan, spec, extra_context, prompt_version, delta)
+    register_version(project_id, key, prompt_version)
+    log.debug(f"[PlanStore] Stored plan {key[:12]} for {project_id}")
+    return record
+
+
+def put_plan_record(
+    key: str,
+    plan: Dict[str, Any],
+    spec: Dict[str, Any],
+    extra_context: Optional[str],
+    prompt_version: str,
+    delta: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Store a plan under its hash without registering it for a project."""
+    record = {
+        "hash": key,
+        "plan": plan,
+        "spec": canonical_spec(spec),
+        "extra_context": extra_context or "",
+        "prompt_version": prompt_version,
+        "created_at": time.time(),
+    }
+    if delta:
+        record["delta"] = delta
+    os.makedirs(STORE_DIR, exist_ok=True)
+    _write_json(f"{STORE_DIR}/{key}.json", record)
+    return record
+
+
+def register_version(project_id: str, key: str, prompt_version: str, speculative: bool = False) -> None:
+    """
+    Append `key` to the project's version list (no-op if it is already the latest).
+
+    Args:
+        speculative: the plan was made from the live spec, not for a build
+    """
+    with _index_lock:
+        index = _load_index()
+        versions = index.setdefault(project_id, [])
+        if versions and versions[-1]["hash"] == key and versions[-1].get("speculative", False) == speculative:
+            return
+        entry = {"hash": key, "prompt_version": prompt_version, "created_at": time.time()}
+        if speculative:
+            entry["speculative"] = True
+            speculative_entries = [v for v in versions if v.get("speculative")]
+            for old in speculative_entries[:max(0, len(speculative_entries) - MAX_SPECULATIVE + 1)]:
+                versions.remove(old)
+        versions.append(entry)
+        _write_json(INDEX_PATH, index)
+
+
+def plan_versions(project_id: str, include_speculative: bool = False) -> List[Dict[str, Any]]:
+    """All plan versions recorded for a project, oldest first."""
+    versions = _load_index().get(project_id, [])
+    return versions if include_speculative else [v for v in versions if not v.get("speculative")]
+
+
+def recent_records(
+    project_id: str,
+    extra_context: Optional[str],
+    prompt_version: str,
+    limit: int = 5,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stored plans of a project (speculative ones included), newest first,
+    made with the same extra_context and prompt version.
+    """
+    seen = set()
+    for entry in reversed(_load_index().get(project_id, [])):
+        if len(seen) >= limit:
+            return
+        if entry["hash"] in seen or entry.get("prompt_version") != prompt_version:
+            continue
+        seen.add(entry["hash"])
+        record = load_plan_record(entry["hash"])
+        if record and record.get("extra_context", "") == (extra_context or ""):
+            yield record
+
+
+# ----------------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------------
+def _load_index() -> Dict[str, List[Dict[str, Any]]]:
+    if not os.path.exists(INDEX_PATH):
+        return {}
+    try:
+        with open(INDEX_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        log.warning(f"[PlanStore] Rebuilding unreadable index {INDEX_PATH}: {e}")
+        return {}
+
+
+def _write_json(path: str, data: Any) -> None:
+    """Write via temp file + rename so readers never see a partial file."""
+    write_atomic(path, json.dumps(data, indent=2))
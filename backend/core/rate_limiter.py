@@ -0,0 +1,259 @@
+"""
+rate_limiter.py
+───────────────
+Provider-level request scheduler for the LLM wrappers.
+
+Each provider (claude / openai) gets one `ProviderScheduler` shared by every
+caller in the process:
+  • requests-per-minute token bucket
+  • tokens-per-minute token bucket (reserved from an estimate, then
+    reconciled with the real usage reported by the API)
+  • global in-flight cap
+  • provider-wide pause on 429, sized from the `retry-after` header,
+    so parallel coder/planner calls back off together instead of storming
+
+Callers wrap each request in `async with scheduler.slot(estimate)`.
+Queue depth, waits and 429 counts are exposed via `metrics()`.
+"""
+
+import os
+import time
+import random
+import asyncio
+from typing import Any, Dict, Optional
+
+from core.logger import log
+
+# ----------------------------------------------------------------------------
+# Config (per provider, overridable via env: CLAUDE_RPM, OPENAI_TPM, …)
+# ----------------------------------------------------------------------------
+DEFAULT_LIMITS = {
+    "claude": {"rpm": 50, "tpm": 100_000, "max_in_flight": 8},
+    "openai": {"rpm": 500, "tpm": 200_000, "max_in_flight": 16},
+}
+CHARS_PER_TOKEN = 4  # rough estimate used before the API reports real usage
+MAX_BACKOFF = 60     # seconds
+
+
+# ----------------------------------------------------------------------------
+# Token bucket
+# ----------------------------------------------------------------------------
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute / 60` per second."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)  # a huge request must still fit eventually
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Give back (delta > 0) or charge extra (delta < 0) after real usage is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+
+# ----------------------------------------------------------------------------
+# Scheduler
+# ----------------------------------------------------------------------------
+class ProviderScheduler:
+    """Admission control for one LLM provider."""
+
+    def __init__(self, name: str, rpm: int, tpm: int, max_in_flight: int):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.in_flight = 0
+        self.queued = 0
+        self._paused_until = 0.0
+        self._loop = None
+        self._admission: Optional[asyncio.Lock] = None
+        self._released: Optional[asyncio.Condition] = None
+        self._stats = {
+            "admitted": 0, "rate_limited": 0, "total_wait": 0.0,
+            "max_wait": 0.0, "max_queue_depth": 0,
+        }
+
+    # ---------- admission ----------
+    def slot(self, estimated_tokens: int) -> "_Slot":
+        """
+        Async context manager holding one request slot.
+
+        Waits (FIFO) until the provider is not paused, the RPM/TPM buckets
+        allow the request and fewer than `max_in_flight` requests are running.
+        """
+        return _Slot(self, estimated_tokens)
+
+    async def _acquire(self, estimated_tokens: int) -> None:
+        self._bind_loop()
+        started = time.monotonic()
+        self.queued += 1
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self.queued)
+        try:
+            async with self._admission:  # one admission at a time keeps the queue FIFO
+                async with self._released:
+                    await self._released.wait_for(lambda: self.in_flight < self.max_in_flight)
+                while True:
+                    wait = max(
+                        self._paused_until - time.monotonic(),
+                        self.requests.wait_time(1),
+                        self.tokens.wait_time(estimated_tokens),
+                    )
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+                self.in_flight += 1
+        finally:
+            self.queued -= 1
+
+        waited = time.monotonic() - started
+        self._stats["admitted"] += 1
+        self._stats["total_wait"] += waited
+        self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+        if waited > 1:
+            log.debug(f"[RateLimit] {self.name}: waited {waited:.1f}s for a slot (queue={self.queued})")
+
+    async def _release(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        if actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+        self.in_flight -= 1
+        async with self._released:
+            self._released.notify()
+
+    def _bind_loop(self) -> None:
+        """asyncio primitives belong to one event loop; recreate them for a new one."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._admission = asyncio.Lock()
+            self._released = asyncio.Condition()
+            self.in_flight = 0
+            self.queued = 0
+
+    # ---------- backoff ----------
+    def on_rate_limit(self, error: Exception, attempt: int) -> float:
+        """
+        Pause the whole provider after a 429.
+
+        Uses the `retry-after` (or `retry-after-ms`) response header when
+        present, otherwise exponential backoff with jitter.
+
+        Returns:
+            the pause in seconds
+        """
+        wait = _retry_after(error)
+        if wait is None:
+            wait = min(MAX_BACKOFF, 2 ** attempt) * random.uniform(0.8, 1.2)
+        self._paused_until = max(self._paused_until, time.monotonic() + wait)
+        self._stats["rate_limited"] += 1
+        return round(wait, 2)
+
+    @staticmethod
+    def estimate_tokens(*texts: Optional[str], max_tokens: int = 0) -> int:
+        """Rough TPM reservation: input chars / 4 plus a quarter of the output budget."""
+        chars = sum(len(t) for t in texts if t)
+        return chars // CHARS_PER_TOKEN + max_tokens // 4
+
+    def headroom(self) -> int:
+        """Requests that could start right now without queueing."""
+        if time.monotonic() < self._paused_until:
+            return 0
+        self.requests.wait_time(0)  # refresh
+        return max(0, min(self.max_in_flight - self.in_flight, int(self.requests.tokens)) - self.queued)
+
+    # ---------- metrics ----------
+    def metrics(self) -> Dict[str, Any]:
+        admitted = self._stats["admitted"]
+        return {
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "admitted": admitted,
+            "rate_limited": self._stats["rate_limited"],
+            "avg_wait": round(self._stats["total_wait"] / admitted, 3) if admitted else 0.0,
+            "max_wait": round(self._stats["max_wait"], 3),
+            "max_queue_depth": self._stats["max_queue_depth"],
+            "rpm_available": int(self.requests.tokens),
+            "tpm_available": int(self.tokens.tokens),
+        }
+
+
+class _Slot:
+    """Context manager returned by ProviderScheduler.slot()."""
+
+    def __init__(self, scheduler: ProviderScheduler, estimated_tokens: int):
+        self.scheduler = scheduler
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+
+    def record(self, actual_tokens: Optional[int]) -> None:
+        """Report real token usage so the TPM bucket can be reconciled."""
+        self.actual_tokens = actual_tokens
+
+    async def __aenter__(self) -> "_Slot":
+        await self.scheduler._acquire(self.estimated_tokens)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.scheduler._release(self.estimated_tokens, self.actual_tokens)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return min(MAX_BACKOFF, float(headers["retry-after-ms"]) / 1000)
+        if headers.get("retry-after"):
+            return min(MAX_BACKOFF, float(headers["retry-after"]))
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+# ----------------------------------------------------------------------------
+# Registry
+# ----------------------------------------------------------------------------
+_schedulers: Dict[str, ProviderScheduler] = {}
+
+
+def get_scheduler(provider: str) -> ProviderScheduler:
+    """Return the process-wide scheduler for a provider ("claude" / "openai")."""
+    if provider not in _schedulers:
+        limits = DEFAULT_LIMITS.get(provider, DEFAULT_LIMITS["claude"])
+        prefix = provider.upper()
+        _schedulers[provider] = ProviderScheduler(
+            provider,
+            rpm=int(os.getenv(f"{prefix}_RPM", limits["rpm"])),
+            tpm=int(os.getenv(f"{prefix}_TPM", limits["tpm"])),
+            max_in_flight=int(os.getenv(f"{prefix}_MAX_IN_FLIGHT", limits["max_in_flight"])),
+        )
+    return _schedulers[provider]
+
+
+def all_metrics() -> Dict[str, Dict[str, Any]]:
+    """Metrics of every scheduler created so far."""
+    return {name: s.metrics() for name, s in _schedulers.items()}
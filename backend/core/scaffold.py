@@ -0,0 +1,394 @@
+"""
+scaffold.py
+───────────
+Deterministic templates for config / boilerplate files.
+
+These files are fully determined by `plan["stack"]`, `plan["dependencies"]`
+and the file tree, so they are rendered locally instead of costing an LLM call:
+  • package.json        → dependencies split into deps / devDeps, framework scripts
+  • tsconfig.json       → Next.js or Vite preset, "@/*" path alias
+  • tailwind.config.js  → content globs from the directories in the file tree
+  • postcss.config.js, next.config.js/.mjs, next-env.d.ts, .gitignore
+  • requirements.txt    → normalized Python packages (+ uvicorn for FastAPI)
+
+`render()` returns None for anything it doesn't recognize (or a stack it
+doesn't know), and the coder falls back to the LLM for that file. JS
+packages are pinned to the version the plan gives ("zod@3.23") or a known
+caret range (JS_VERSIONS); a package.json with an unversioned unknown
+package is left to the LLM rather than pinned to "latest". Python packages
+likewise keep the plan's version ("SQLAlchemy 2.0" → "sqlalchemy~=2.0") or
+get a compatible-release range (PY_VERSIONS).
+"""
+
+import re
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from core.logger import log
+
+# Bump when a template changes: part of the build-manifest input hash
+SCAFFOLD_VERSION = "3"
+
+JS_VERSIONS = {
+    "next": "^14.2.0",
+    "react": "^18.3.1",
+    "react-dom": "^18.3.1",
+    "typescript": "^5.4.5",
+    "@types/node": "^20.12.0",
+    "@types/react": "^18.3.0",
+    "@types/react-dom": "^18.3.0",
+    "tailwindcss": "^3.4.4",
+    "postcss": "^8.4.38",
+    "autoprefixer": "^10.4.19",
+    "vite": "^5.2.0",
+    "@vitejs/plugin-react": "^4.3.0",
+    "eslint": "^8.57.0",
+    "prettier": "^3.3.2",
+    "axios": "^1.7.2",
+    "swr": "^2.2.5",
+    "@tanstack/react-query": "^5.45.0",
+    "react-router-dom": "^6.23.1",
+    "zod": "^3.23.8",
+    "clsx": "^2.1.1",
+    "tailwind-merge": "^2.3.0",
+    "lucide-react": "^0.395.0",
+    "date-fns": "^3.6.0",
+    "recharts": "^2.12.7",
+    "chart.js": "^4.4.3",
+    "react-chartjs-2": "^5.2.0",
+}
+JS_DEV_PACKAGES = {"typescript", "tailwindcss", "postcss", "autoprefixer", "vite", "@vitejs/plugin-react", "eslint", "prettier"}
+PY_ALIASES = {
+    "uvicorn": "uvicorn[standard]",
+    "psycopg2": "psycopg2-binary",
+    "jwt": "pyjwt",
+    "dotenv": "python-dotenv",
+    "postgresql": "psycopg2-binary",
+    "postgres": "psycopg2-binary",
+}
+# compatible-release ranges for backend packages a plan leaves unversioned
+PY_VERSIONS = {
+    "fastapi": "~=0.110",
+    "uvicorn[standard]": "~=0.29",
+    "pydantic": "~=2.6",
+    "pydantic-settings": "~=2.2",
+    "email-validator": "~=2.1",
+    "sqlalchemy": "~=2.0",
+    "alembic": "~=1.13",
+    "aiosqlite": "~=0.20",
+    "psycopg2-binary": "~=2.9",
+    "python-dotenv": "~=1.0",
+    "python-multipart": "~=0.0.9",
+    "httpx": "~=0.27",
+    "requests": "~=2.31",
+    "pyjwt": "~=2.8",
+    "passlib": "~=1.7",
+    "bcrypt": "~=4.1",
+    "pytest": "~=8.0",
+}
+SOURCE_GLOB = "{js,ts,jsx,tsx,mdx}"
+GITIGNORE = """node_modules/
+.next/
+dist/
+build/
+__pycache__/
+*.pyc
+.venv/
+venv/
+.env
+.env.local
+.DS_Store
+"""
+NEXT_ENV = """/// <reference types="next" />
+/// <reference types="next/image-types/global" />
+
+// NOTE: This file should not be edited
+// see https://nextjs.org/docs/basic-features/typescript for more information.
+"""
+
+
+# ----------------------------------------------------------------------------
+# Public API
+# ----------------------------------------------------------------------------
+def render(file_path: str, plan: Dict[str, Any]) -> Optional[str]:
+    """
+    Render a known config file from the plan.
+
+    Args:
+        file_path: relative path from the plan (e.g. "frontend/package.json")
+        plan: the full plan
+
+    Returns:
+        file content, or None if the file needs the LLM
+    """
+    parts = file_path.split("/")
+    if len(parts) > 2:
+        return None  # only top-level config of a side (or of the repo)
+    side = parts[0] if len(parts) == 2 else ""
+    renderer = TEMPLATES.get(parts[-1].lower())
+    if renderer is None:
+        return None
+    return renderer(plan, side)
+
+
+# ----------------------------------------------------------------------------
+# Frontend templates
+# ----------------------------------------------------------------------------
+def _package_json(plan: Dict[str, Any], side: str) -> Optional[str]:
+    framework = _framework(plan)
+    deps = _dependencies(plan, side or "frontend")
+    if framework is None or deps is None:
+        return None
+
+    names = [_js_name(d) for d in deps]
+    pinned = {_js_name(d): v for d in deps if (v := _js_pin(d))}
+    if framework == "next":
+        names += ["next", "react", "react-dom"]
+    else:
+        names += ["react", "react-dom", "vite", "@vitejs/plugin-react"]
+    if "react" in names:
+        names.append("react-dom")
+    if _uses_typescript(plan, side):
+        names += ["typescript", "@types/node", "@types/react", "@types/react-dom"]
+    if "tailwindcss" in names:
+        names += ["postcss", "autoprefixer"]
+
+    dependencies: Dict[str, str] = {}
+    dev_dependencies: Dict[str, str] = {}
+    for name in dict.fromkeys(names):  # dedupe, keep order
+        target = dev_dependencies if name in JS_DEV_PACKAGES or name.startswith("@types/") else dependencies
+        version = pinned.get(name) or _js_version(name, plan)
+        if version is None:
+            log.warning(f"[Scaffold] No known version for JS package {name!r}, leaving package.json to the LLM")
+            return None
+        target[name] = version
+
+    if framework == "next":
+        scripts = {"dev": "next dev", "build": "next build", "start": "next start"}
+    else:
+        scripts = {"dev": "vite", "build": "vite build", "preview": "vite preview"}
+    package = {"name": side or "app", "version": "0.1.0", "private": True}
+    if framework == "vite":
+        package["type"] = "module"
+    package.update({
+        "scripts": scripts,
+        "dependencies": dict(sorted(dependencies.items())),
+        "devDependencies": dict(sorted(dev_dependencies.items())),
+    })
+    return json.dumps(package, indent=2) + "\n"
+
+
+def _tsconfig(plan: Dict[str, Any], side: str) -> Optional[str]:
+    framework = _framework(plan)
+    if framework == "next":
+        root = "./src/*" if _top_dirs(plan, side) & {"src"} else "./*"
+        config = {
+            "compilerOptions": {
+                "target": "ES2017",
+                "lib": ["dom", "dom.iterable", "esnext"],
+                "allowJs": True,
+                "skipLibCheck": True,
+                "strict": True,
+                "noEmit": True,
+                "esModuleInterop": True,
+                "module": "esnext",
+                "moduleResolution": "bundler",
+                "resolveJsonModule": True,
+                "isolatedModules": True,
+                "jsx": "preserve",
+                "incremental": True,
+                "plugins": [{"name": "next"}],
+                "paths": {"@/*": [root]},
+            },
+            "include": ["next-env.d.ts", "**/*.ts", "**/*.tsx", ".next/types/**/*.ts"],
+            "exclude": ["node_modules"],
+        }
+    elif framework == "vite":
+        config = {
+            "compilerOptions": {
+                "target": "ES2020",
+                "useDefineForClassFields": True,
+                "lib": ["ES2020", "DOM", "DOM.Iterable"],
+                "module": "ESNext",
+                "skipLibCheck": True,
+                "moduleResolution": "bundler",
+                "resolveJsonModule": True,
+                "isolatedModules": True,
+                "noEmit": True,
+                "jsx": "react-jsx",
+                "strict": True,
+                "baseUrl": ".",
+                "paths": {"@/*": ["./src/*"]},
+            },
+            "include": ["src"],
+        }
+    else:
+        return None
+    return json.dumps(config, indent=2) + "\n"
+
+
+def _tailwind_config(plan: Dict[str, Any], side: str) -> Optional[str]:
+    framework = _framework(plan)
+    if framework is None:
+        return None
+    dirs = sorted(_top_dirs(plan, side) - {"public", "styles", "types"}) or ["src"]
+    content = [f"./{d}/**/*.{SOURCE_GLOB}" for d in dirs]
+    if framework == "vite":
+        content.insert(0, "./index.html")
+    globs = "".join(f'\n    "{c}",' for c in content)
+    body = f"""{{
+  content: [{globs}
+  ],
+  theme: {{
+    extend: {{}},
+  }},
+  plugins: [],
+}}"""
+    if framework == "vite":
+        return f"/** @type {{import('tailwindcss').Config}} */\nexport default {body};\n"
+    return f"/** @type {{import('tailwindcss').Config}} */\nmodule.exports = {body};\n"
+
+
+def _postcss_config(plan: Dict[str, Any], side: str) -> Optional[str]:
+    framework = _framework(plan)
+    if framework is None:
+        return None
+    body = "{\n  plugins: {\n    tailwindcss: {},\n    autoprefixer: {},\n  },\n}"
+    if framework == "vite":
+        return f"export default {body};\n"
+    return f"module.exports = {body};\n"
+
+
+def _next_config(module: str) -> Callable[[Dict[str, Any], str], Optional[str]]:
+    def render_config(plan: Dict[str, Any], side: str) -> Optional[str]:
+        if _framework(plan) != "next":
+            return None
+        head = "/** @type {import('next').NextConfig} */\nconst nextConfig = {\n  reactStrictMode: true,\n};\n\n"
+        return head + ("export default nextConfig;\n" if module == "esm" else "module.exports = nextConfig;\n")
+    return render_config
+
+
+def _next_env(plan: Dict[str, Any], side: str) -> Optional[str]:
+    return NEXT_ENV if _framework(plan) == "next" else None
+
+
+def _gitignore(plan: Dict[str, Any], side: str) -> Optional[str]:
+    return GITIGNORE
+
+
+# ----------------------------------------------------------------------------
+# Backend templates
+# ----------------------------------------------------------------------------
+def _requirements(plan: Dict[str, Any], side: str) -> Optional[str]:
+    deps = _dependencies(plan, side or "backend")
+    if deps is None:
+        return None
+    packages = [_py_requirement(d) for d in deps]
+    stack = str(plan.get("stack", {}).get("backend", "")).lower()
+    names = {re.split(r"[\[<>=!~ ]", p, 1)[0].lower() for p in packages}
+    if ("fastapi" in names or "fastapi" in stack) and "uvicorn" not in names:
+        packages.append(_py_requirement("uvicorn"))
+    if "fastapi" in stack and "fastapi" not in names:
+        packages.insert(0, _py_requirement("fastapi"))
+    return "\n".join(dict.fromkeys(p for p in packages if p)) + "\n"
+
+
+TEMPLATES: Dict[str, Callable[[Dict[str, Any], str], Optional[str]]] = {
+    "package.json": _package_json,
+    "tsconfig.json": _tsconfig,
+    "tailwind.config.js": _tailwind_config,
+    "postcss.config.js": _postcss_config,
+    "next.config.js": _next_config("cjs"),
+    "next.config.mjs": _next_config("esm"),
+    "next-env.d.ts": _next_env,
+    ".gitignore": _gitignore,
+    "requirements.txt": _requirements,
+}
+
+
+# ----------------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------------
+def _framework(plan: Dict[str, Any]) -> Optional[str]:
+    frontend = str(plan.get("stack", {}).get("frontend", "")).lower()
+    if "next" in frontend:
+        return "next"
+    if "vite" in frontend or "react" in frontend:
+        return "vite"
+    return None
+
+
+def _dependencies(plan: Dict[str, Any], side: str) -> Optional[List[str]]:
+    """Package names the plan lists for a side (None if not side-specific)."""
+    deps = plan.get("dependencies")
+    if not isinstance(deps, dict) or not isinstance(deps.get(side, []), list):
+        return None
+    return [str(d).strip() for d in deps.get(side, []) if str(d).strip()]
+
+
+def _files(plan: Dict[str, Any], side: str) -> List[str]:
+    tree = plan.get("file_tree", [])
+    if isinstance(tree, dict):
+        return [f"{side}/{p}" for p in tree.get(side, [])] if side else []
+    return [p for p in tree if not side or p.startswith(side + "/")]
+
+
+def _top_dirs(plan: Dict[str, Any], side: str) -> set:
+    """First-level directories (below the side) that contain source files."""
+    offset = 1 if side else 0
+    dirs = set()
+    for path in _files(plan, side):
+        parts = path.split("/")
+        if len(parts) > offset + 1 and parts[-1].rsplit(".", 1)[-1] in {"js", "ts", "jsx", "tsx", "mdx"}:
+            dirs.add(parts[offset])
+    return dirs
+
+
+def _uses_typescript(plan: Dict[str, Any], side: str) -> bool:
+    return any(p.endswith((".ts", ".tsx")) for p in _files(plan, side))
+
+
+def _js_name(dep: str) -> str:
+    """"next@14" / "react 18" → "next" / "react" (scoped names kept intact)."""
+    name = dep.split()[0]
+    at = name.find("@", 1)
+    return (name[:at] if at > 0 else name).lower()
+
+
+def _js_pin(dep: str) -> Optional[str]:
+    """Version range a plan dependency spells out: "zod@3.23" / "react 18" → "^3.23.0" / "^18.0.0"."""
+    parts = dep.split()
+    at = parts[0].find("@", 1) if parts else -1
+    version = parts[0][at + 1:] if at > 0 else (parts[1] if len(parts) > 1 else "")
+    version = version.lstrip("v")
+    if re.fullmatch(r"\d+(\.\d+){0,2}", version):
+        return "^" + ".".join((version.split(".") + ["0", "0"])[:3])
+    if re.fullmatch(r"[~^<>=]+\s*\d[\w.\-]*", version):
+        return version
+    return None
+
+
+def _js_version(name: str, plan: Dict[str, Any]) -> Optional[str]:
+    """Known caret range of a package (None: unknown, never "latest")."""
+    if name == "next":
+        match = re.search(r"next(?:\.js)?\s*(\d+)", str(plan.get("stack", {}).get("frontend", "")), re.I)
+        if match:
+            return f"^{match.group(1)}.0.0"
+    return JS_VERSIONS.get(name)
+
+
+def _py_requirement(dep: str) -> str:
+    """
+    Requirement line of a plan dependency: "SQLAlchemy 2.0" → "sqlalchemy~=2.0",
+    "pydantic>=2" is kept, "fastapi" gets its PY_VERSIONS range (unknown
+    packages stay unpinned).
+    """
+    if re.search(r"[<>=!~]", dep):
+        return dep.replace(" ", "")
+    parts = dep.split()
+    name = parts[0].lower()
+    name = PY_ALIASES.get(name, name)
+    version = parts[1].lstrip("v") if len(parts) > 1 else ""
+    if re.fullmatch(r"\d+(\.\d+)*", version):
+        return f"{name}~={version if '.' in version else version + '.0'}"
+    return name + PY_VERSIONS.get(name, "")
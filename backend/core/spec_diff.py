@@ -0,0 +1,342 @@
+"""
+spec_diff.py
+────────────
+Structural diff between two versions of a spec (spec_manager's document
+model) and what it means for the plan built from the older one.
+
+  diff_specs(old, new)        → SpecDiff, a typed change set:
+      entity added / removed / changed, entity field added / removed / retyped,
+      page, integration, constraint and acceptance items added / removed
+  patch_plan(plan, diff)      → (patched plan, changes it could not apply)
+      entities map onto plan files by name, following the files the plan
+      already has for a sibling entity: models/dog.py → models/cat.py,
+      api/dogs.py → api/cats.py, DogCard.tsx → CatCard.tsx, /api/dogs → /api/cats
+      (names are matched in file stems and route segments, never in directories)
+  affected_files(plan, diff)  → files whose code the change can touch
+      (None when it can touch any file, e.g. a new integration)
+
+planner_agent's delta re-plan only sends the model the changes patch_plan
+left over (with just the plan keys they concern), and the coder only
+reworks the files affected_files names, plus their dependents.
+"""
+
+import re
+import copy
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from core.hashing import stable_hash
+from core.file_graph import classify_layer, LAYER_ENTRY, LAYER_DOCS
+from core.plan_context import API_CLIENT_HINTS
+
+SECTIONS = ("entities", "pages", "integrations", "constraints", "acceptance")
+IGNORED_KEYS = ("project_id", "metadata")  # see plan_store.SPEC_VOLATILE_KEYS
+
+ADDED, REMOVED, CHANGED = "added", "removed", "changed"
+
+# plan keys a change in each spec section can affect (delta prompt scope)
+PLAN_KEYS = {
+    "entities": ["entities", "file_tree", "api_routes", "tasks"],
+    "pages": ["file_tree", "api_routes", "tasks"],
+    "integrations": ["stack", "dependencies", "file_tree", "tasks"],
+    "constraints": ["stack", "dependencies", "file_tree", "tasks"],
+    "acceptance": ["tasks"],
+}
+
+
+# ----------------------------------------------------------------------------
+# Change set
+# ----------------------------------------------------------------------------
+@dataclass(frozen=True)
+class SpecChange:
+    """One structural change between two specs."""
+
+    kind: str                    # ADDED / REMOVED / CHANGED
+    section: str                 # a SECTIONS entry, or another top-level spec key
+    item: str                    # entity / page name, or the item's text
+    field: Optional[str] = None  # entity field, for field-level changes
+    before: Any = None
+    after: Any = None
+
+    def describe(self) -> str:
+        if self.field:
+            if self.kind == CHANGED:
+                return f"entity {self.item}: field {self.field} changed from {self.before!r} to {self.after!r}"
+            return f"entity {self.item}: field {self.field} {self.kind}"
+        return f"{self.section}: {self.item!r} {self.kind}"
+
+
+@dataclass
+class SpecDiff:
+    """Ordered change set from one spec to another."""
+
+    changes: List[SpecChange] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.changes)
+
+    def __iter__(self) -> Iterator[SpecChange]:
+        return iter(self.changes)
+
+    def in_section(self, section: str) -> List[SpecChange]:
+        return [c for c in self.changes if c.section == section]
+
+    @property
+    def sections(self) -> Set[str]:
+        return {c.section for c in self.changes}
+
+    def plan_keys(self, plan: Dict[str, Any]) -> List[str]:
+        """Plan keys (in plan order) these changes can affect."""
+        wanted: Set[str] = set()
+        for section in self.sections:
+            wanted.update(PLAN_KEYS.get(section, plan.keys()))
+        return [k for k in plan if k in wanted]
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """JSON-serializable form (stored with delta plans, shown to the model)."""
+        return [{k: v for k, v in asdict(c).items() if v is not None} for c in self.changes]
+
+    @classmethod
+    def from_list(cls, items: List[Dict[str, Any]]) -> "SpecDiff":
+        return cls([SpecChange(**item) for item in items])
+
+
+# ----------------------------------------------------------------------------
+# Diffing
+# ----------------------------------------------------------------------------
+def diff_specs(old: Dict[str, Any], new: Dict[str, Any]) -> SpecDiff:
+    """
+    Structural changes from `old` to `new` (project_id / metadata ignored).
+
+    Entities are matched by name and compared field by field; the other
+    sections are sets of items.
+    """
+    diff = SpecDiff()
+    diff.changes += _diff_entities(old.get("entities") or [], new.get("entities") or [])
+    for section in SECTIONS[1:]:
+        before = {_item_key(i): i for i in _as_list(old.get(section))}
+        after = {_item_key(i): i for i in _as_list(new.get(section))}
+        diff.changes += [SpecChange(ADDED, section, k, after=after[k]) for k in after if k not in before]
+        diff.changes += [SpecChange(REMOVED, section, k, before=before[k]) for k in before if k not in after]
+    for key in sorted((set(old) | set(new)) - set(SECTIONS) - set(IGNORED_KEYS)):
+        if stable_hash(old.get(key)) != stable_hash(new.get(key)):
+            diff.changes.append(SpecChange(CHANGED, key, key, before=old.get(key), after=new.get(key)))
+    return diff
+
+
+def _diff_entities(old: List[Any], new: List[Any]) -> List[SpecChange]:
+    before = {_entity_name(e): e for e in old}
+    after = {_entity_name(e): e for e in new}
+    changes = [SpecChange(ADDED, "entities", n, after=after[n]) for n in after if n not in before]
+    changes += [SpecChange(REMOVED, "entities", n, before=before[n]) for n in before if n not in after]
+    for name in [n for n in after if n in before]:
+        a, b = before[name], after[name]
+        if stable_hash(a) == stable_hash(b):
+            continue
+        fa, fb = _fields(a), _fields(b)
+        changes += [SpecChange(ADDED, "entities", name, f, after=fb[f]) for f in fb if f not in fa]
+        changes += [SpecChange(REMOVED, "entities", name, f, before=fa[f]) for f in fa if f not in fb]
+        changes += [
+            SpecChange(CHANGED, "entities", name, f, before=fa[f], after=fb[f])
+            for f in fb if f in fa and fa[f] != fb[f]
+        ]
+        if _without_fields(a) != _without_fields(b):  # description, relations, …
+            changes.append(SpecChange(CHANGED, "entities", name, before=a, after=b))
+    return changes
+
+
+# ----------------------------------------------------------------------------
+# Plan patching
+# ----------------------------------------------------------------------------
+def patch_plan(plan: Dict[str, Any], diff: SpecDiff) -> Tuple[Dict[str, Any], SpecDiff]:
+    """
+    Apply the changes that map mechanically onto the plan.
+
+    Entity fields are not part of the plan (models/types are rendered from
+    the spec, see core/model_codegen), so field changes need no patch.
+    Other entity changes (description, relations, …) are left to the model.
+
+    Returns:
+        (patched copy of `plan`, changes left for the model)
+    """
+    patched = copy.deepcopy(plan)
+    residual = SpecDiff()
+    for change in diff:
+        if change.section != "entities":
+            residual.changes.append(change)
+        elif change.field is None and change.kind in (ADDED, REMOVED):
+            apply = _add_entity if change.kind == ADDED else _remove_entity
+            if not apply(patched, change.item):
+                residual.changes.append(change)
+        elif change.field is None:
+            residual.changes.append(change)
+    return patched, residual
+
+
+def _add_entity(plan: Dict[str, Any], name: str) -> bool:
+    """Add an entity's files/routes by analogy with a sibling; False if there is none."""
+    file_tree, entities = plan.get("file_tree"), plan.get("entities")
+    if not isinstance(file_tree, list) or not isinstance(entities, list):
+        return False
+    for sibling in [e for e in entities if isinstance(e, str) and e != name]:
+        templates = [p for p in file_tree if _owned_by(p, sibling, entities)]
+        if not templates:
+            continue
+        for template in templates:
+            path = _rename(template, sibling, name)
+            if path not in file_tree:
+                file_tree.insert(file_tree.index(template) + 1, path)
+        routes = plan.get("api_routes")
+        if isinstance(routes, list):
+            routes += [_rename(r, sibling, name) for r in routes if isinstance(r, str) and _owned_by(r, sibling, entities)]
+            plan["api_routes"] = list(dict.fromkeys(routes))
+        if name not in entities:
+            entities.append(name)
+        return True
+    return False
+
+
+def _remove_entity(plan: Dict[str, Any], name: str) -> bool:
+    """Drop an entity and the files/routes named after it; False if the plan doesn't list it."""
+    entities = plan.get("entities")
+    if not isinstance(entities, list) or name not in entities or not isinstance(plan.get("file_tree"), list):
+        return False
+    def owned(text: Any) -> bool:
+        return isinstance(text, str) and _owned_by(text, name, entities)
+
+    entities.remove(name)
+    plan["file_tree"] = [p for p in plan["file_tree"] if not owned(p)]
+    if isinstance(plan.get("api_routes"), list):
+        plan["api_routes"] = [r for r in plan["api_routes"] if not owned(r)]
+    return True
+
+
+# ----------------------------------------------------------------------------
+# Rework scope
+# ----------------------------------------------------------------------------
+def affected_files(plan: Dict[str, Any], diff: SpecDiff) -> Optional[Set[str]]:
+    """
+    Files of `plan` whose code the change set can affect.
+
+    Returns:
+        paths (docs are always included), or None if any file may be affected
+    """
+    files = [p for p in _as_list(plan.get("file_tree")) if isinstance(p, str)]
+    if not isinstance(plan.get("file_tree"), list):
+        return None
+    affected = {p for p in files if classify_layer(p) == LAYER_DOCS}
+    for change in diff:
+        if change.section == "acceptance":
+            continue  # only tasks / docs
+        if change.section != "entities":
+            return None
+        affected.update(p for p in files if mentions(p, change.item))
+        if change.field is None and change.kind in (ADDED, REMOVED):
+            # routers are registered, pages linked, clients extended in the hub files
+            affected.update(p for p in files if classify_layer(p) == LAYER_ENTRY or _is_api_client(p))
+    return affected
+
+
+# ----------------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------------
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _item_key(item: Any) -> str:
+    return item if isinstance(item, str) else stable_hash(item)
+
+
+def _entity_name(entity: Any) -> str:
+    return entity.get("name", "") if isinstance(entity, dict) else str(entity)
+
+
+def _fields(entity: Any) -> Dict[str, Any]:
+    """Field name → type (None if untyped) of a spec entity."""
+    fields: Dict[str, Any] = {}
+    for f in (entity.get("fields") or []) if isinstance(entity, dict) else []:
+        if isinstance(f, (list, tuple)) and f:
+            fields[str(f[0])] = f[1] if len(f) > 1 else None
+        elif isinstance(f, dict) and "name" in f:
+            fields[str(f["name"])] = f.get("type")
+        else:
+            fields[str(f)] = None
+    return fields
+
+
+def _without_fields(entity: Any) -> Any:
+    return {k: v for k, v in entity.items() if k != "fields"} if isinstance(entity, dict) else entity
+
+
+def _forms(name: str) -> List[str]:
+    """Spellings of an entity name in paths/routes: camel, snake, kebab, each plural then singular."""
+    snake = re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", name.replace(" ", "_")).lower()
+    camel = "".join(part[:1].upper() + part[1:] for part in snake.split("_"))
+    kebab = snake.replace("_", "-")
+    forms = []
+    for singular in (camel, snake, kebab):  # fixed positions: _rename pairs them up
+        forms += [_plural(singular), singular]
+    return forms
+
+
+def _pattern(forms: List[str]) -> "re.Pattern[str]":
+    """One alternation over `forms`, longest first, not inside a lowercase word."""
+    alternation = "|".join(re.escape(f) for f in sorted(set(forms), key=len, reverse=True))
+    return re.compile(rf"(?<![a-z])(?:{alternation})(?![a-z])")
+
+
+def _plural(word: str) -> str:
+    if re.search(r"[^aeiou]y$", word):
+        return word[:-1] + "ies"
+    if re.search(r"(s|x|z|ch|sh)$", word):
+        return word + "es"
+    return word + "s"
+
+
+def _is_route(text: str) -> bool:
+    return bool(re.match(r"\s*(?:[A-Z]+\s+)?/", text))
+
+
+def _split_subject(text: str) -> Tuple[str, str, str]:
+    """
+    (prefix, subject, suffix) of a file path or route: entity names are only
+    looked for in the subject - a route's segments, or a path's file stem
+    (so entity App/Page/Type never matches the app/, pages/, types/ dirs).
+    """
+    if _is_route(text):
+        return "", text, ""
+    head, _, base = text.rpartition("/")
+    stem, dot, ext = base.partition(".")
+    return head + ("/" if head else ""), stem, dot + ext
+
+
+def mentions(text: str, name: str) -> bool:
+    """True if a plan path's file stem, or a route, names entity `name` in any spelling."""
+    return bool(_pattern(_forms(name)).search(_split_subject(text)[1]))
+
+
+def _owned_by(text: str, name: str, entities: List[Any]) -> bool:
+    """mentions(), unless the match is really a longer entity's name (Cat in cat_owner.py)."""
+    if not mentions(text, name):
+        return False
+    longer = [e for e in entities if isinstance(e, str) and e != name and name.lower() in e.lower()]
+    return not any(mentions(text, e) for e in longer)
+
+
+def _rename(text: str, old: str, new: str) -> str:
+    """Replace every spelling of entity `old` in `text` by the same spelling of `new`."""
+    old_forms = _forms(old)
+    mapping: Dict[str, str] = {}
+    for old_form, new_form in zip(old_forms, _forms(new)):
+        mapping.setdefault(old_form, new_form)  # single-word names: snake == kebab, snake wins
+    prefix, subject, suffix = _split_subject(text)
+    # a single pass, so text already renamed is never matched again (Cat → CatOwner)
+    return prefix + _pattern(old_forms).sub(lambda m: mapping[m.group(0)], subject) + suffix
+
+
+def _is_api_client(path: str) -> bool:
+    name = path.lower().rsplit("/", 1)[-1]
+    return any(h in name for h in API_CLIENT_HINTS)
@@ -0,0 +1,255 @@
+"""
+spec_journal.py
+───────────────
+Append-only intent journal of a project's live spec, with snapshot compaction.
+
+Every change to a live spec is one JSON line, so recording an intent costs
+O(intent) instead of O(spec), and the journal keeps the whole history of how
+the spec evolved:
+
+  {"seq": 1, "ts": …, "type": "reset", "spec": {…}}            (save_spec)
+  {"seq": 2, "ts": …, "type": "entity", "data": {"name": …}}   (merge_intent)
+
+Every SPEC_SNAPSHOT_EVERY entries the spec is snapshotted together with the
+journal's byte offset after that entry, so replay reads one snapshot and
+seeks past everything it covers. The journal itself is never truncated:
+replay(upto=n) rebuilds the spec as it was after entry n from the newest
+snapshot at or before n (or from the start, once that snapshot was pruned).
+
+Layout:
+  data/specs/{project_id}_journal.jsonl          → entries
+  data/specs/{project_id}_snap_{seq:08d}.json    → {seq, offset, spec}
+                                                   (newest SPEC_SNAPSHOT_KEEP)
+
+This module only stores entries; core/spec_manager applies them (`apply`).
+"""
+
+import os
+import re
+import json
+import glob
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.artifact_writer import write_atomic
+from core.logger import log
+
+# ----------------------------------------------------------------------------
+# Paths
+# ----------------------------------------------------------------------------
+JOURNAL_DIR = "data/specs"
+os.makedirs(JOURNAL_DIR, exist_ok=True)
+
+SNAPSHOT_EVERY = int(os.getenv("SPEC_SNAPSHOT_EVERY", "50"))  # entries between snapshots
+SNAPSHOT_KEEP = int(os.getenv("SPEC_SNAPSHOT_KEEP", "5"))     # snapshots kept per project
+
+RESET = "reset"  # entry replacing the whole spec
+
+# apply(spec or None, entry) → spec after the entry (may mutate `spec`)
+Applier = Callable[[Optional[Dict[str, Any]], Dict[str, Any]], Dict[str, Any]]
+
+_heads: Dict[str, Dict[str, int]] = {}  # project → {seq, offset, snapshot_seq}
+_lock = threading.RLock()
+_stats = {"appends": 0, "snapshots": 0, "replays": 0, "replayed_entries": 0}
+
+
+def _journal_path(project_id: str) -> str:
+    return f"{JOURNAL_DIR}/{project_id}_journal.jsonl"
+
+
+def _snapshot_path(project_id: str, seq: int) -> str:
+    return f"{JOURNAL_DIR}/{project_id}_snap_{seq:08d}.json"
+
+
+def _snapshot_seqs(project_id: str) -> List[int]:
+    """Sequence numbers of the project's snapshots, oldest first."""
+    pattern = re.compile(re.escape(project_id) + r"_snap_(\d+)\.json$")
+    seqs = []
+    for path in glob.glob(f"{JOURNAL_DIR}/{glob.escape(project_id)}_snap_*.json"):
+        m = pattern.search(os.path.basename(path))
+        if m:
+            seqs.append(int(m.group(1)))
+    return sorted(seqs)
+
+
+# ----------------------------------------------------------------------------
+# Writing
+# ----------------------------------------------------------------------------
+def exists(project_id: str) -> bool:
+    return os.path.exists(_journal_path(project_id))
+
+
+def append(project_id: str, entry: Dict[str, Any], spec: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Record one change to the live spec.
+
+    Args:
+        project_id: ID for project
+        entry: {"type": …, "data": …} or {"type": RESET, "spec": …}
+        spec: the spec after the change (snapshotted when one is due); leave
+              it out to journal a change before applying it, then checkpoint()
+
+    Returns:
+        sequence number of the entry
+    """
+    with _lock:
+        head = _head(project_id)
+        record = {"seq": head["seq"] + 1, "ts": round(time.time(), 3), **entry}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(_journal_path(project_id), "ab") as f:
+            f.write(line)
+        head["seq"] += 1
+        head["offset"] += len(line)
+        _stats["appends"] += 1
+        if spec is not None:
+            checkpoint(project_id, spec)
+        return head["seq"]
+
+
+def checkpoint(project_id: str, spec: Dict[str, Any]) -> None:
+    """Snapshot `spec` (the spec after the latest entry) if a snapshot is due."""
+    with _lock:
+        head = _head(project_id)
+        if head["seq"] - head["snapshot_seq"] >= SNAPSHOT_EVERY:
+            _snapshot(project_id, spec, head)
+
+
+def head_seq(project_id: str) -> int:
+    """Sequence number of the project's latest entry (0 if it has none)."""
+    with _lock:
+        return _head(project_id)["seq"]
+
+
+def _snapshot(project_id: str, spec: Dict[str, Any], head: Dict[str, int]) -> None:
+    """Write a snapshot at the head and prune old ones."""
+    path = _snapshot_path(project_id, head["seq"])
+    write_atomic(path, json.dumps({"seq": head["seq"], "offset": head["offset"], "spec": spec}))
+    head["snapshot_seq"] = head["seq"]
+    _stats["snapshots"] += 1
+    for seq in _snapshot_seqs(project_id)[:-max(1, SNAPSHOT_KEEP)]:
+        try:
+            os.remove(_snapshot_path(project_id, seq))
+        except OSError:
+            pass
+    log.debug(f"[Journal] Snapshot of {project_id} at entry {head['seq']}")
+
+
+def _head(project_id: str) -> Dict[str, int]:
+    """Cached journal head; scanned from the newest snapshot on first use."""
+    head = _heads.get(project_id)
+    if head is None:
+        snapshot = _load_snapshot(project_id)
+        seq = snapshot["seq"] if snapshot else 0
+        offset = snapshot["offset"] if snapshot else 0
+        for entry, end in _entries(project_id, offset, repair=True):
+            seq, offset = entry["seq"], end
+        head = _heads[project_id] = {
+            "seq": seq, "offset": offset, "snapshot_seq": snapshot["seq"] if snapshot else 0,
+        }
+    return head
+
+
+# ----------------------------------------------------------------------------
+# Reading
+# ----------------------------------------------------------------------------
+def read(project_id: str, since: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Journal entries after `since`, oldest first (at most `limit`).
+
+    Seeks to the newest snapshot covering `since` instead of scanning the
+    journal from the start.
+    """
+    snapshot = _load_snapshot(project_id, upto=since)
+    offset = snapshot["offset"] if snapshot else 0
+    entries = []
+    for entry, _ in _entries(project_id, offset):
+        if entry["seq"] <= since:
+            continue
+        entries.append(entry)
+        if limit is not None and len(entries) >= limit:
+            break
+    return entries
+
+
+def replay(project_id: str, apply: Applier, upto: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], int]:
+    """
+    Rebuild the spec from the journal.
+
+    Args:
+        project_id: ID for project
+        apply: applies one entry to a spec (see Applier)
+        upto: rebuild the spec as it was after this entry (None → latest)
+
+    Returns:
+        (spec, seq of the last entry applied); (None, 0) if there is no journal
+        or `upto` precedes its first entry
+    """
+    if not exists(project_id):
+        return None, 0
+    with _lock:
+        if upto is None:
+            _head(project_id)  # repairs a torn last line before we read it
+        snapshot = _load_snapshot(project_id, upto=upto)
+        spec = snapshot["spec"] if snapshot else None
+        seq = snapshot["seq"] if snapshot else 0
+        offset = snapshot["offset"] if snapshot else 0
+        replayed = 0
+        for entry, _ in _entries(project_id, offset):
+            if upto is not None and entry["seq"] > upto:
+                break
+            spec = apply(spec, entry)
+            seq = entry["seq"]
+            replayed += 1
+        _stats["replays"] += 1
+        _stats["replayed_entries"] += replayed
+    log.debug(f"[Journal] Replayed {project_id} to entry {seq} ({replayed} entries after snapshot)")
+    return spec, seq
+
+
+def metrics() -> Dict[str, Any]:
+    with _lock:
+        return {
+            **_stats,
+            "snapshot_every": SNAPSHOT_EVERY,
+            "heads": {p: h["seq"] for p, h in _heads.items()},
+        }
+
+
+def _load_snapshot(project_id: str, upto: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Newest readable snapshot (at or before entry `upto`), or None."""
+    for seq in reversed(_snapshot_seqs(project_id)):
+        if upto is not None and seq > upto:
+            continue
+        try:
+            with open(_snapshot_path(project_id, seq), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            log.warning(f"[Journal] Ignoring unreadable snapshot {seq} of {project_id}: {e}")
+    return None
+
+
+def _entries(project_id: str, offset: int = 0, repair: bool = False):
+    """
+    Yield (entry, byte offset after it) from `offset` on.
+
+    A torn last line (crash mid-append) ends the journal; with `repair` it
+    is cut off so the next append starts on a clean line.
+    """
+    path = _journal_path(project_id)
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = None
+            if entry is None or not line.endswith(b"\n"):
+                if repair:
+                    log.warning(f"[Journal] Dropping torn entry at byte {offset} of {path}")
+                    os.truncate(path, offset)
+                return
+            offset += len(line)
+            yield entry, offset
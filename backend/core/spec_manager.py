@@ -9,16 +9,33 @@ Responsibilities:
   • Merge new intents into the existing spec
   • Validate, normalize, and store specs persistently
   • Freeze/unfreeze the spec when the user confirms "Build"
+  • Notify change listeners (e.g. agents/speculative_planner) on every save
 
 Output files:
   backend/data/specs/{project_id}.json  (live / frozen versions)
+  backend/data/specs/{project_id}_journal.jsonl  (intent journal, see core/spec_journal)
+
+Every change is appended to the project's intent journal, which is the
+source of truth: a live spec is rebuilt from it (newest snapshot + the
+entries after it) when first used, and spec_at() rebuilds it as it was at
+any earlier entry. Live specs then stay resident in memory (SpecStore); the
+live JSON file is a materialized copy written behind by a timer thread -
+once SPEC_FLUSH_EVERY changes have piled up or SPEC_FLUSH_INTERVAL seconds
+after the first unsaved change, whichever comes first - and always before a
+freeze and on shutdown (flush_all). load_spec(), save_spec() and merge_intent() all hand out or
+take copies, never the resident spec.
 """
 
 import os
 import json
 import copy
-from typing import Any, Dict, List, Optional
+import time
+import atexit
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from core.logger import log
+from core.artifact_writer import write_atomic
+from core import spec_journal
 
 # ----------------------------------------------------------------------------
 # Paths
@@ -26,6 +43,14 @@ from core.logger import log
 SPEC_DIR = "data/specs"
 os.makedirs(SPEC_DIR, exist_ok=True)
 
+FLUSH_EVERY = int(os.getenv("SPEC_FLUSH_EVERY", "20"))            # unsaved changes before a write
+FLUSH_INTERVAL = float(os.getenv("SPEC_FLUSH_INTERVAL", "2.0"))   # max seconds a change stays unsaved
+
+# Called as listener(project_id, spec) after every live spec save (from the
+# saving thread - listeners must be cheap and must not mutate the spec)
+SpecListener = Callable[[str, Dict[str, Any]], None]
+_listeners: List[SpecListener] = []
+
 
 # ----------------------------------------------------------------------------
 # Utilities
@@ -35,6 +60,165 @@ def _spec_path(project_id: str, frozen: bool = False) -> str:
     return f"{SPEC_DIR}/{project_id}_{suffix}.json"
 
 
+def add_change_listener(listener: SpecListener) -> None:
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def remove_change_listener(listener: SpecListener) -> None:
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def _notify(project_id: str, spec: Dict[str, Any]) -> None:
+    for listener in list(_listeners):
+        try:
+            listener(project_id, spec)
+        except Exception as e:  # a listener must never break intent merging
+            log.warning(f"[Spec] Change listener failed: {e}")
+
+
+def _write_json(path: str, data: Any) -> None:
+    """Write via temp file + rename so readers never see a partial file."""
+    write_atomic(path, json.dumps(data, indent=2))
+
+
+# ----------------------------------------------------------------------------
+# Resident store
+# ----------------------------------------------------------------------------
+class SpecStore:
+    """Live specs kept in memory, written behind with dirty tracking."""
+
+    def __init__(self, flush_every: int = FLUSH_EVERY, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        self.stats = {"loads": 0, "changes": 0, "flushes": 0}
+        self._specs: Dict[str, Dict[str, Any]] = {}
+        self._dirty: Dict[str, Tuple[int, float]] = {}  # project → (unsaved changes, first change at)
+        self.lock = threading.RLock()  # held while a resident spec changes
+        self._write_lock = threading.Lock()  # orders the writes of concurrent flushes
+        self._timer: Optional[threading.Timer] = None
+
+    def get(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Resident spec of a project (replayed from its journal on first use); None if there is none."""
+        with self.lock:
+            spec = self._specs.get(project_id)
+            if spec is None:
+                spec, _ = spec_journal.replay(project_id, _applier(project_id))
+                if spec is None:
+                    spec = self._load_legacy(project_id)
+                    if spec is None:
+                        return None
+                self._specs[project_id] = spec
+                self.stats["loads"] += 1
+            return spec
+
+    @staticmethod
+    def _load_legacy(project_id: str) -> Optional[Dict[str, Any]]:
+        """Live spec file saved before journaling; seeds the journal with it."""
+        path = _spec_path(project_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        spec_journal.append(project_id, {"type": spec_journal.RESET, "spec": spec}, spec)
+        log.info(f"[Spec] Started intent journal of {project_id} from {path}")
+        return spec
+
+    def put(self, project_id: str, spec: Dict[str, Any]) -> None:
+        """Replace a project's resident spec (the store takes ownership of `spec`)."""
+        with self.lock:
+            self._specs[project_id] = spec
+            self.touch(project_id)
+
+    def touch(self, project_id: str) -> None:
+        """Mark a resident spec changed; the timer thread writes it once the policy says so."""
+        with self.lock:
+            count, since = self._dirty.get(project_id, (0, time.monotonic()))
+            self._dirty[project_id] = (count + 1, since)
+            self.stats["changes"] += 1
+            if self._due(count + 1, since, time.monotonic()):
+                self._arm(0)  # never on the caller's thread (often the event loop)
+            elif self.flush_interval > 0:
+                self._arm(self.flush_interval)
+
+    def flush(self, project_id: str) -> bool:
+        """Write a project's spec if it has unsaved changes; True if it did."""
+        with self._write_lock:
+            with self.lock:  # only held to serialize: merges don't wait for the disk
+                if self._dirty.pop(project_id, None) is None:
+                    return False
+                data = json.dumps(self._specs[project_id], indent=2)
+                self.stats["flushes"] += 1
+            write_atomic(_spec_path(project_id), data)
+        log.debug(f"[Spec] Saved live spec → {_spec_path(project_id)}")
+        return True
+
+    def flush_all(self) -> int:
+        """Write every dirty spec; returns how many were written."""
+        with self.lock:
+            self._cancel_timer()
+            dirty = list(self._dirty)
+        return sum(self.flush(project_id) for project_id in dirty)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                **self.stats,
+                "resident": len(self._specs),
+                "dirty": {p: count for p, (count, _) in self._dirty.items()},
+                "flush_every": self.flush_every,
+                "flush_interval_s": self.flush_interval,
+            }
+
+    def _flush_due(self) -> None:
+        """Timer thread: write the specs that are due, re-arm for the rest."""
+        try:
+            with self.lock:
+                self._timer = None
+                now = time.monotonic()
+                due = [p for p, (count, since) in self._dirty.items() if self._due(count, since, now)]
+            for project_id in due:
+                self.flush(project_id)
+            with self.lock:
+                if self._dirty and self.flush_interval > 0:
+                    wait = min(since for _, since in self._dirty.values()) + self.flush_interval - time.monotonic()
+                    self._arm(max(0.05, wait))
+        except Exception as e:
+            log.error(f"[Spec] Write-behind flush failed: {e}")
+
+    def _due(self, count: int, since: float, now: float) -> bool:
+        return count >= self.flush_every or now - since >= self.flush_interval
+
+    def _arm(self, delay: float) -> None:
+        """Run _flush_due after `delay` seconds (sooner than an armed timer, never later)."""
+        if self._timer is not None:
+            if delay > 0:
+                return
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._flush_due)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+_store = SpecStore()
+atexit.register(_store.flush_all)
+
+
+def flush_all() -> int:
+    """Write every live spec with unsaved changes (called on app shutdown)."""
+    return _store.flush_all()
+
+
+def metrics() -> Dict[str, Any]:
+    return {**_store.metrics(), "journal": spec_journal.metrics()}
+
+
 # ----------------------------------------------------------------------------
 # Spec lifecycle management
 # ----------------------------------------------------------------------------
@@ -44,7 +228,15 @@ def create_new_spec(project_id: str) -> Dict[str, Any]:
 
     Returns the empty spec structure.
     """
-    spec = {
+    spec = _blank_spec(project_id)
+    save_spec(project_id, spec)
+    _store.flush(project_id)
+    log.info(f"[Spec] Created new spec for {project_id}")
+    return spec
+
+
+def _blank_spec(project_id: str) -> Dict[str, Any]:
+    return {
         "project_id": project_id,
         "entities": [],
         "pages": [],
@@ -53,32 +245,45 @@ def create_new_spec(project_id: str) -> Dict[str, Any]:
         "constraints": [],
         "metadata": {"status": "live"},
     }
-    save_spec(project_id, spec)
-    log.info(f"[Spec] Created new spec for {project_id}")
-    return spec
 
 
 def load_spec(project_id: str) -> Dict[str, Any]:
     """
-    Load the current live spec for a project.
+    Load the current live spec for a project (a copy the caller may change).
     """
-    path = _spec_path(project_id)
-    if not os.path.exists(path):
-        log.warning(f"[Spec] No live spec found for {project_id}, creating new one.")
-        return create_new_spec(project_id)
+    with _store.lock:  # copied whole, never halfway through a merge
+        return copy.deepcopy(_live_spec(project_id))
 
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+
+def find_spec(project_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Like load_spec(), but returns None instead of creating a missing spec
+    (for read-only callers such as the /spec routes).
+    """
+    with _store.lock:
+        spec = _store.get(project_id)
+        return copy.deepcopy(spec) if spec is not None else None
+
+
+def _live_spec(project_id: str) -> Dict[str, Any]:
+    """The resident live spec (created if missing); callers must touch() after changing it."""
+    spec = _store.get(project_id)
+    if spec is None:
+        log.warning(f"[Spec] No live spec found for {project_id}, creating new one.")
+        spec = create_new_spec(project_id)
+        spec = _store.get(project_id)
+    return spec
 
 
 def save_spec(project_id: str, spec: Dict[str, Any]) -> None:
     """
-    Save the live spec to disk.
+    Save the live spec (written to disk behind, see SpecStore).
     """
-    path = _spec_path(project_id)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(spec, f, indent=2)
-    log.debug(f"[Spec] Saved live spec → {path}")
+    resident = copy.deepcopy(spec)
+    with _store.lock:
+        spec_journal.append(project_id, {"type": spec_journal.RESET, "spec": resident}, resident)
+        _store.put(project_id, resident)
+    _notify(project_id, resident)
 
 
 def load_frozen_spec(project_id: str, path: Optional[str] = None) -> Dict[str, Any]:
@@ -110,31 +315,32 @@ def merge_intent(project_id: str, new_intent: Dict[str, Any]) -> Dict[str, Any]:
     Example intent:
         {"type": "feature_request", "data": "Add login page"}
         {"type": "entity", "data": {"name": "Lead", "fields": [["name","text"]]}}
+
+    The intent is journaled before the resident spec changes, so a failed
+    append leaves both as they were. Returns a copy of the updated spec.
     """
-    spec = load_spec(project_id)
+    spec = _live_spec(project_id)
 
     intent_type = new_intent.get("type")
-    data = new_intent.get("data")
+    data = copy.deepcopy(new_intent.get("data"))  # the caller's dict never ends up in the spec
 
     if not intent_type or not data:
         log.warning(f"[Spec] Invalid intent: {new_intent}")
-        return spec
+        return copy.deepcopy(spec)
 
-    if intent_type == "entity":
-        _merge_entity(spec, data)
-    elif intent_type == "feature_request":
-        _merge_page(spec, data)
-    elif intent_type == "integration":
-        _merge_integration(spec, data)
-    elif intent_type == "constraint":
-        _merge_constraint(spec, data)
-    elif intent_type == "acceptance":
-        _merge_acceptance(spec, data)
-    else:
+    merge = _MERGERS.get(intent_type)
+    if merge is None:
         log.warning(f"[Spec] Unknown intent type: {intent_type}")
+        return copy.deepcopy(spec)
 
-    save_spec(project_id, spec)
-    return spec
+    with _store.lock:
+        spec_journal.append(project_id, {"type": intent_type, "data": data})
+        merge(spec, data)
+        spec_journal.checkpoint(project_id, spec)
+        _store.touch(project_id)
+        result = copy.deepcopy(spec)
+    _notify(project_id, spec)
+    return result
 
 
 def _merge_entity(spec: Dict[str, Any], entity: Dict[str, Any]) -> None:
@@ -177,6 +383,50 @@ def _merge_acceptance(spec: Dict[str, Any], text: str) -> None:
         log.debug(f"[Spec] Added acceptance: {text}")
 
 
+_MERGERS: Dict[str, Callable[[Dict[str, Any], Any], None]] = {
+    "entity": _merge_entity,
+    "feature_request": _merge_page,
+    "integration": _merge_integration,
+    "constraint": _merge_constraint,
+    "acceptance": _merge_acceptance,
+}
+
+
+# ----------------------------------------------------------------------------
+# History
+# ----------------------------------------------------------------------------
+def spec_at(project_id: str, seq: int) -> Optional[Dict[str, Any]]:
+    """
+    Rebuild the live spec as it was right after journal entry `seq`.
+
+    Returns:
+        the spec, or None if the journal has no entry at or before `seq`
+    """
+    spec, _ = spec_journal.replay(project_id, _applier(project_id), upto=seq)
+    return spec
+
+
+def history(project_id: str, since: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Journal entries (intents / resets) after entry `since`, oldest first."""
+    return spec_journal.read(project_id, since=since, limit=limit)
+
+
+def _applier(project_id: str) -> spec_journal.Applier:
+    """Replays journal entries with the same merge rules as merge_intent."""
+    def apply(spec: Optional[Dict[str, Any]], entry: Dict[str, Any]) -> Dict[str, Any]:
+        if entry.get("type") == spec_journal.RESET:
+            return copy.deepcopy(entry["spec"])
+        spec = spec if spec is not None else _blank_spec(project_id)
+        merge = _MERGERS.get(entry.get("type"))
+        if merge is not None:
+            try:
+                merge(spec, copy.deepcopy(entry.get("data")))
+            except Exception as e:  # journaled before merge_intent's merge failed on it
+                log.warning(f"[Spec] Skipping journal entry {entry.get('seq')} of {project_id}: {e}")
+        return spec
+    return apply
+
+
 # ----------------------------------------------------------------------------
 # Freeze logic
 # ----------------------------------------------------------------------------
@@ -184,11 +434,11 @@ def freeze_spec(project_id: str) -> Dict[str, Any]:
     """
     Create an immutable copy of the current spec (snapshot) for planning/building.
     """
-    live = load_spec(project_id)
-    frozen = copy.deepcopy(live)
+    _store.flush(project_id)  # the live file on disk matches what gets built
+    frozen = load_spec(project_id)
     frozen["metadata"]["status"] = "frozen"
+    frozen["metadata"]["journal_seq"] = spec_journal.head_seq(project_id)
     frozen_path = _spec_path(project_id, frozen=True)
-    with open(frozen_path, "w", encoding="utf-8") as f:
-        json.dump(frozen, f, indent=2)
+    _write_json(frozen_path, frozen)
     log.success(f"[Spec] Frozen spec created → {frozen_path}")
     return frozen
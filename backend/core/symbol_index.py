@@ -0,0 +1,230 @@
+"""
+symbol_index.py
+───────────────
+Index of what every generated file exports, kept next to the build manifest.
+
+  data/builds/{project_id}/symbols.json
+  {
+    "frontend/types/dog.ts": {
+      "hash": sha256(content),
+      "exports": ["interface Dog", "type DogCreate"],
+      "routes": []
+    },
+    "backend/api/dogs.py": {
+      "hash": "...",
+      "exports": ["router", "function list_dogs"],
+      "routes": ["GET /api/dogs → list_dogs"]
+    }, …
+  }
+
+Updated per file as it lands in the workspace (O(changed files): a file
+whose content hash is unchanged is not re-parsed). The coder puts a compact
+digest of the exports of a file's dependencies into its prompt, so later
+files import names that actually exist instead of guessing from the plan.
+"""
+
+import os
+import re
+import ast
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from core.hashing import text_hash
+from core.artifact_writer import write_atomic
+from core.logger import log
+
+BUILD_DIR = "data/builds"
+MAX_EXPORTS_PER_FILE = 25
+MAX_DIGEST_CHARS = 3000
+
+HTTP_METHODS = {"get", "post", "put", "patch", "delete", "head", "options"}
+JS_EXTS = {"ts", "tsx", "js", "jsx", "mjs", "cjs"}
+
+_IDENT = r"[A-Za-z_$][\w$]*"
+_JS_PATTERNS = [
+    (re.compile(rf"^export\s+(default\s+)?(?:async\s+)?function\s*\*?\s*({_IDENT})", re.M), "function"),
+    (re.compile(rf"^export\s+(default\s+)?(?:abstract\s+)?class\s+({_IDENT})", re.M), "class"),
+    (re.compile(rf"^export\s+()(?:const|let|var)\s+({_IDENT})", re.M), "const"),
+    (re.compile(rf"^export\s+()(?:declare\s+)?interface\s+({_IDENT})", re.M), "interface"),
+    (re.compile(rf"^export\s+()(?:declare\s+)?type\s+({_IDENT})", re.M), "type"),
+    (re.compile(rf"^export\s+()(?:const\s+)?enum\s+({_IDENT})", re.M), "enum"),
+]
+_JS_DEFAULT = re.compile(rf"^export\s+default\s+({_IDENT})\s*;?\s*$", re.M)
+_JS_LIST = re.compile(r"^export\s+(?:type\s+)?\{([^}]*)\}", re.M)
+_JS_STAR = re.compile(r"""^export\s+\*\s+from\s+['"]([^'"]+)['"]""", re.M)
+
+
+# ----------------------------------------------------------------------------
+# Index
+# ----------------------------------------------------------------------------
+class SymbolIndex:
+    """Per-project exports index, persisted as symbols.json."""
+
+    def __init__(self, project_id: str):
+        self.project_id = project_id
+        self.path = f"{BUILD_DIR}/{project_id}/symbols.json"
+        self.files: Dict[str, Dict[str, Any]] = self._load()
+        self.parsed = 0  # files (re-)parsed during this session
+
+    def update(self, file_path: str, content: str) -> Dict[str, Any]:
+        """Index a file that was just written (no-op if its content is unchanged)."""
+        digest = text_hash(content)
+        entry = self.files.get(file_path)
+        if entry and entry.get("hash") == digest:
+            return entry
+        entry = {"hash": digest, **extract_symbols(file_path, content)}
+        self.files[file_path] = entry
+        self.parsed += 1
+        return entry
+
+    def ensure(self, file_path: str, workspace: str, content_hash: Optional[str] = None) -> None:
+        """Make sure a reused file is indexed; reads it only if the stored hash differs."""
+        entry = self.files.get(file_path)
+        if entry and content_hash and entry.get("hash") == content_hash:
+            return
+        try:
+            with open(os.path.join(workspace, file_path), "r", encoding="utf-8") as f:
+                self.update(file_path, f.read())
+        except (OSError, UnicodeDecodeError):
+            self.files.pop(file_path, None)
+
+    def retain(self, file_paths: Iterable[str]) -> None:
+        keep = set(file_paths)
+        for path in [p for p in self.files if p not in keep]:
+            del self.files[path]
+
+    def digest(self, file_paths: Iterable[str]) -> str:
+        """
+        Compact listing of what `file_paths` export, for a coder prompt.
+
+        Returns:
+            one line per file ("path: export, export; ROUTE → handler"),
+            capped at MAX_DIGEST_CHARS; "" if nothing is known
+        """
+        lines: List[str] = []
+        size = 0
+        for path in file_paths:
+            entry = self.files.get(path)
+            if not entry or not (entry.get("exports") or entry.get("routes")):
+                continue
+            exports = entry.get("exports", [])
+            shown = ", ".join(exports[:MAX_EXPORTS_PER_FILE])
+            if len(exports) > MAX_EXPORTS_PER_FILE:
+                shown += f", … (+{len(exports) - MAX_EXPORTS_PER_FILE})"
+            line = f"- {path}: {shown}"
+            if entry.get("routes"):
+                line += "; routes: " + ", ".join(entry["routes"])
+            if size + len(line) > MAX_DIGEST_CHARS:
+                lines.append("- … (more files omitted)")
+                break
+            lines.append(line)
+            size += len(line) + 1
+        return "\n".join(lines)
+
+    def save(self) -> None:
+        """Write symbols.json atomically (temp file + rename)."""
+        write_atomic(self.path, json.dumps(self.files, indent=2))
+        log.debug(f"[Symbols] Saved {len(self.files)} files ({self.parsed} parsed) → {self.path}")
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            log.warning(f"[Symbols] Ignoring unreadable index {self.path}: {e}")
+            return {}
+
+
+# ----------------------------------------------------------------------------
+# Extraction
+# ----------------------------------------------------------------------------
+def extract_symbols(file_path: str, content: str) -> Dict[str, List[str]]:
+    """
+    Exported names (and HTTP routes) of one source file.
+
+    Returns:
+        {"exports": [...], "routes": [...]} - empty lists for other file types
+    """
+    ext = file_path.rsplit(".", 1)[-1].lower() if "." in file_path else ""
+    if ext == "py":
+        return _python_symbols(content)
+    if ext in JS_EXTS:
+        return _js_symbols(file_path, content, jsx=ext in ("tsx", "jsx"))
+    return {"exports": [], "routes": []}
+
+
+def _python_symbols(content: str) -> Dict[str, List[str]]:
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        names = re.findall(r"^(?:async\s+)?(def|class)\s+([A-Za-z]\w*)", content, re.M)
+        return {"exports": [f"{'function' if k == 'def' else 'class'} {n}" for k, n in names], "routes": []}
+
+    exports: List[str] = []
+    routes: List[str] = []
+    prefixes: Dict[str, str] = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not node.name.startswith("_"):
+            exports.append(f"function {node.name}")
+            for route in _python_routes(node, prefixes):
+                routes.append(route)
+        elif isinstance(node, ast.ClassDef) and not node.name.startswith("_"):
+            exports.append(f"class {node.name}")
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if not isinstance(target, ast.Name) or target.id.startswith("_"):
+                    continue
+                if isinstance(node.value, ast.Call):
+                    exports.append(target.id)
+                    prefix = _keyword(node.value, "prefix")
+                    if prefix:
+                        prefixes[target.id] = prefix
+                elif target.id.isupper():
+                    exports.append(target.id)
+    return {"exports": exports, "routes": routes}
+
+
+def _python_routes(node: ast.AST, prefixes: Dict[str, str]) -> List[str]:
+    """`@router.get("/x")` style decorators → ["GET /prefix/x → handler"]."""
+    routes = []
+    for deco in getattr(node, "decorator_list", []):
+        if not (isinstance(deco, ast.Call) and isinstance(deco.func, ast.Attribute)):
+            continue
+        method = deco.func.attr.lower()
+        if method not in HTTP_METHODS or not deco.args or not isinstance(deco.args[0], ast.Constant):
+            continue
+        owner = deco.func.value.id if isinstance(deco.func.value, ast.Name) else ""
+        routes.append(f"{method.upper()} {prefixes.get(owner, '')}{deco.args[0].value} → {node.name}")
+    return routes
+
+
+def _keyword(call: ast.Call, name: str) -> Optional[str]:
+    for kw in call.keywords:
+        if kw.arg == name and isinstance(kw.value, ast.Constant) and isinstance(kw.value.value, str):
+            return kw.value.value
+    return None
+
+
+def _js_symbols(file_path: str, content: str, jsx: bool) -> Dict[str, List[str]]:
+    found: Dict[int, str] = {}  # offset → label, so output follows source order
+    for pattern, kind in _JS_PATTERNS:
+        for match in pattern.finditer(content):
+            name = match.group(2)
+            label = "component" if jsx and kind in ("function", "const") and name[:1].isupper() else kind
+            found[match.start()] = f"{'default ' if match.group(1) else ''}{label} {name}"
+    for match in _JS_DEFAULT.finditer(content):
+        found[match.start()] = f"default {match.group(1)}"
+    for match in _JS_LIST.finditer(content):
+        names = [part.split(" as ")[-1].strip() for part in match.group(1).split(",") if part.strip()]
+        found[match.start()] = ", ".join(names)
+    for match in _JS_STAR.finditer(content):
+        found[match.start()] = f"* from '{match.group(1)}'"
+
+    exports = [found[k] for k in sorted(found)]
+    routes = []
+    if file_path.rsplit("/", 1)[-1].startswith("route."):  # Next.js route handlers
+        route = "/" + file_path.split("/app/", 1)[-1].rsplit("/", 1)[0] if "/app/" in file_path else ""
+        routes = [f"{e.split()[-1]} {route}" for e in exports if e.split()[-1].lower() in HTTP_METHODS]
+    return {"exports": exports, "routes": routes}
@@ -0,0 +1,391 @@
+"""
+validator.py
+────────────
+Cheap local syntax checks for generated files.
+
+  • .py                       → ast.parse
+  • .json                     → json.loads (tsconfig/jsconfig may use comments + trailing commas)
+  • .ts/.tsx/.js/.jsx/.mjs/.cjs → bracket / string / template / comment scanner
+    (catches truncated files, unbalanced braces and stray markdown fences;
+    it is not a type checker). Outside .ts, JSX elements are followed tag by
+    tag: their text is skipped, their {expressions} are scanned as code
+
+Checks run in a shared ProcessPoolExecutor so a big file never blocks the
+event loop. `validate()` itself is a plain function and can be called inline.
+"""
+
+import os
+import re
+import ast
+import json
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from core.logger import log
+
+WORKERS = int(os.getenv("VALIDATOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+JS_EXTS = {"ts", "tsx", "js", "jsx", "mjs", "cjs"}
+JSONC_NAMES = ("tsconfig", "jsconfig")
+CLOSERS = {")": "(", "]": "[", "}": "{"}
+# a "/" after one of these, an arrow "=>" (or at the start) begins a regex literal,
+# otherwise it is a division
+REGEX_PREFIX = set("(,=:[!&|?{;") | {""}
+REGEX_KEYWORDS = ("return", "typeof", "case", "in", "of")
+NO_JSX_EXTS = {"ts"}  # "<T>(x) => x" is a generic there, not an element
+_JSX_NAME = re.compile(r"[A-Za-z_$][\w$.:-]*")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+# ----------------------------------------------------------------------------
+# Public API
+# ----------------------------------------------------------------------------
+def validate(file_path: str, content: str) -> Optional[str]:
+    """
+    Syntax-check one file.
+
+    Args:
+        file_path: relative path (its extension selects the check)
+        content: file content
+
+    Returns:
+        None if the file looks valid (or has no checker), else an error message
+    """
+    name = file_path.lower().rsplit("/", 1)[-1]
+    ext = name.rsplit(".", 1)[-1] if "." in name else ""
+    try:
+        if ext == "py":
+            ast.parse(content, filename=file_path)
+        elif ext == "json":
+            json.loads(_strip_jsonc(content) if name.startswith(JSONC_NAMES) else content)
+        elif ext in JS_EXTS:
+            return _scan_js(content, jsx=ext not in NO_JSX_EXTS)
+    except SyntaxError as e:
+        return f"SyntaxError: {e.msg} (line {e.lineno})"
+    except json.JSONDecodeError as e:
+        return f"Invalid JSON: {e.msg} (line {e.lineno}, column {e.colno})"
+    return None
+
+
+async def validate_async(file_path: str, content: str) -> Optional[str]:
+    """validate() in the process pool (inline if the pool can't be used)."""
+    pool = _get_pool()
+    if pool is None:
+        return validate(file_path, content)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, validate, file_path, content)
+    except Exception as e:  # broken pool (e.g. a worker was killed)
+        log.warning(f"[Validator] Process pool failed ({e}), validating inline")
+        _reset_pool()
+        return validate(file_path, content)
+
+
+def shutdown() -> None:
+    """Stop the worker processes (called on app shutdown)."""
+    _reset_pool()
+
+
+# ----------------------------------------------------------------------------
+# JS / TS scanner
+# ----------------------------------------------------------------------------
+def _scan_js(src: str, jsx: bool = True) -> Optional[str]:
+    """
+    Track brackets through strings, template literals (with nested ${}),
+    comments, regex literals and JSX; report the first structural problem.
+    """
+    return _scan_code(src, 0, 1, jsx)[2]
+
+
+def _scan_code(src: str, i: int, line: int, jsx: bool, opened: Optional[int] = None):
+    """
+    Scan code from `i`; with `opened`, this is a JSX {expression} opened on
+    that line and the scan stops after its closing "}".
+
+    Returns:
+        (next index, line, error or None)
+    """
+    stack = []  # (char, line) for ( [ { and "${" inside templates
+    n = len(src)
+    prev = ""  # last significant char outside strings/comments
+    before = ""  # the significant char before `prev` (to tell "=>" from ">")
+    word = ""  # last identifier (for "return /re/")
+
+    while i < n:
+        ch = src[i]
+        if ch == "\n":
+            line += 1
+        if ch.isspace():
+            i += 1
+            continue
+
+        if src.startswith("//", i):
+            end = src.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        if src.startswith("/*", i):
+            end = src.find("*/", i + 2)
+            if end == -1:
+                return i, line, f"Unterminated block comment (line {line})"
+            line += src.count("\n", i, end)
+            i = end + 2
+            continue
+        if src.startswith("```", i):
+            return i, line, f"Markdown code fence in source (line {line})"
+
+        if ch in "'\"" and not (ch == "'" and (prev.isalnum() or prev == "_")):
+            end = _string_end(src, i, ch)
+            if end is None:
+                # a lone quote in JSX text ("Don't", "5" tall); truncation still
+                # shows up as unclosed brackets
+                i += 1
+                prev = ch
+                continue
+            line += src.count("\n", i, end)
+            i = end + 1
+            prev, word = "a", ""
+            continue
+        if ch == "`":
+            i, line, error = _skip_template(src, i + 1, line, stack)
+            if error:
+                return i, line, error
+            prev, word = "a", ""
+            continue
+        arrow = prev == ">" and before == "="
+        if ch == "<" and jsx and (prev in REGEX_PREFIX or arrow or word in REGEX_KEYWORDS):
+            element = _scan_jsx(src, i, line)
+            if element is not None:
+                i, line, error = element
+                if error:
+                    return i, line, error
+                prev, word = "a", ""
+                continue
+        if ch == "/" and (prev in REGEX_PREFIX or arrow or word in REGEX_KEYWORDS):
+            end = _regex_end(src, i)
+            if end is not None:
+                i = end + 1
+                prev, word = "a", ""
+                continue
+
+        if ch in "([{":
+            stack.append((ch, line))
+        elif ch in ")]}":
+            if not stack:
+                if ch == "}" and opened is not None:
+                    return i + 1, line, None
+                return i, line, f"Unexpected '{ch}' (line {line})"
+            opener, at = stack.pop()
+            if opener == "${":
+                if ch != "}":
+                    return i, line, f"Unexpected '{ch}' in template expression (line {line})"
+                i, line, error = _skip_template(src, i + 1, line, stack)
+                if error:
+                    return i, line, error
+                prev, word = "a", ""
+                continue
+            if CLOSERS[ch] != opener:
+                return i, line, f"Mismatched '{ch}' (line {line}) for '{opener}' opened on line {at}"
+
+        if ch.isalnum() or ch in "_$":
+            word = word + ch if (prev.isalnum() or prev in "_$") else ch
+        else:
+            word = ""
+        before, prev = prev, ch
+        i += 1
+
+    if stack:
+        opener, at = stack[-1]
+        what = "template expression" if opener == "${" else f"'{opener}'"
+        return i, line, f"Unclosed {what} opened on line {at} (file looks truncated)"
+    if opened is not None:
+        return i, line, f"Unclosed JSX expression opened on line {opened} (file looks truncated)"
+    return i, line, None
+
+
+def _scan_jsx(src: str, i: int, line: int):
+    """
+    Scan the JSX element starting with the "<" at `i`: attributes, text
+    children (skipped: "1) Pick" or "https://…" are not code), nested
+    elements and {expressions}.
+
+    Returns:
+        (next index, line, error or None), or None if this "<" does not
+        start an element (a TS generic such as "<T,>(x: T) => x")
+    """
+    opened, n = line, len(src)
+    m = _JSX_NAME.match(src, i + 1)
+    if m is None and not src.startswith("<>", i):
+        return None
+    name = m.group(0) if m else ""
+    j = m.end() if m else i + 1
+    rest = src[j:j + 40].lstrip()
+    if rest.startswith(",") or re.match(r"extends\b", rest):
+        return None
+    truncated = f"Unclosed <{name}> opened on line {opened} (file looks truncated)"
+
+    # attributes, up to ">" or "/>"
+    while True:
+        while j < n and src[j].isspace():
+            line += src[j] == "\n"
+            j += 1
+        if j >= n:
+            return j, line, truncated
+        if src.startswith("/>", j):
+            return j + 2, line, None
+        ch = src[j]
+        if ch == ">":
+            j += 1
+            break
+        if ch == "{":
+            j, line, error = _scan_code(src, j + 1, line, True, opened=line)
+            if error:
+                return j, line, error
+        elif ch in "'\"":
+            end = src.find(ch, j + 1)  # attribute strings may span lines
+            if end == -1:
+                return j, line, truncated
+            line += src.count("\n", j, end)
+            j = end + 1
+        elif ch == "<":
+            element = _scan_jsx(src, j, line)
+            if element is None:
+                return j, line, f"Unexpected '<' in <{name}> tag (line {line})"
+            j, line, error = element
+            if error:
+                return j, line, error
+        elif ch == "=" or ch.isalnum() or ch in "_$:-.":
+            j += 1
+        else:
+            return j, line, f"Unexpected '{ch}' in <{name}> tag (line {line})"
+
+    # children, up to the matching closing tag
+    while j < n:
+        ch = src[j]
+        if ch == "\n":
+            line += 1
+        if ch == "{":
+            j, line, error = _scan_code(src, j + 1, line, True, opened=line)
+            if error:
+                return j, line, error
+            continue
+        if ch == "<":
+            if src.startswith("</", j):
+                end = src.find(">", j)
+                if end == -1:
+                    return j, line, truncated
+                closing = src[j + 2:end].strip()
+                if closing != name:
+                    return j, line, f"Mismatched </{closing}> (line {line}) for <{name}> opened on line {opened}"
+                return end + 1, line, None
+            element = _scan_jsx(src, j, line)
+            if element is not None:
+                j, line, error = element
+                if error:
+                    return j, line, error
+                continue
+        j += 1
+    return j, line, truncated
+
+
+def _string_end(src: str, start: int, quote: str) -> Optional[int]:
+    """Index of the closing quote of a '/" string (strings end at a newline)."""
+    i = start + 1
+    while i < len(src):
+        ch = src[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == quote:
+            return i
+        if ch == "\n":
+            return None
+        i += 1
+    return None
+
+
+def _skip_template(src: str, i: int, line: int, stack: list):
+    """
+    Scan a template literal body from `i` up to the closing backtick or a "${".
+
+    Returns:
+        (next index, line, error or None); on "${" a marker is pushed on `stack`
+    """
+    opened = line
+    while i < len(src):
+        ch = src[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "\n":
+            line += 1
+        elif ch == "`":
+            return i + 1, line, None
+        elif ch == "$" and src.startswith("${", i):
+            stack.append(("${", line))
+            return i + 2, line, None
+        i += 1
+    return i, line, f"Unterminated template literal opened on line {opened}"
+
+
+def _regex_end(src: str, start: int) -> Optional[int]:
+    """Closing "/" of a regex literal (None if this is not a regex on one line)."""
+    i, in_class = start + 1, False
+    while i < len(src):
+        ch = src[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "\n":
+            return None
+        if ch == "[":
+            in_class = True
+        elif ch == "]":
+            in_class = False
+        elif ch == "/" and not in_class:
+            return i
+        i += 1
+    return None
+
+
+# ----------------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------------
+def _strip_jsonc(text: str) -> str:
+    """Remove // and /* */ comments (outside strings) and trailing commas."""
+    out, i, n = [], 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch == '"':
+            end = _string_end(text, i, '"')
+            end = n - 1 if end is None else end
+            out.append(text[i:end + 1])
+            i = end + 1
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        else:
+            out.append(ch)
+            i += 1
+    return re.sub(r",(\s*[}\]])", r"\1", "".join(out))
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if _pool is None and WORKERS > 0:
+        try:
+            _pool = ProcessPoolExecutor(max_workers=WORKERS)
+        except (OSError, NotImplementedError) as e:
+            log.warning(f"[Validator] No process pool available ({e}), validating inline")
+            return None
+    return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
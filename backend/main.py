@@ -3,9 +3,9 @@ main.py
 ───────
 FastAPI entrypoint for AI-FDE 2.0 backend.
 
- - Router registration (audio, chat, run, deploy)
+ - Router registration (audio, chat, run, deploy, spec)
  - CORS for frontend
- - Health check route
+ - Health check + metrics routes
  - Shared logging
 """
 
@@ -14,7 +14,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from core.logger import log
-from routes import audio, chat, run, deploy
+from core.llm_cache import get_cache
+from core.rate_limiter import all_metrics as scheduler_metrics
+from core import llm_router, validator, artifact_writer, model_routing, spec_manager
+from agents import speculative_planner
+from routes import audio, chat, run, deploy, spec
 
 
 # ---------------------------------------------------
@@ -42,6 +46,7 @@ app.include_router(audio.router, prefix="/audio", tags=["Audio"])
 app.include_router(chat.router, prefix="/chat", tags=["Chat"])
 app.include_router(run.router, prefix="/run", tags=["Runner"])
 app.include_router(deploy.router, prefix="/deploy", tags=["Deploy"])
+app.include_router(spec.router, prefix="/spec", tags=["Spec"])
 
 
 # ---------------------------------------------------
@@ -52,14 +57,38 @@ async def root():
     return {"status": "ok", "service": "AI-FDE 2.0 Backend"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Runtime counters (LLM response cache hits/misses, provider queue depth, …)."""
+    return {
+        "llm_cache": get_cache().stats(),
+        "llm_scheduler": scheduler_metrics(),
+        "llm_router": llm_router.metrics(),
+        "artifact_writer": artifact_writer.metrics(),
+        "model_routing": model_routing.metrics(),
+        "speculative_planner": speculative_planner.metrics(),
+        "spec_store": spec_manager.metrics(),
+    }
+
+
 # ---------------------------------------------------
 # Startup Event
 # # ---------------------------------------------------
 @app.on_event("startup")
 async def startup_event():
+    speculative_planner.start()
     log.info("🚀 Backend server starting up… Ready for requests.")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await speculative_planner.stop()
+    spec_manager.flush_all()
+    await artifact_writer.shutdown()
+    validator.shutdown()
+    log.info("Backend server shutting down.")
+
+
 # ---------------------------------------------------
 # Main
 # ---------------------------------------------------
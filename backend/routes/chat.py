@@ -5,9 +5,13 @@ Handles text interactions between frontend and backend.
 
 Endpoints:
  - POST /chat/message  → general chat (for UI)
- - POST /chat/build    → triggers Planner + Coder Agents (full build pipeline)
+ - POST /chat/build    → triggers Planner + Coder Agents (full build pipeline;
+                         with `pipelined`, coding starts while the plan streams)
+ - POST /chat/refine   → applies feedback to the generated code as diffs
 """
 
+import asyncio
+
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
@@ -27,6 +31,15 @@ class ChatRequest(BaseModel):
 class BuildRequest(BaseModel):
     project_id: str
     extra_context: str | None = None
+    force_replan: bool = False
+    speculative: bool | None = None  # race candidates for critical files (default: CODER_SPECULATIVE)
+    pipelined: bool = False  # start coding before the planner has finished
+
+
+class RefineRequest(BaseModel):
+    project_id: str
+    feedback: str
+    files: list[str] | None = None
 
 
 # ---------------------------------------------------
@@ -56,21 +69,29 @@ async def build_project(req: BuildRequest):
     Returns plan + code manifest + deployment URLs
     """
     try:
-        # Step 1: Generate plan
-        log.info(f"[Build] Step 1/2: Planning {req.project_id}...")
-        plan = await planner_agent.plan_application(
-            project_id=req.project_id,
-            extra_context=req.extra_context
-        )
-        file_tree = plan.get('file_tree', [])
-        file_count = len(file_tree) if isinstance(file_tree, list) else sum(len(v) for v in file_tree.values())
-        log.success(f"[Build] Plan generated with {file_count} files")
-        
-        # Step 2: Generate code
-        log.info(f"[Build] Step 2/3: Generating code...")
-        code_result = await coder_agent.generate_code(
-            project_id=req.project_id
-        )
+        if req.pipelined:
+            # Steps 1 + 2 overlap: coding starts once the plan fields it needs streamed
+            log.info(f"[Build] Steps 1-2/3: Planning and coding {req.project_id} (pipelined)...")
+            plan, code_result = await _plan_and_code_pipelined(req)
+        else:
+            # Step 1: Generate plan
+            log.info(f"[Build] Step 1/2: Planning {req.project_id}...")
+            plan = await planner_agent.plan_application(
+                project_id=req.project_id,
+                extra_context=req.extra_context,
+                force_replan=req.force_replan
+            )
+            file_tree = plan.get('file_tree', [])
+            file_count = len(file_tree) if isinstance(file_tree, list) else sum(len(v) for v in file_tree.values())
+            log.success(f"[Build] Plan generated with {file_count} files")
+            
+            # Step 2: Generate code
+            log.info(f"[Build] Step 2/3: Generating code...")
+            code_result = await coder_agent.generate_code(
+                project_id=req.project_id,
+                speculative=req.speculative,
+                rework=planner_agent.rework_scope(req.project_id)
+            )
         log.success(f"[Build] Code generation complete! {code_result['file_count']} files created")
         
         # Step 3: Deploy to GitHub (via Agentverse agent)
@@ -91,7 +112,10 @@ async def build_project(req: BuildRequest):
                 "file_count": code_result["file_count"],
                 "files": code_result["files"],
                 "workspace_path": code_result["workspace_path"],
-                "failed_count": code_result.get("failed_count", 0)
+                "failed_count": code_result.get("failed_count", 0),
+                "reused": code_result.get("reused", []),
+                "regenerated": code_result.get("regenerated", []),
+                "pipelined": code_result.get("pipelined")
             },
             "deployment": {
                 "status": deploy_result["status"],
@@ -105,3 +129,89 @@ async def build_project(req: BuildRequest):
     except Exception as e:
         log.error(f"[Build] Pipeline failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/refine")
+async def refine_project(req: RefineRequest):
+    """
+    Refinement mode: apply feedback (failing tests, review comments, …)
+    to an already generated workspace as unified diffs.
+    
+    Returns which files were patched / rewritten and the output tokens used
+    """
+    try:
+        result = await coder_agent.refine_files(
+            project_id=req.project_id,
+            feedback=req.feedback,
+            files=req.files
+        )
+        return {"status": "ok", **result}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        log.error(f"[Refine] Failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ---------------------------------------------------
+# Helpers
+# ---------------------------------------------------
+async def _plan_and_code_pipelined(req: BuildRequest):
+    """
+    Plan and code concurrently.
+    
+    The coder starts on the streamed plan fields (stack, dependencies,
+    file_tree, api_routes, entities) while the planner is still writing the
+    rest. Once the plan is final and validated, a second coder run against
+    it regenerates only files whose inputs differ from what the early run
+    saw (build manifest input hashes) plus the docs the early run skipped.
+    
+    Returns:
+        (plan, code result of the final run + "pipelined" stats)
+    """
+    early: asyncio.Task | None = None
+    
+    def start_coding(fields: dict) -> None:
+        nonlocal early
+        early = asyncio.create_task(coder_agent.generate_code(
+            project_id=req.project_id,
+            speculative=req.speculative,
+            plan=fields,
+            partial=True
+        ))
+    
+    try:
+        plan = await planner_agent.plan_application(
+            project_id=req.project_id,
+            extra_context=req.extra_context,
+            force_replan=req.force_replan,
+            on_code_ready=start_coding
+        )
+    except BaseException:
+        if early:
+            early.cancel()
+            await asyncio.gather(early, return_exceptions=True)
+        raise
+    log.success(f"[Build] Plan final, {'coder already running' if early else 'plan was not streamed'}")
+    
+    early_files = 0
+    if early:
+        try:
+            early_files = len((await early).get("regenerated", []))
+        except Exception as e:
+            log.warning(f"[Build] Early coding failed ({e}), the final run generates everything")
+    
+    code_result = await coder_agent.generate_code(
+        project_id=req.project_id,
+        speculative=req.speculative,
+        rework=None if early else planner_agent.rework_scope(req.project_id)
+    )
+    code_result["pipelined"] = {
+        "early_files": early_files,
+        "after_plan": len(code_result.get("regenerated", [])),
+    }
+    log.info(
+        f"[Build] Pipelined: {early_files} files generated while planning, "
+        f"{code_result['pipelined']['after_plan']} after the final plan"
+    )
+    return plan, code_result
@@ -0,0 +1,61 @@
+"""
+spec.py
+───────
+Read access to a project's living spec and its intent journal.
+
+Endpoints:
+ - GET /spec/{project_id}          → live spec, or the spec as of journal entry `at`
+ - GET /spec/{project_id}/journal  → journal entries after `since` (MemoryTimeline)
+
+Journal replay and reads are file I/O, so they run in a worker thread.
+"""
+
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query
+
+from core import spec_manager
+
+router = APIRouter()
+
+
+def _not_found(project_id: str) -> HTTPException:
+    return HTTPException(status_code=404, detail=f"No spec found for {project_id}")
+
+
+@router.get("/{project_id}")
+async def get_spec(project_id: str, at: int | None = Query(None, ge=0)):
+    """
+    Live spec of a project; with `at`, the spec rebuilt from its journal
+    as it was right after entry `at`. Never creates a spec (404 instead).
+    """
+    if at is None:
+        spec = await asyncio.to_thread(spec_manager.find_spec, project_id)
+        if spec is None:
+            raise _not_found(project_id)
+        return {"project_id": project_id, "spec": spec}
+    spec = await asyncio.to_thread(spec_manager.spec_at, project_id, at)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"No journal entry at or before {at} for {project_id}")
+    return {"project_id": project_id, "at": at, "spec": spec}
+
+
+@router.get("/{project_id}/journal")
+async def get_journal(
+    project_id: str,
+    since: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1, le=1000),
+):
+    """
+    Intent journal entries after entry `since`, oldest first.
+
+    Poll with `since` set to the last `seq` seen to follow a live meeting.
+    """
+    if await asyncio.to_thread(spec_manager.find_spec, project_id) is None:
+        raise _not_found(project_id)
+    entries = await asyncio.to_thread(spec_manager.history, project_id, since=since, limit=limit)
+    return {
+        "project_id": project_id,
+        "entries": entries,
+        "next": entries[-1]["seq"] if entries else since,
+    }
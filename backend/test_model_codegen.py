@@ -0,0 +1,54 @@
+"""
+Test script for core/model_codegen (no LLM calls)
+---------------------------------------------------
+Models rendered from spec entities must be valid code whatever the field
+names and free-form types look like.
+
+Run: python test_model_codegen.py   (or pytest test_model_codegen.py)
+"""
+
+from core.model_codegen import render_models, _field_type
+from core.validator import validate
+
+PLAN = {
+    "file_tree": ["backend/models/trip.py", "backend/schemas/trip.py", "frontend/types/trip.ts"],
+    "dependencies": {"backend": ["sqlalchemy"]},
+}
+
+
+def _render(fields):
+    return render_models(PLAN, {"entities": [{"name": "Trip", "fields": fields}]})
+
+
+def test_types_match_whole_words():
+    assert _field_type("country code") == "text"
+    assert _field_type("point") == "text"
+    assert _field_type("timezone") == "text"
+    assert _field_type("created timestamp") == "datetime"
+    assert _field_type("view count") == "int"
+    assert _field_type("price in USD") == "float"
+
+
+def test_reserved_names_get_a_suffix():
+    out = _render([["from", "text"], ["metadata", "json"], ["date", "date"], ["class", "text"]])
+    model = out["backend/models/trip.py"]
+    assert 'from_: Mapped[str] = mapped_column("from", String)' in model
+    assert 'metadata_: Mapped[dict] = mapped_column("metadata", JSON)' in model
+    assert 'date_: Mapped[date] = mapped_column("date", Date)' in model
+    assert "    class_: str" in out["backend/schemas/trip.py"]
+    for path, code in out.items():
+        assert validate(path, code) is None, path
+
+
+def test_duplicate_fields_are_dropped():
+    out = _render([["Name", "text"], ["name", "int"], ["ID", "int"]])
+    schema = out["backend/schemas/trip.py"]
+    assert schema.count("name:") == 1 and "    name: str" in schema
+    assert schema.count("id:") == 1  # only TripRead's primary key
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,43 @@
+"""
+Test script for core/patcher paths (no LLM calls)
+---------------------------------------------------
+Paths from model-written diff headers must stay inside the workspace.
+
+Run: python test_patcher.py   (or pytest test_patcher.py)
+"""
+
+import os
+import tempfile
+
+from core.patcher import parse_diff, safe_path
+
+
+def test_relative_paths_are_normalized():
+    assert safe_path("frontend/./app/page.tsx") == "frontend/app/page.tsx"
+    assert safe_path("backend/api/../main.py") == "backend/main.py"
+
+
+def test_escaping_paths_are_rejected():
+    for raw in ("/etc/passwd", "../outside.py", "backend/../../x.py", "C:/x.py", "..\\x.py", "", "."):
+        assert safe_path(raw) is None, raw
+
+
+def test_new_file_diff_outside_the_workspace():
+    patches = parse_diff("--- /dev/null\n+++ b/../../evil.py\n@@ -0,0 +1 @@\n+x = 1\n")
+    (raw, patch), = patches.items()
+    assert patch["new"]
+    assert safe_path(raw) is None
+
+
+def test_symlink_out_of_the_workspace_is_rejected():
+    with tempfile.TemporaryDirectory() as workspace, tempfile.TemporaryDirectory() as outside:
+        os.symlink(outside, os.path.join(workspace, "link"))
+        assert safe_path("link/evil.py", workspace) is None
+        assert safe_path("backend/main.py", workspace) == "backend/main.py"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,76 @@
+"""
+Test script for core/spec_diff (no LLM calls)
+-----------------------------------------------
+Entity renames by sibling analogy must not corrupt names that contain the
+sibling's name, and entity names must not match directory names.
+
+Run: python test_spec_diff.py   (or pytest test_spec_diff.py)
+"""
+
+from core.spec_diff import (
+    SpecDiff, SpecChange, ADDED, REMOVED, CHANGED, diff_specs, patch_plan, affected_files, mentions,
+)
+
+
+def _plan(entities, file_tree, api_routes=()):
+    return {"entities": list(entities), "file_tree": list(file_tree), "api_routes": list(api_routes)}
+
+
+def test_add_entity_containing_sibling_name():
+    plan = _plan(
+        ["Cat"],
+        ["backend/models/cat.py", "backend/api/cats.py", "frontend/types/cat.ts", "frontend/components/CatCard.tsx"],
+        ["/api/cats", "/api/cats/{cat_id}"],
+    )
+    patched, residual = patch_plan(plan, SpecDiff([SpecChange(ADDED, "entities", "CatOwner")]))
+    assert not residual.changes
+    assert patched["entities"] == ["Cat", "CatOwner"]
+    for path in ("backend/models/cat_owner.py", "backend/api/cat_owners.py",
+                 "frontend/types/cat_owner.ts", "frontend/components/CatOwnerCard.tsx"):
+        assert path in patched["file_tree"], path
+    assert "/api/cat_owners" in patched["api_routes"]
+    assert "/api/cat_owners/{cat_owner_id}" in patched["api_routes"]
+    assert not any("owner_owner" in p for p in patched["file_tree"] + patched["api_routes"])
+
+
+def test_sibling_files_of_longer_entity_are_not_templates():
+    plan = _plan(["Order", "OrderItem"], ["backend/models/order.py", "backend/models/order_item.py"])
+    patched, _ = patch_plan(plan, SpecDiff([SpecChange(ADDED, "entities", "Invoice")]))
+    assert "backend/models/invoice.py" in patched["file_tree"]
+    assert "backend/models/invoice_item.py" not in patched["file_tree"]
+
+    patched, _ = patch_plan(plan, SpecDiff([SpecChange(REMOVED, "entities", "Order")]))
+    assert patched["file_tree"] == ["backend/models/order_item.py"]
+
+
+def test_entity_names_do_not_match_directories():
+    assert not mentions("frontend/pages/index.tsx", "Page")
+    assert not mentions("frontend/src/app/layout.tsx", "App")
+    assert mentions("frontend/components/AppCard.tsx", "App")
+    assert mentions("GET /api/pages/{page_id}", "Page")
+
+    files = ["frontend/pages/index.tsx", "frontend/pages/pages.tsx", "backend/main.py", "README.md"]
+    plan = _plan(["Page", "Dog"], files)
+    patched, _ = patch_plan(plan, SpecDiff([SpecChange(REMOVED, "entities", "Page")]))
+    assert patched["file_tree"] == ["frontend/pages/index.tsx", "backend/main.py", "README.md"]
+
+    affected = affected_files(plan, SpecDiff([SpecChange(ADDED, "entities", "Page", "title")]))
+    assert affected == {"frontend/pages/pages.tsx", "README.md"}
+
+
+def test_entity_changes_without_a_plan_patch_are_left_for_the_model():
+    old = {"entities": [{"name": "Dog", "fields": [["name", "text"]], "relations": []}]}
+    new = {"entities": [
+        {"name": "Dog", "fields": [["name", "text"], ["age", "int"]], "relations": ["belongs to Owner"]},
+    ]}
+    diff = diff_specs(old, new)
+    assert {(c.kind, c.field) for c in diff} == {(ADDED, "age"), (CHANGED, None)}
+    _, residual = patch_plan(_plan(["Dog"], ["backend/models/dog.py"]), diff)
+    assert [(c.kind, c.item, c.field) for c in residual] == [(CHANGED, "Dog", None)]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,54 @@
+"""
+Test script for core/validator (no LLM calls)
+-----------------------------------------------
+Valid generated files must pass the syntax checks; truncated or broken
+ones must be rejected.
+
+Run: python test_validator.py   (or pytest test_validator.py)
+"""
+
+from core.validator import validate
+
+
+def test_valid_files_pass():
+    assert validate("backend/main.py", "def f():\n    return 1\n") is None
+    assert validate("frontend/package.json", '{"name": "app"}') is None
+    assert validate("frontend/tsconfig.json", '{\n  // comment\n  "strict": true,\n}') is None
+    assert validate("frontend/lib/util.ts", "export const half = (n: number) => n / 2;") is None
+    assert validate("frontend/lib/re.ts", "function f(s) { return /[)}]/.test(s); }") is None
+    assert validate("frontend/app/page.tsx", "export default () => <p>Don't {`${a}`}</p>;") is None
+
+
+def test_regex_after_arrow():
+    assert validate("frontend/lib/check.ts", "const ok = (s: string) => /^[({]+$/.test(s);") is None
+    assert validate("frontend/lib/check.ts", "const ok = s=>/[\\]]/.test(s);") is None
+
+
+def test_jsx_text_is_not_code():
+    assert validate("frontend/app/page.tsx", "const L = ({xs}) => <ul>{xs.map(x => <li>Visit https://example.com</li>)}</ul>;") is None
+    assert validate("frontend/app/page.tsx", "export default function P() { return <p>1) Pick</p>; }") is None
+    assert validate("frontend/app/page.tsx", 'const a = <Foo bar="x)" on={() => f(")")} {...rest} />;') is None
+    assert validate("frontend/app/page.tsx", "const a = <>{/* ) */}<b>it's 5\" tall :)</b></>;") is None
+    assert validate("frontend/lib/id.tsx", "const id = <T,>(x: T) => x;") is None
+    assert validate("frontend/lib/id.ts", "const id = <T>(x: T): T => x;") is None
+
+
+def test_broken_jsx_fails():
+    assert "truncated" in validate("frontend/app/page.tsx", "const a = <div><span>hi")
+    assert validate("frontend/app/page.tsx", "const a = <div><span></div>;") is not None
+    assert validate("frontend/app/page.tsx", "const a = <div>{x)}</div>;") is not None
+
+
+def test_broken_files_fail():
+    assert validate("backend/api/dogs.py", "def f(:\n  pass") is not None
+    assert validate("frontend/package.json", '{"name": ') is not None
+    assert "truncated" in validate("frontend/components/DogCard.tsx", "export function A() { return (<div>")
+    assert validate("frontend/lib/util.ts", "const x = [1, 2);") is not None
+    assert validate("README.md", "```") is None  # no checker for docs
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")